@@ -0,0 +1,124 @@
+"""
+Generate travel plans in bulk
+
+    python -m app.batch requests.jsonl --output output/batch/plans.jsonl --concurrency 4
+
+The input is a JSON array or JSON lines of `TravelPlanRequest`. One result
+record is appended to the output per unique request as soon as it finishes;
+rerunning with the same output skips requests that already succeeded, so an
+interrupted run can simply be restarted. Generated plans are also written to
+the plan cache, from where `/travel/chat` replays them.
+"""
+# load env first
+from dotenv import load_dotenv
+load_dotenv()
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+from typing import List, Set
+
+from app.config import BatchConfig, setup_logging
+from app.models.http_entity import TravelPlanRequest
+from app.services.batch import BatchStatus, run_batch
+from app.services.cache_backend import aclose_cache_backends
+from app.services.flight import flight_api_client
+from app.services.mcp_pool import mcp_session_pool
+from app.services.tokens import load_tokenizer
+
+logger = logging.getLogger(__name__)
+
+
+def read_requests(path: str) -> List[TravelPlanRequest]:
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    if text.lstrip().startswith("["):
+        rows = json.loads(text)
+    else:
+        rows = [json.loads(line) for line in text.splitlines() if line.strip()]
+    return [TravelPlanRequest(**row) for row in rows]
+
+
+def read_done_keys(path: str) -> Set[str]:
+    """Keys already generated successfully by an earlier run"""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # 上次运行中断时最后一行可能不完整
+                continue
+            if record.get("status") == BatchStatus.OK:
+                done.add(record["key"])
+    return done
+
+
+def _ends_with_newline(path: str) -> bool:
+    with open(path, "rb") as f:
+        if f.seek(0, os.SEEK_END) == 0:
+            return True
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+async def run(args) -> int:
+    requests = read_requests(args.input)
+    done_keys = read_done_keys(args.output)
+    if done_keys:
+        logger.info(f"resuming, {len(done_keys)} plans already generated")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    failed = 0
+    await asyncio.to_thread(load_tokenizer)
+    await mcp_session_pool.start()
+    try:
+        with open(args.output, "a", encoding="utf-8") as out:
+            # 上次中断留下的不完整行单独成行，不与新记录粘连
+            if not _ends_with_newline(args.output):
+                out.write("\n")
+            async for record in run_batch(
+                requests,
+                concurrency=args.concurrency,
+                max_retries=args.retries,
+                with_map=not args.no_map,
+                with_flights=args.flights,
+                done_keys=done_keys,
+            ):
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                os.fsync(out.fileno())
+                if record["status"] != BatchStatus.OK:
+                    failed += 1
+                logger.info(f"batch item {record['key'][:12]} {record['status']} "
+                            f"after {record['attempts']} attempt(s), {record['duration_ms']}ms")
+    finally:
+        await mcp_session_pool.aclose()
+        await flight_api_client.aclose()
+        await aclose_cache_backends()
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="JSON array or JSON lines of travel plan requests")
+    parser.add_argument("--output", default=os.path.join("output", "batch", "plans.jsonl"))
+    parser.add_argument("--concurrency", type=int, default=BatchConfig.concurrency)
+    parser.add_argument("--retries", type=int, default=BatchConfig.max_retries, help="retries per request")
+    parser.add_argument("--no-map", action="store_true", help="skip the pin map (such plans are not cached)")
+    parser.add_argument("--flights", action="store_true", help="also search flights for each request")
+    args = parser.parse_args()
+
+    setup_logging()
+    failed = asyncio.run(run(args))
+    if failed:
+        logger.warning(f"{failed} request(s) failed, rerun the same command to retry them")
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,310 @@
 import os
+import atexit
 import logging
+import queue
 import sys
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Optional
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
 
 aiq_workflow_config_path = os.path.join(os.path.dirname(current_dir), "aiq_workflow.yml")
 
+res_dir = os.path.join(os.path.dirname(current_dir), "res")
+cache_dir = os.path.join(os.path.dirname(current_dir), "output", "cache")
+
+class LogConfig:
+    level = os.getenv("LOG_LEVEL", "INFO").upper()
+    file = os.getenv("LOG_FILE", "app.log")
+    max_bytes = int(os.getenv("LOG_MAX_BYTES", str(50 * 1024 * 1024)))
+    backup_count = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+    # DEBUG 级别下每 N 个 token 记录一条逐 token 日志
+    token_sample_every = int(os.getenv("LOG_TOKEN_SAMPLE_EVERY", "50"))
+
+
+_log_listener: Optional[QueueListener] = None
+
+
 # Configure logging
 def setup_logging():
-    """Set up logging configuration for the application"""
+    """
+    Set up logging configuration for the application
+
+    Handlers doing I/O (stdout, rotating file) run on a background
+    QueueListener thread; the event loop only enqueues records.
+    """
+    global _log_listener
+    if _log_listener is not None:
+        return logging.getLogger(__name__)
+
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    handlers = [
+        logging.StreamHandler(sys.stdout),
+        RotatingFileHandler(
+            LogConfig.file,
+            maxBytes=LogConfig.max_bytes,
+            backupCount=LogConfig.backup_count,
+            encoding='utf-8',
+        ),
+    ]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    _log_listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _log_listener.start()
+    atexit.register(stop_logging)
+
+    queue_handler = QueueHandler(log_queue)
+    # QueueHandler 只负责合并 message / 异常信息，最终格式由 listener 的 handler 决定
+    queue_handler.setFormatter(logging.Formatter('%(message)s'))
     logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.StreamHandler(sys.stdout),
-            logging.FileHandler('app.log', encoding='utf-8')
-        ]
+        level=LogConfig.level,
+        handlers=[queue_handler],
+        force=True,
     )
     return logging.getLogger(__name__)
 
 
+def stop_logging():
+    """Flush queued records and stop the background listener"""
+    global _log_listener
+    if _log_listener is not None:
+        _log_listener.stop()
+        _log_listener = None
+
+
+def _model_task(prefix: str, model_name: str, temperature: float, max_tokens: int, timeout: float,
+                deterministic: bool) -> dict:
+    """Model binding of one task, each overridable as MODEL_{PREFIX}_{NAME} env var"""
+    def env(name, default, cast):
+        return cast(os.getenv(f"MODEL_{prefix}_{name}", str(default)))
+
+    return {
+        "model_name": env("NAME", model_name, str),
+        "temperature": env("TEMPERATURE", temperature, float),
+        "max_tokens": env("MAX_TOKENS", max_tokens, int),
+        "timeout": env("TIMEOUT", timeout, float),
+        # temperature=0 且固定 seed，相同输入得到相同输出，适合结果会被缓存的任务
+        "deterministic": env("DETERMINISTIC", deterministic, lambda value: str(value).lower() == "true"),
+    }
+
+
 class ModelConfig:
     model_name = "qwen-plus-latest"
     api_key = os.getenv("DASHSCOPE_API_KEY")
-    base_url = "https://dashscope.aliyuncs.com/compatible-mode/v1"
+    base_url = os.getenv("DASHSCOPE_BASE_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1")
     temperature = 0.7
     max_tokens = 2048
+    # deterministic 模式使用的 seed
+    seed = int(os.getenv("MODEL_SEED", "42"))
+    max_retries = int(os.getenv("MODEL_MAX_RETRIES", "2"))
+    # 按任务绑定模型：城市代码提取与地图 (POI 提取 / 工具调用) 是高频的小调用，使用更便宜更快的模型；
+    # timeout 为单次请求 (流式时为相邻两次读取) 的超时（秒）
+    tasks = {
+        "city_code": _model_task("CITY_CODE", "qwen-turbo-latest", 0, 256, 15, deterministic=True),
+        "map_vis": _model_task("MAP_VIS", "qwen-turbo-latest", 0, 1024, 60, deterministic=True),
+        "plan": _model_task("PLAN", model_name, temperature, max_tokens, 60, deterministic=False),
+    }
+
+
+
+class PromptConfig:
+    # 旅行计划使用的提示词模板版本 (app/promopt/travel_plan.py)，用于对比不同版本的成本与首 token 耗时
+    travel_plan_version = os.getenv("PROMPT_TRAVEL_PLAN_VERSION", "2")
+    # 本地统计 token 数使用的 tiktoken 编码；tiktoken 不可用或编码无法加载时按字符数估算，设为 estimate 直接估算
+    tokenizer = os.getenv("PROMPT_TOKENIZER", "o200k_base")
+
+
+class FlightApiConfig:
+    url = os.getenv("FLIGHT_API_URL", "https://booking-com.p.rapidapi.com/v1/flights/search")
+    host = "booking-com.p.rapidapi.com"
+    api_key = os.getenv("RAPID_API_KEY")
+    # 超时（秒）
+    connect_timeout = float(os.getenv("FLIGHT_API_CONNECT_TIMEOUT", "3"))
+    read_timeout = float(os.getenv("FLIGHT_API_READ_TIMEOUT", "15"))
+    pool_timeout = float(os.getenv("FLIGHT_API_POOL_TIMEOUT", "5"))
+    # 连接池
+    max_connections = int(os.getenv("FLIGHT_API_MAX_CONNECTIONS", "200"))
+    max_keepalive_connections = int(os.getenv("FLIGHT_API_MAX_KEEPALIVE", "50"))
+    keepalive_expiry = float(os.getenv("FLIGHT_API_KEEPALIVE_EXPIRY", "30"))
+    # 重试（指数退避 + full jitter）
+    max_retries = int(os.getenv("FLIGHT_API_MAX_RETRIES", "2"))
+    backoff_base = float(os.getenv("FLIGHT_API_BACKOFF_BASE", "0.3"))
+    backoff_max = float(os.getenv("FLIGHT_API_BACKOFF_MAX", "3"))
+    # 每次搜索返回的报价数量
+    max_offers = int(os.getenv("FLIGHT_API_MAX_OFFERS", "3"))
+    # 边接收边解析响应，取到 max_offers 条报价后不再读取剩余内容
+    incremental_parse = os.getenv("FLIGHT_API_INCREMENTAL_PARSE", "true").lower() == "true"
+    # 按 API key 限速（令牌桶），0 表示不限速
+    rate_per_second = float(os.getenv("FLIGHT_API_RATE_PER_SECOND", "5"))
+    rate_burst = float(os.getenv("FLIGHT_API_RATE_BURST", "5"))
+    # 按 (航线, 日期, 人数, 页码) 缓存搜索结果
+    search_cache_ttl = float(os.getenv("FLIGHT_SEARCH_CACHE_TTL", "600"))
+    search_cache_max_entries = int(os.getenv("FLIGHT_SEARCH_CACHE_MAX_ENTRIES", "2000"))
+
+
+class FareCalendarConfig:
+    # 出发 / 返程日期前后最多各浮动的天数
+    max_days = int(os.getenv("FARE_CALENDAR_MAX_DAYS", "3"))
+    # 所有价格日历请求共享的并发搜索数上限
+    concurrency = int(os.getenv("FARE_CALENDAR_CONCURRENCY", "4"))
+
+
+class CacheConfig:
+    # 共享缓存后端：memory (默认，进程内) / sqlite (同一主机的所有 worker 共享) / redis (任何兼容 Redis 协议的服务)
+    backend = os.getenv("CACHE_BACKEND", "memory").lower()
+    sqlite_path = os.getenv("CACHE_SQLITE_PATH", os.path.join(cache_dir, "cache.db"))
+    sqlite_busy_timeout = float(os.getenv("CACHE_SQLITE_BUSY_TIMEOUT", "5"))
+    # 每写入多少次检查一次条目数上限
+    sqlite_evict_every = int(os.getenv("CACHE_SQLITE_EVICT_EVERY", "100"))
+    redis_url = os.getenv("CACHE_REDIS_URL", "redis://127.0.0.1:6379/0")
+    redis_max_connections = int(os.getenv("CACHE_REDIS_MAX_CONNECTIONS", "16"))
+    redis_timeout = float(os.getenv("CACHE_REDIS_TIMEOUT", "2"))
+    # 连不上服务后多久再重试连接（秒），期间按未命中处理
+    redis_retry_interval = float(os.getenv("CACHE_REDIS_RETRY_INTERVAL", "5"))
+    # get-or-compute 的跨进程租约：持有者最长计算时间与其他进程轮询结果的间隔（秒）
+    lease_timeout = float(os.getenv("CACHE_LEASE_TIMEOUT", "60"))
+    lease_poll_interval = float(os.getenv("CACHE_LEASE_POLL_INTERVAL", "0.05"))
+
+
+class CityCodeConfig:
+    # 内置的 城市/别名 -> IATA 城市代码 表
+    table_path = os.path.join(res_dir, "iata_cities.json")
+    # LLM 兜底结果的缓存，存放在共享缓存后端 (CacheConfig)
+    cache_max_entries = int(os.getenv("CITY_CODE_CACHE_MAX_ENTRIES", "5000"))
+    positive_ttl = int(os.getenv("CITY_CODE_POSITIVE_TTL", str(30 * 24 * 3600)))
+    negative_ttl = int(os.getenv("CITY_CODE_NEGATIVE_TTL", str(24 * 3600)))
+    # 批量解析时每次调用大模型最多携带的地名数
+    batch_size = int(os.getenv("CITY_CODE_BATCH_SIZE", "50"))
+
+
+class PlanCacheConfig:
+    enabled = os.getenv("PLAN_CACHE_ENABLED", "true").lower() == "true"
+    ttl = int(os.getenv("PLAN_CACHE_TTL", str(6 * 3600)))
+    # 内存层上限（按 plan + map 文本字符数估算）
+    max_memory_chars = int(os.getenv("PLAN_CACHE_MAX_MEMORY_CHARS", str(64 * 1024 * 1024)))
+    # 共享层 (CacheConfig 的 sqlite / redis 后端)，多个 uvicorn worker 共享
+    shared = os.getenv("PLAN_CACHE_SHARED", "true").lower() == "true"
+    shared_max_entries = int(os.getenv("PLAN_CACHE_SHARED_MAX_ENTRIES", "5000"))
+    # 命中时的回放节奏
+    replay_chunk_chars = int(os.getenv("PLAN_CACHE_REPLAY_CHUNK_CHARS", "64"))
+    replay_interval = float(os.getenv("PLAN_CACHE_REPLAY_INTERVAL", "0.01"))
+
+
+class McpPoolConfig:
+    url = os.getenv("VIS_MCP_HTTP_API_KEY")
+    # 最大会话数，同时也是 map-vis 对 MCP 服务的最大并发
+    max_size = int(os.getenv("MCP_POOL_MAX_SIZE", "8"))
+    # 启动时预热的会话数
+    min_size = int(os.getenv("MCP_POOL_MIN_SIZE", "1"))
+    connect_timeout = float(os.getenv("MCP_POOL_CONNECT_TIMEOUT", "15"))
+    # 空闲超过该时间的会话会被回收（秒）
+    idle_timeout = float(os.getenv("MCP_POOL_IDLE_TIMEOUT", "300"))
+    reap_interval = float(os.getenv("MCP_POOL_REAP_INTERVAL", "30"))
+    # 空闲超过该时间的会话在复用前先 ping 一次
+    health_check_interval = float(os.getenv("MCP_POOL_HEALTH_CHECK_INTERVAL", "30"))
+    ping_timeout = float(os.getenv("MCP_POOL_PING_TIMEOUT", "5"))
+
+
+class MapVisConfig:
+    # 从行程中解析出的 POI 少于该数量时，回退到 ReAct agent
+    min_pois = int(os.getenv("MAP_VIS_MIN_POIS", "3"))
+    max_pois = int(os.getenv("MAP_VIS_MAX_POIS", "20"))
+    pin_map_tool = "generate_pin_map"
+    # 行程生成过程中，每完成一天就推送一次局部地图（前端会依次追加展示）
+    partial_updates = os.getenv("MAP_VIS_PARTIAL_UPDATES", "false").lower() == "true"
+    # 已识别的 POI 名称与生成过的地图存放在共享缓存后端 (CacheConfig)，热门目的地的地图直接复用
+    cache_enabled = os.getenv("MAP_VIS_CACHE_ENABLED", "true").lower() == "true"
+    spec_ttl = int(os.getenv("MAP_VIS_SPEC_TTL", str(7 * 24 * 3600)))
+    spec_max_entries = int(os.getenv("MAP_VIS_SPEC_MAX_ENTRIES", "5000"))
+    poi_ttl = int(os.getenv("MAP_VIS_POI_TTL", str(30 * 24 * 3600)))
+    # 每个目的地最多记录的 POI 数，超过后淘汰最早的
+    poi_max_per_destination = int(os.getenv("MAP_VIS_POI_MAX_PER_DESTINATION", "500"))
+    # 用行程文本补足 POI 时，名称 (去掉目的地前缀后) 至少多少个字符才参与匹配，过短的名称容易误中 ("中山" / "西湖边")
+    poi_supplement_min_chars = int(os.getenv("MAP_VIS_POI_SUPPLEMENT_MIN_CHARS", "3"))
+    poi_max_destinations = int(os.getenv("MAP_VIS_POI_MAX_DESTINATIONS", "2000"))
+
+
+class FlightPrefetchConfig:
+    # /travel/chat 收到请求时就在后台开始查城市代码和航班
+    enabled = os.getenv("FLIGHT_PREFETCH_ENABLED", "true").lower() == "true"
+    ttl = float(os.getenv("FLIGHT_PREFETCH_TTL", "300"))
+
+
+class StreamBudgetConfig:
+    # 单个旅行计划请求（文本 + 地图）的最长耗时（秒）
+    max_seconds = float(os.getenv("STREAM_MAX_SECONDS", "180"))
+    # 单个请求最多消费的输出 token 数，超过后截断文本直接进入地图阶段
+    max_output_tokens = int(os.getenv("STREAM_MAX_OUTPUT_TOKENS", str(ModelConfig.tasks["plan"]["max_tokens"])))
+
+
+class StreamResumeConfig:
+    # 断线重连 (Last-Event-ID) 可续传的时间窗口：生成结束后保留事件的时长（秒）与总字符数上限
+    retain_ttl = float(os.getenv("STREAM_RESUME_RETAIN_TTL", "600"))
+    retain_max_chars = int(os.getenv("STREAM_RESUME_RETAIN_MAX_CHARS", str(16 * 1024 * 1024)))
+    # 最后一个客户端断开后，等待多久没有重连才取消上游生成（秒），0 表示立即取消。
+    # 这段时间里上游仍在消耗 token：断开即取消 (StreamBudgetConfig) 的效果相应推迟，应略大于 client_retry_ms
+    cancel_grace = float(os.getenv("STREAM_RESUME_CANCEL_GRACE", "3"))
+    # 通过 SSE 的 retry 字段告诉浏览器断线后多久重连（毫秒）
+    client_retry_ms = int(os.getenv("STREAM_RESUME_CLIENT_RETRY_MS", "1000"))
+
+
+class SseConfig:
+    # chat_text 增量的合并窗口：距上次发送超过 N 毫秒或累计超过 M 个字符时发送一帧
+    # 两者都为 0 时每个 token 单独一帧
+    coalesce_ms = float(os.getenv("SSE_COALESCE_MS", "30"))
+    coalesce_chars = int(os.getenv("SSE_COALESCE_CHARS", "1024"))
+
+
+class AiqConfig:
+    # 同时运行的 workflow 数量上限
+    max_concurrency = int(os.getenv("AIQ_MAX_CONCURRENCY", "4"))
+    # workflow 不支持流式输出时，完整结果按该大小分块输出
+    fallback_chunk_chars = int(os.getenv("AIQ_FALLBACK_CHUNK_CHARS", "256"))
+
+
+def _upstream_limits(prefix: str, max_concurrency: int, max_queue: int, queue_timeout: float,
+                     rate_per_second: float, failure_threshold: int, reset_timeout: float) -> dict:
+    """Admission limits of one upstream, each overridable as {PREFIX}_{NAME} env var"""
+    def env(name, default, cast):
+        return cast(os.getenv(f"{prefix}_{name}", str(default)))
+
+    rate = env("RATE_PER_SECOND", rate_per_second, float)
+    return {
+        "max_concurrency": env("MAX_CONCURRENCY", max_concurrency, int),
+        "max_queue": env("MAX_QUEUE", max_queue, int),
+        "queue_timeout": env("QUEUE_TIMEOUT", queue_timeout, float),
+        "rate_per_second": rate,
+        "burst": env("RATE_BURST", max(rate, 1), float),
+        "failure_threshold": env("FAILURE_THRESHOLD", failure_threshold, int),
+        "reset_timeout": env("RESET_TIMEOUT", reset_timeout, float),
+    }
+
+
+class AdmissionConfig:
+    # 每个上游：并发上限、等待队列长度、排队超时（秒）、每秒请求数（0 不限速）、
+    # 连续失败多少次后熔断（0 不熔断）、熔断多久后试探恢复（秒）
+    # RapidAPI 的按 key 限速见 FlightApiConfig.rate_per_second
+    llm = _upstream_limits("LLM", max_concurrency=32, max_queue=64, queue_timeout=10,
+                           rate_per_second=0, failure_threshold=5, reset_timeout=30)
+    mcp = _upstream_limits("MCP", max_concurrency=8, max_queue=16, queue_timeout=5,
+                           rate_per_second=0, failure_threshold=3, reset_timeout=60)
+    flight = _upstream_limits("FLIGHT", max_concurrency=16, max_queue=64, queue_timeout=10,
+                              rate_per_second=0, failure_threshold=5, reset_timeout=30)
+
+
+class BatchConfig:
+    # 批量生成旅行计划：并发 worker 数、单条失败后的重试次数与退避（秒）
+    concurrency = int(os.getenv("BATCH_CONCURRENCY", "4"))
+    max_retries = int(os.getenv("BATCH_MAX_RETRIES", "2"))
+    backoff_base = float(os.getenv("BATCH_BACKOFF_BASE", "2"))
+    backoff_max = float(os.getenv("BATCH_BACKOFF_MAX", "60"))
+    # /travel/batch 接口单次请求最多的条数，更大的批量请使用命令行 python -m app.batch
+    max_items = int(os.getenv("BATCH_MAX_ITEMS", "100"))
+
+
+class StartupConfig:
+    # 启动预热：导入模型 / MCP 客户端库、构造模型客户端、建立 MCP 会话
+    # background: 后台预热，服务立即可用；blocking: 预热完成后才开始接收请求；off: 首次使用时再构造
+    warm_up = os.getenv("STARTUP_WARM_UP", "background").lower()
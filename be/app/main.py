@@ -6,14 +6,58 @@ This is an alternative to main.py that shows how to organize the code with route
 from dotenv import load_dotenv
 load_dotenv()
 
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from app.routers import travel
-from app.config import setup_logging
+from app.config import StartupConfig, setup_logging
+from app.services.aiq import workflow_registry
+from app.services.cache_backend import aclose_cache_backends
+from app.services.flight import flight_api_client
+from app.services.lang import lang_chain_service
+from app.services.mcp_pool import mcp_session_pool
+from app.services.metrics import registry
 
 # Initialize logging
 setup_logging()
 
+logger = logging.getLogger(__name__)
+
+
+async def warm_up():
+    """Import the heavy client libraries, build the model client and open MCP sessions"""
+    started = time.perf_counter()
+    try:
+        await asyncio.to_thread(lang_chain_service.warm_up)
+        await mcp_session_pool.warm_up()
+    except Exception as e:
+        # 预热失败不影响服务，首次使用时会再构造
+        logger.warning(f"warm-up failed: {e!r}")
+        return
+    logger.info(f"warm-up finished in {time.perf_counter() - started:.3f}s")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 共享的 HTTP / MCP 连接池随应用生命周期创建与释放
+    await mcp_session_pool.start()
+    warm_up_task = None
+    if StartupConfig.warm_up == "blocking":
+        await warm_up()
+    elif StartupConfig.warm_up == "background":
+        warm_up_task = asyncio.create_task(warm_up())
+    yield
+    if warm_up_task is not None:
+        warm_up_task.cancel()
+    await mcp_session_pool.aclose()
+    await workflow_registry.aclose()
+    await flight_api_client.aclose()
+    await aclose_cache_backends()
+
 
 # Create FastAPI app instance
 app = FastAPI(
@@ -21,7 +65,8 @@ app = FastAPI(
     description="A clean FastAPI backend application with modular structure",
     version="0.1.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan,
 )
 
 # Add CORS middleware
@@ -37,6 +82,10 @@ app.add_middleware(
 async def health():
     return 'service up'
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 # Include routers
 app.include_router(travel.router, prefix="/api/v1")
 
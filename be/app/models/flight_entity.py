@@ -0,0 +1,142 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+#
+# Flight search result entities
+#
+# 每次搜索会返回多条报价，使用 slots dataclass 而不是嵌套 dict，构造与内存开销都更小；
+# 返回给前端时通过 to_dict() 转成原有的 JSON 结构，from_dict() 用于从共享缓存中还原
+#
+
+
+@dataclass(slots=True)
+class Airport:
+    code: str = ""
+    name: str = ""
+    city: str = ""
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"code": self.code, "name": self.name, "city": self.city}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Airport":
+        return cls(**data)
+
+
+@dataclass(slots=True)
+class FlightSegment:
+    departure_airport: Airport
+    arrival_airport: Airport
+    departure_time: str = ""
+    arrival_time: str = ""
+    # in minutes
+    duration: int = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "departure_airport": self.departure_airport.to_dict(),
+            "arrival_airport": self.arrival_airport.to_dict(),
+            "departure_time": self.departure_time,
+            "arrival_time": self.arrival_time,
+            "duration": self.duration,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "FlightSegment":
+        return cls(
+            departure_airport=Airport.from_dict(data["departure_airport"]),
+            arrival_airport=Airport.from_dict(data["arrival_airport"]),
+            departure_time=data["departure_time"],
+            arrival_time=data["arrival_time"],
+            duration=data["duration"],
+        )
+
+
+@dataclass(slots=True)
+class Airline:
+    code: str = ""
+    flight_no: Any = ""
+    name: str = ""
+    logo: str = ""
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"code": self.code, "flight_no": self.flight_no, "name": self.name, "logo": self.logo}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Airline":
+        return cls(**data)
+
+
+@dataclass(slots=True)
+class Price:
+    total: float = 0
+    currency: str = "CNY"
+    base_fare: float = 0
+    tax: float = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"total": self.total, "currency": self.currency, "base_fare": self.base_fare, "tax": self.tax}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Price":
+        return cls(**data)
+
+
+@dataclass(slots=True)
+class FlightOffer:
+    outbound: FlightSegment
+    airline: Airline
+    price: Price
+    # Number of stops on the outbound segment
+    stops: int
+    return_segment: Optional[FlightSegment] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "outbound": self.outbound.to_dict(),
+            "return": self.return_segment.to_dict() if self.return_segment else None,
+            "airline": self.airline.to_dict(),
+            "price": self.price.to_dict(),
+            "stops": self.stops,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "FlightOffer":
+        return cls(
+            outbound=FlightSegment.from_dict(data["outbound"]),
+            return_segment=FlightSegment.from_dict(data["return"]) if data.get("return") else None,
+            airline=Airline.from_dict(data["airline"]),
+            price=Price.from_dict(data["price"]),
+            stops=data["stops"],
+        )
+
+
+@dataclass(slots=True)
+class FlightSearchResult:
+    offers: List[FlightOffer] = field(default_factory=list)
+    # 整个搜索结果 (不只是返回的几条报价) 中的最低价，来自响应的 aggregation
+    min_price: Optional[float] = None
+    currency: str = "CNY"
+    total_count: int = 0
+
+    def cheapest(self) -> Optional[float]:
+        if self.min_price is not None:
+            return self.min_price
+        return min((offer.price.total for offer in self.offers), default=None)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "offers": [offer.to_dict() for offer in self.offers],
+            "min_price": self.min_price,
+            "currency": self.currency,
+            "total_count": self.total_count,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "FlightSearchResult":
+        return cls(
+            offers=[FlightOffer.from_dict(offer) for offer in data["offers"]],
+            min_price=data["min_price"],
+            currency=data["currency"],
+            total_count=data["total_count"],
+        )
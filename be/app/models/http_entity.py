@@ -1,3 +1,6 @@
+import hashlib
+import json
+import unicodedata
 from typing import Any
 from pydantic import BaseModel
 
@@ -11,6 +14,21 @@ class TravelPlanRequest(BaseModel):
     to_date: str
     people_num: int
     others: str
+    # 航班搜索结果页码，不影响旅行计划
+    page_number: int = 0
+
+    def canonical_key(self) -> str:
+        """Stable key shared by requests that differ only in case / whitespace"""
+        fields = [
+            self.from_place,
+            self.to_place,
+            self.from_date,
+            self.to_date,
+            str(self.people_num),
+            self.others,
+        ]
+        normalized = [" ".join(unicodedata.normalize("NFKC", field or "").split()).lower() for field in fields]
+        return hashlib.sha256(json.dumps(normalized, ensure_ascii=False).encode("utf-8")).hexdigest()
 
 #
 # Http Response entities
@@ -19,3 +37,10 @@ class BaseHttpResponse(BaseModel):
     code: int = 0
     message: str = ""
     data: Any = None
+
+
+class SseContentType:
+    CHAT_TEXT = "chat_text"
+    MAP_VIS = "map_vis"
+    FARE_ROW = "fare_row"
+    FARE_MATRIX = "fare_matrix"
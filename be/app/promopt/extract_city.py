@@ -14,4 +14,21 @@ EXTRACT_CITY_PROMPT = """
 ```
 
 请严格返回 json 格式，不要返回任何其他内容以便于我进行解析。
-"""
\ No newline at end of file
+"""
+
+EXTRACT_CITIES_PROMPT = """
+请帮我把下面 json 数组中的每个地名分别转换为标准的 IATA 城市代码
+
+{input}
+
+例如 上海 转换为 SHA, 东京转化为 TYO, 香港转换为 HKG
+
+返回一个 json 对象，key 为数组中原样的地名，value 为对应的 IATA 城市代码，格式如下：
+```
+{{"上海": "SHA", "东京": "TYO"}}
+```
+
+如果你发现某个地名 不存在 IATA 码，对应的 value 返回 null
+
+请严格返回 json 格式，不要返回任何其他内容以便于我进行解析。
+"""
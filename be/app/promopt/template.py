@@ -0,0 +1,66 @@
+from dataclasses import dataclass
+from string import Formatter
+from typing import Dict, List, Tuple
+
+#
+# Versioned prompt templates
+#
+# system 部分不含任何变量，所有请求完全相同，放在最前面，可以命中模型服务的前缀 (上下文) 缓存；
+# 随请求变化的内容放在最后的 user 消息里
+#
+
+
+@dataclass(frozen=True)
+class PromptTemplate:
+    name: str
+    version: str
+    # 稳定前缀，作为 system 消息发送；为空时只发送一条 user 消息
+    system: str
+    # 变量部分，str.format 模板
+    user: str
+
+    @property
+    def key(self) -> str:
+        return f"{self.name}:v{self.version}"
+
+    @property
+    def static_prefix(self) -> str:
+        """Leading text identical for every request: the system message plus the user text before the first field"""
+        literal, *_ = next(iter(Formatter().parse(self.user)), ("", None, None, None))
+        return self.system + (literal or "")
+
+    def render(self, **fields) -> "RenderedPrompt":
+        return RenderedPrompt(template=self, user=self.user.format(**fields))
+
+
+@dataclass(frozen=True)
+class RenderedPrompt:
+    template: PromptTemplate
+    user: str
+
+    @property
+    def messages(self) -> List[Tuple[str, str]]:
+        """(role, content) pairs accepted by LangChain chat models"""
+        if not self.template.system:
+            return [("human", self.user)]
+        return [("system", self.template.system), ("human", self.user)]
+
+    @property
+    def text(self) -> str:
+        return self.template.system + self.user
+
+
+_templates: Dict[Tuple[str, str], PromptTemplate] = {}
+
+
+def register_template(template: PromptTemplate) -> PromptTemplate:
+    _templates[(template.name, template.version)] = template
+    return template
+
+
+def get_template(name: str, version: str) -> PromptTemplate:
+    try:
+        return _templates[(name, version)]
+    except KeyError:
+        versions = sorted(v for n, v in _templates if n == name)
+        raise ValueError(f"unknown prompt template {name} v{version}, available: {versions}") from None
@@ -1,3 +1,8 @@
+from app.promopt.template import PromptTemplate, register_template
+
+# 修改模板内容时请新增一个版本号，已缓存的旅行计划按版本区分；使用的版本见 PromptConfig.travel_plan_version
+
+# v1: 用户信息在前、格式说明在后，单条 user 消息
 TRAVEL_PLAN_PROMPT = """
 你是一个专业的旅行规划师，擅长为用户制定详细的旅行计划。请根据用户提供的信息，为他们制定一个完整、实用的旅行方案。
 
@@ -49,4 +54,68 @@ TRAVEL_PLAN_PROMPT = """
 - 其他实用建议
 
 请确保所有建议都是实用、具体、可执行的，并考虑到用户的人数、时间和用户的其他要求。
-"""
\ No newline at end of file
+"""
+
+TRAVEL_PLAN_PROMPT_V1 = register_template(PromptTemplate(
+    name="travel_plan",
+    version="1",
+    system="",
+    user=TRAVEL_PLAN_PROMPT,
+))
+
+# v2: 角色与格式说明作为不含变量的 system 消息放在最前面，所有请求共享同一前缀；用户信息放在最后
+TRAVEL_PLAN_PROMPT_V2 = register_template(PromptTemplate(
+    name="travel_plan",
+    version="2",
+    system="""你是一个专业的旅行规划师，擅长为用户制定详细的旅行计划。请根据用户提供的信息，为他们制定一个完整、实用的旅行方案。
+
+请按以下格式提供详细的旅行计划：
+
+## 🗺️ 旅行概览
+- 总行程天数：X天
+- 旅行类型：[休闲/商务/探险/文化等]
+- 预算建议：[根据目的地和行程给出大致预算范围]
+
+## 🏨 住宿推荐
+- 推荐住宿区域及原因
+- 不同价位的酒店选择
+- 预订建议及注意事项
+
+## 📅 每日行程安排
+[为每一天制定详细的行程安排，包括：]
+- 上午活动
+- 下午活动  
+- 晚上安排
+- 用餐建议
+- 景点介绍及游览时间
+
+
+## 🍽️ 美食推荐
+- 当地特色菜品
+- 推荐餐厅
+- 用餐预算参考
+
+## ⚠️ 注意事项
+- 当地天气及穿衣建议
+- 文化禁忌与礼仪
+- 安全提醒
+- 必备物品清单
+- 紧急联系方式
+
+## 💡 实用贴士
+- 省钱技巧
+- 最佳游览时间
+- 拍照推荐地点
+- 其他实用建议
+
+请确保所有建议都是实用、具体、可执行的，并考虑到用户的人数、时间和用户的其他要求。
+""",
+    user="""请根据以下信息制定旅行计划：
+- 出发地：{from_place}
+- 目的地：{to_place}
+- 出发日期：{from_date}
+- 返回日期：{to_date}
+- 人数：{people_num}人
+- 其他要求：{others}
+""",
+))
@@ -2,14 +2,23 @@
 Travel Chat API Router
 """
 
-import asyncio
-from fastapi import APIRouter, Depends
-from fastapi.responses import StreamingResponse
-from app.promopt.travel_plan import TRAVEL_PLAN_PROMPT
-from app.services.flight import fetch_flight_info
-from app.services.lang import lang_chain_service
+import json
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, Header, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from app.services.lang import build_travel_plan_prompt, lang_chain_service
 from app.models.http_entity import BaseHttpResponse, TravelPlanRequest
-from app.services.city import get_city_code
+from app.services.coalesce import travel_plan_coalescer
+from app.services.plan_cache import plan_cache, plan_cache_key, replay_plan
+from app.services.prefetch import flight_prefetcher
+from app.services.fare_calendar import fare_calendar_stream
+from app.services.batch import run_batch
+from app.services.admission import UpstreamBusy, llm_admission
+from app.services.budget import stream_until_disconnected
+from app.services.metrics import ServerTiming
+from app.services.sse import busy_frame
+from app.config import BatchConfig, FlightPrefetchConfig, PlanCacheConfig
 
 
 router = APIRouter(
@@ -17,50 +26,140 @@ router = APIRouter(
     tags=["travel"],
 )
 
-@router.get("/chat")
-async def travel_chat(params: TravelPlanRequest = Depends()):
-    prompt = TRAVEL_PLAN_PROMPT.format(
-        from_place=params.from_place,
-        to_place=params.to_place,
-        from_date=params.from_date,
-        to_date=params.to_date,
-        people_num=params.people_num,
-        others=params.others
+def _busy_response(e: UpstreamBusy) -> JSONResponse:
+    return JSONResponse(
+        status_code=503,
+        content=BaseHttpResponse(code=503, message=str(e), data={"retry_after": e.retry_after}).model_dump(),
+        headers={"Retry-After": str(int(e.retry_after))},
     )
 
+
+def _busy_stream(e: UpstreamBusy) -> StreamingResponse:
+    # EventSource 读不到非 200 响应的内容，与流中途繁忙时一样返回一个 [BUSY] 事件，前端按 retry_after 提示
+    async def busy():
+        yield busy_frame(e.retry_after)
+
+    return StreamingResponse(
+        busy(),
+        media_type="text/event-stream",
+        headers={
+            "Retry-After": str(int(e.retry_after)),
+            "Cache-Control": "no-cache",
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Headers": "Cache-Control, Last-Event-ID",
+        }
+    )
+
+
+@router.get("/chat")
+async def travel_chat(request: Request, params: TravelPlanRequest = Depends(),
+                      last_event_id: Optional[str] = Header(None, alias="Last-Event-ID")):
+    prompt = build_travel_plan_prompt(params)
+
     """Stream chat response for travel planning"""
+    # 前端随后会用同样的参数调用 /flight-search，提前在后台开始查询
+    if FlightPrefetchConfig.enabled:
+        flight_prefetcher.start(params)
+
+    timing = ServerTiming()
+    stream_key = params.canonical_key()
+    cached_plan = None
+    # 断线重连：生成还在进行或刚结束不久时，从 Last-Event-ID 的下一个事件继续
+    resumed = travel_plan_coalescer.can_resume(stream_key, last_event_id)
+    if not resumed:
+        with timing.measure("plan_cache"):
+            cached_plan = await plan_cache.get(plan_cache_key(params)) if PlanCacheConfig.enabled else None
+
+    if cached_plan is not None:
+        # 命中缓存，直接回放，不调用模型
+        stream = replay_plan(cached_plan)
+    else:
+        # 没有可共享的生成流且模型已经排满 / 熔断时，直接拒绝，不再排队
+        if not resumed and not travel_plan_coalescer.is_streaming(stream_key):
+            try:
+                llm_admission.check()
+            except UpstreamBusy as e:
+                return _busy_stream(e)
+        # 相同的请求共享同一个上游 LLM 生成流
+        stream = travel_plan_coalescer.subscribe(
+            stream_key,
+            lambda: lang_chain_service.streaming_chat(params, prompt),
+            last_event_id=last_event_id if resumed else None,
+        )
+
     return StreamingResponse(
-        lang_chain_service.streaming_chat(params, prompt),
+        # 客户端断开后立即停止，最后一个订阅者离开且宽限期内没有重连时，上游 LLM / 地图任务随之取消
+        stream_until_disconnected(request, stream),
         media_type="text/event-stream",
         headers={
+            "X-Plan-Cache": "hit" if cached_plan is not None else "miss",
+            "X-Stream-Resumed": "true" if resumed else "false",
+            "X-Plan-Cache-Hits": str(plan_cache.hits),
+            "X-Plan-Cache-Misses": str(plan_cache.misses),
+            "Server-Timing": timing.header(),
             "Cache-Control": "no-cache",
             "Connection": "keep-alive",
             "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Headers": "Cache-Control",
+            "Access-Control-Allow-Headers": "Cache-Control, Last-Event-ID",
             "X-Accel-Buffering": "no"  # 禁用nginx缓冲
         }
     )
 
 @router.get("/flight-search")
-async def flight_search(params: TravelPlanRequest = Depends()):
-    # 并发请求两个城市代码
-    from_place, to_place = await asyncio.gather(
-        get_city_code(params.from_place),
-        get_city_code(params.to_place)
-    )
+async def flight_search(response: Response, params: TravelPlanRequest = Depends()):
+    # 如果 /chat 已经预取过，直接复用（或等待）同一个查询任务
+    timing = ServerTiming()
+    try:
+        with timing.measure("flight_search"):
+            flight_info = await flight_prefetcher.get(params)
+    except UpstreamBusy as e:
+        return _busy_response(e)
+    response.headers["Server-Timing"] = timing.header()
 
-    if not from_place or not to_place:
+    if flight_info is None:
         return BaseHttpResponse(
             code=400,
             message="Invalid city code",
         )
 
-    flight_info = fetch_flight_info(
-        from_place, 
-        to_place,
-        params.from_date,
-        params.to_date
-    )
     return BaseHttpResponse(
-        data=flight_info
+        data=[offer.to_dict() for offer in flight_info]
+    )
+
+
+@router.get("/fare-calendar")
+async def fare_calendar(request: Request, params: TravelPlanRequest = Depends(),
+                        days: int = Query(1, ge=0, description="出发 / 返程日期前后浮动的天数")):
+    """Stream a price matrix for departure / return dates within ±days"""
+    return StreamingResponse(
+        stream_until_disconnected(request, fare_calendar_stream(params, days)),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+
+@router.post("/batch")
+async def travel_batch(request: Request, requests: List[TravelPlanRequest],
+                       with_map: bool = Query(True), with_flights: bool = Query(False)):
+    """Generate plans for a list of requests, streaming one JSON line per unique request"""
+    if len(requests) > BatchConfig.max_items:
+        return JSONResponse(
+            status_code=413,
+            content=BaseHttpResponse(
+                code=413, message=f"at most {BatchConfig.max_items} requests per batch, use python -m app.batch",
+            ).model_dump(),
+        )
+
+    async def lines():
+        async for record in run_batch(requests, with_map=with_map, with_flights=with_flights):
+            yield json.dumps(record, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(
+        stream_until_disconnected(request, lines()),
+        media_type="application/x-ndjson",
+        headers={"X-Accel-Buffering": "no"},
     )
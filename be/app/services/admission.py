@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Dict, Optional
+
+from app.config import AdmissionConfig
+from app.services.metrics import ADMISSION_REJECTED, ADMISSION_WAIT_SECONDS, registry
+from app.services.ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+class UpstreamBusy(Exception):
+    """Raised instead of queueing when an upstream is saturated or its circuit is open"""
+
+    def __init__(self, upstream: str, reason: str, retry_after: float):
+        super().__init__(f"{upstream} is busy ({reason}), retry after {retry_after:.0f}s")
+        self.upstream = upstream
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures
+
+    While open every call is rejected; after `reset_timeout` seconds a single
+    trial call is let through (half-open) and its outcome closes or reopens
+    the circuit.
+    """
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+
+    @property
+    def retry_after(self) -> float:
+        return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    def allow(self) -> bool:
+        if self.failure_threshold <= 0 or self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and self.retry_after == 0:
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN and not self._trial_running:
+            self._trial_running = True
+            return True
+        return False
+
+    def release_trial(self):
+        # 半开状态的试探调用没有得出结果 (被取消 / 被拒绝)，允许下一个调用继续试探
+        self._trial_running = False
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self._trial_running = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_running = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold > 0:
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+
+
+class AdmissionController:
+    """
+    Admission control for one upstream
+
+    At most `max_concurrency` calls run at once and at most `max_queue`
+    wait for a slot, each for up to `queue_timeout` seconds; a token bucket
+    caps the call rate. Calls beyond that, or while the circuit breaker is
+    open, fail fast with `UpstreamBusy` instead of piling up.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int, queue_timeout: float,
+                 rate_per_second: float, burst: float, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.in_flight = 0
+        self.waiting = 0
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._bucket = TokenBucket(rate_per_second, burst)
+
+    def check(self):
+        """
+        Fast pre-check before committing to a call, e.g. before opening an SSE stream
+
+        Raises:
+            UpstreamBusy: the circuit is open or the wait queue is full
+        """
+        if self.breaker.state == CircuitBreaker.OPEN and self.breaker.retry_after > 0:
+            self._reject("circuit_open", self.breaker.retry_after)
+        if self.in_flight >= self.max_concurrency and self.waiting >= self.max_queue:
+            self._reject("queue_full", self.queue_timeout)
+
+    @asynccontextmanager
+    async def admit(self, is_failure: Optional[Callable[[Exception], bool]] = None) -> AsyncIterator[None]:
+        """
+        Hold a slot for the duration of the block; failures inside count against the circuit
+
+        Args:
+            is_failure: decides whether an exception raised in the block is an
+                upstream failure (e.g. a 4xx caused by our request is not); all are by default
+
+        Raises:
+            UpstreamBusy: rejected before the block runs
+        """
+        self.check()
+        if not self.breaker.allow():
+            self._reject("circuit_open", self.breaker.retry_after)
+
+        started = time.monotonic()
+        self.waiting += 1
+        try:
+            async with asyncio.timeout(self.queue_timeout):
+                await self._slots.acquire()
+                try:
+                    await self._bucket.acquire()
+                except BaseException:
+                    self._slots.release()
+                    raise
+        except TimeoutError:
+            self.breaker.release_trial()
+            self._reject("queue_timeout", self.queue_timeout)
+        except BaseException:
+            self.breaker.release_trial()
+            raise
+        finally:
+            self.waiting -= 1
+        ADMISSION_WAIT_SECONDS.observe(time.monotonic() - started, upstream=self.name)
+
+        self.in_flight += 1
+        try:
+            yield
+        except (asyncio.CancelledError, GeneratorExit, UpstreamBusy):
+            # 调用方取消 / 断开不代表上游故障
+            self.breaker.release_trial()
+            raise
+        except Exception as e:
+            if is_failure is None or is_failure(e):
+                self.breaker.record_failure()
+                if self.breaker.state == CircuitBreaker.OPEN:
+                    logger.warning(f"circuit for {self.name} opened after {self.breaker.failures} failures")
+            else:
+                self.breaker.record_success()
+            raise
+        else:
+            self.breaker.record_success()
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+
+    def stats(self) -> Dict:
+        return {
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "circuit": self.breaker.state,
+        }
+
+    def _reject(self, reason: str, retry_after: float):
+        ADMISSION_REJECTED.inc(upstream=self.name, reason=reason)
+        raise UpstreamBusy(self.name, reason, max(1.0, math.ceil(retry_after)))
+
+
+def _controller(name: str, limits: Dict) -> AdmissionController:
+    controller = AdmissionController(name, **limits)
+    registry.callback(f"dodo_upstream_{name}_in_flight", f"Calls in flight to {name}", "gauge",
+                      lambda: controller.in_flight)
+    registry.callback(f"dodo_upstream_{name}_waiting", f"Calls waiting for a {name} slot", "gauge",
+                      lambda: controller.waiting)
+    registry.callback(f"dodo_upstream_{name}_circuit_open", f"1 while the {name} circuit is not closed", "gauge",
+                      lambda: int(controller.breaker.state != CircuitBreaker.CLOSED))
+    return controller
+
+
+# DashScope (ChatOpenAI)、地图 MCP 服务、RapidAPI 各自独立限流与熔断
+llm_admission = _controller("llm", AdmissionConfig.llm)
+mcp_admission = _controller("mcp", AdmissionConfig.mcp)
+flight_admission = _controller("flight", AdmissionConfig.flight)
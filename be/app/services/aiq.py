@@ -1,48 +1,163 @@
 import asyncio
 import logging
-from typing import AsyncGenerator
+import os
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, Any, AsyncGenerator, AsyncIterator, Dict, Optional, Tuple
 
-from nat.runtime.loader import load_workflow
-from nat.utils.type_utils import StrPath
+from app.config import AiqConfig
+
+if TYPE_CHECKING:
+    from nat.utils.type_utils import StrPath
 
 logger = logging.getLogger(__name__)
 
-async def run_workflow(config_file: StrPath, input_str: str) -> str:
+
+class LoadedWorkflow:
+    """
+    A built workflow kept alive for the app's lifetime
+
+    `load_workflow` is entered and exited by a dedicated background task
+    (the builder's exit stack must be closed by the task that entered it).
+    """
+
+    def __init__(self, config_file: str, version: Tuple[int, int]):
+        self.config_file = config_file
+        # 配置文件的 (mtime, size)，变化时重新加载
+        self.version = version
+        self.workflow: Any = None
+        self.active = 0
+        self.retired = False
+        self._ready = asyncio.Event()
+        self._closing = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._error: Optional[BaseException] = None
+
+    @property
+    def alive(self) -> bool:
+        return self.workflow is not None
+
+    async def load(self):
+        self._task = asyncio.create_task(self._run())
+        await self._ready.wait()
+        if self._error is not None:
+            raise self._error
+
+    async def _run(self):
+        try:
+            from nat.runtime.loader import load_workflow
+
+            async with load_workflow(self.config_file) as workflow:
+                self.workflow = workflow
+                self._ready.set()
+                await self._closing.wait()
+        except Exception as e:
+            self._error = e
+            logger.warning(f"workflow {self.config_file} closed with error: {e!r}")
+        finally:
+            self.workflow = None
+            self._ready.set()
+
+    async def close(self):
+        self._closing.set()
+        if self._task is not None and not self._task.done():
+            try:
+                await asyncio.wait_for(self._task, 10)
+            except (asyncio.TimeoutError, Exception):
+                self._task.cancel()
+
+
+class WorkflowRegistry:
+    """
+    Loads each workflow config once and bounds concurrent runs
+
+    The config file is stat'ed on every run; when it changes the workflow is
+    rebuilt and the old one is closed once its in-flight runs finish.
+    """
+
+    def __init__(self, max_concurrency: int):
+        self._entries: Dict[str, LoadedWorkflow] = {}
+        self._lock = asyncio.Lock()
+        self._slots = asyncio.Semaphore(max_concurrency)
+
+    async def get(self, config_file: "StrPath") -> LoadedWorkflow:
+        path = os.path.abspath(os.fspath(config_file))
+        stat = os.stat(path)
+        version = (stat.st_mtime_ns, stat.st_size)
+
+        entry = self._entries.get(path)
+        if entry is not None and entry.version == version and entry.alive:
+            return entry
+
+        async with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry.version == version and entry.alive:
+                return entry
+
+            loaded = LoadedWorkflow(path, version)
+            await loaded.load()
+            self._entries[path] = loaded
+            logger.info(f"workflow {path} {'reloaded' if entry else 'loaded'}")
+            if entry is not None:
+                await self._retire(entry)
+            return loaded
+
+    @asynccontextmanager
+    async def run(self, config_file: "StrPath", input_str: str) -> AsyncIterator[Any]:
+        """Yield a runner of the cached workflow, waiting for a free slot first"""
+        async with self._slots:
+            entry = await self.get(config_file)
+            entry.active += 1
+            try:
+                async with entry.workflow.run(input_str) as runner:
+                    yield runner
+            finally:
+                entry.active -= 1
+                if entry.retired and entry.active == 0:
+                    await entry.close()
+
+    async def aclose(self):
+        entries, self._entries = list(self._entries.values()), {}
+        await asyncio.gather(*(entry.close() for entry in entries))
+
+    async def _retire(self, entry: LoadedWorkflow):
+        entry.retired = True
+        if entry.active == 0:
+            await entry.close()
+
+
+workflow_registry = WorkflowRegistry(max_concurrency=AiqConfig.max_concurrency)
+
+
+async def run_workflow(config_file: "StrPath", input_str: str) -> str:
     """Run workflow and return complete result"""
-    async with load_workflow(config_file) as workflow:
-        async with workflow.run(input_str) as runner:
-            return await runner.result(to_type=str)
+    async with workflow_registry.run(config_file, input_str) as runner:
+        return await runner.result(to_type=str)
 
-async def run_workflow_stream(config_file: StrPath, input_str: str) -> AsyncGenerator[str, None]:
+async def run_workflow_stream(config_file: "StrPath", input_str: str) -> AsyncGenerator[str, None]:
     """Run workflow and yield streaming results"""
-    async with load_workflow(config_file) as workflow:
-        async with workflow.run(input_str) as runner:
-            try:
-                # result_stream is already an async generator that yields streaming results
-                async for chunk in runner.result_stream(to_type=str):
-                    yield chunk
-
-            except ValueError as ve:
-                # This happens when workflow doesn't support streaming output
-                if "does not support streaming output" in str(ve):
-                    logger.warning("Workflow doesn't support streaming, falling back to chunked result")
-                    # Fallback to non-streaming result and chunk it
-                    result = await runner.result(to_type=str)
-                    # Split into smaller chunks for better streaming experience
-                    chunk_size = 50  # characters per chunk
-                    for i in range(0, len(result), chunk_size):
-                        chunk = result[i:i + chunk_size]
-                        yield chunk
-                        # Small delay to simulate streaming
-                        await asyncio.sleep(0.01)
-                else:
-                    logger.error(f"ValueError in workflow streaming: {str(ve)}")
-                    yield f"ValueError: {str(ve)}"
-            except Exception as e:
-                logger.error(f"Exception in workflow streaming: {str(e)}")
-                yield f"Error: {str(e)}"
-
-# Example call 
+    async with workflow_registry.run(config_file, input_str) as runner:
+        try:
+            # result_stream is already an async generator that yields streaming results
+            async for chunk in runner.result_stream(to_type=str):
+                yield chunk
+
+        except ValueError as ve:
+            # This happens when workflow doesn't support streaming output
+            if "does not support streaming output" in str(ve):
+                logger.warning("Workflow doesn't support streaming, falling back to chunked result")
+                # Fallback to non-streaming result and chunk it
+                result = await runner.result(to_type=str)
+                chunk_size = AiqConfig.fallback_chunk_chars
+                for i in range(0, len(result), chunk_size):
+                    yield result[i:i + chunk_size]
+            else:
+                logger.error(f"ValueError in workflow streaming: {str(ve)}")
+                yield f"ValueError: {str(ve)}"
+        except Exception as e:
+            logger.error(f"Exception in workflow streaming: {str(e)}")
+            yield f"Error: {str(e)}"
+
+# Example call
 # result = asyncio.run(
 #     run_workflow(
 #         config_file='./aiq_workflow_config.yml',
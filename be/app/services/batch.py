@@ -0,0 +1,147 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Collection, Dict, List, Optional
+
+import httpx
+
+from app.config import BatchConfig
+from app.models.http_entity import TravelPlanRequest
+from app.services.admission import UpstreamBusy
+from app.services.city import get_city_codes
+from app.services.flight import flight_search_cache
+from app.services.lang import lang_chain_service
+from app.services.plan_cache import plan_cache_key
+
+logger = logging.getLogger(__name__)
+
+
+class BatchStatus:
+    OK = "ok"
+    FAILED = "failed"
+
+
+@dataclass
+class BatchItem:
+    key: str
+    params: TravelPlanRequest
+    # 在输入中的位置，重复的请求合并为一条
+    indexes: List[int] = field(default_factory=list)
+
+
+def dedupe_requests(requests: List[TravelPlanRequest]) -> List[BatchItem]:
+    """Merge requests that would produce the same cached plan, keeping input order"""
+    items: Dict[str, BatchItem] = {}
+    for index, params in enumerate(requests):
+        key = plan_cache_key(params)
+        if key not in items:
+            items[key] = BatchItem(key=key, params=params)
+        items[key].indexes.append(index)
+    return list(items.values())
+
+
+async def run_batch(requests: List[TravelPlanRequest], concurrency: int = BatchConfig.concurrency,
+                    max_retries: int = BatchConfig.max_retries, with_map: bool = True, with_flights: bool = False,
+                    done_keys: Collection[str] = ()) -> AsyncIterator[Dict]:
+    """
+    Generate plans for many requests with a bounded worker pool
+
+    Requests are deduplicated by plan cache key and items whose key is in
+    `done_keys` (finished by an earlier run) are skipped. With flights, city
+    codes for all remaining items are resolved up front in batched model
+    calls. Yields one record per item as soon as it finishes, in completion
+    order; an item that fails unexpectedly yields a failed record.
+    """
+    items = [item for item in dedupe_requests(requests) if item.key not in done_keys]
+    logger.info(f"batch: {len(requests)} requests, {len(items)} to generate")
+    if not items:
+        return
+
+    # 城市代码只用于搜索航班，生成计划用不到
+    city_codes: Dict[str, Optional[str]] = {}
+    if with_flights:
+        city_codes = await get_city_codes(
+            place for item in items for place in (item.params.from_place, item.params.to_place)
+        )
+
+    queue: asyncio.Queue[BatchItem] = asyncio.Queue()
+    for item in items:
+        queue.put_nowait(item)
+    results: asyncio.Queue[Dict] = asyncio.Queue()
+
+    async def worker():
+        while not queue.empty():
+            item = queue.get_nowait()
+            try:
+                record = await _run_item(item, city_codes, max_retries, with_map, with_flights)
+            except Exception as e:
+                # 不让一个条目的意外错误结束 worker，否则 results.get() 永远等不到这条结果
+                logger.error(f"batch item {item.key[:12]} failed unexpectedly: {e!r}")
+                record = {
+                    "key": item.key,
+                    "indexes": item.indexes,
+                    "request": item.params.model_dump(),
+                    "status": BatchStatus.FAILED,
+                    "error": repr(e),
+                    "attempts": 0,
+                    "duration_ms": 0,
+                }
+            await results.put(record)
+
+    workers = [asyncio.create_task(worker()) for _ in range(max(1, min(concurrency, len(items))))]
+    try:
+        for _ in range(len(items)):
+            yield await results.get()
+    finally:
+        # 调用方提前结束 (客户端断开 / 进程退出) 时取消仍在进行的生成
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+
+async def _run_item(item: BatchItem, city_codes: Dict[str, Optional[str]], max_retries: int,
+                    with_map: bool, with_flights: bool) -> Dict:
+    params = item.params
+    record = {
+        "key": item.key,
+        "indexes": item.indexes,
+        "request": params.model_dump(),
+    }
+    if with_flights:
+        record.update(from_code=city_codes.get(params.from_place), to_code=city_codes.get(params.to_place))
+    started = time.monotonic()
+
+    for attempt in range(1, max_retries + 2):
+        try:
+            plan, cached = await lang_chain_service.generate_plan(params, with_map=with_map)
+            record.update(status=BatchStatus.OK, plan=plan.plan, map_vis=plan.map_vis, cached=cached)
+            break
+        except UpstreamBusy as e:
+            error, delay = str(e), e.retry_after
+        except Exception as e:
+            error, delay = repr(e), BatchConfig.backoff_base * 2 ** (attempt - 1)
+        logger.warning(f"batch item {item.key[:12]} attempt {attempt} failed: {error}")
+        if attempt > max_retries:
+            record.update(status=BatchStatus.FAILED, error=error)
+            break
+        await asyncio.sleep(min(delay, BatchConfig.backoff_max))
+
+    record["attempts"] = attempt
+    if with_flights and record["status"] == BatchStatus.OK:
+        record["flights"] = await _search_flights(params, record["from_code"], record["to_code"])
+    record["duration_ms"] = round((time.monotonic() - started) * 1000)
+    return record
+
+
+async def _search_flights(params: TravelPlanRequest, from_code: Optional[str], to_code: Optional[str]) -> Optional[List]:
+    if not from_code or not to_code:
+        return None
+    try:
+        result = await flight_search_cache.search(
+            from_code, to_code, params.from_date, params.to_date, max(params.people_num, 1), params.page_number,
+        )
+    except (httpx.HTTPError, ValueError, UpstreamBusy) as e:
+        logger.warning(f"batch flight search {from_code} -> {to_code} failed: {e!r}")
+        return None
+    return [offer.to_dict() for offer in result.offers]
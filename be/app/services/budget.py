@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import time
+from typing import AsyncIterator, Optional
+
+from fastapi import Request
+
+from app.services.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+
+class BudgetStats:
+    """Process-wide counters for budget enforcement and cancellation"""
+
+    def __init__(self):
+        self.cancelled = 0
+        self.timeouts = 0
+        self.truncated = 0
+        # 因取消而没有消费的输出 token 的上限：预算减去已生成的 token，模型可能本来就会提前结束，实际节省的更少
+        self.tokens_saved_upper_bound = 0
+
+    def as_dict(self) -> dict:
+        return {
+            "cancelled": self.cancelled,
+            "timeouts": self.timeouts,
+            "truncated": self.truncated,
+            "tokens_saved_upper_bound": self.tokens_saved_upper_bound,
+        }
+
+
+budget_stats = BudgetStats()
+
+registry.callback("dodo_plan_cancelled_total", "Plan streams cancelled after every client left", "counter",
+                  lambda: budget_stats.cancelled)
+registry.callback("dodo_plan_timeouts_total", "Plan streams that exceeded their wall-clock budget", "counter",
+                  lambda: budget_stats.timeouts)
+registry.callback("dodo_plan_truncated_total", "Plans truncated by the output-token budget", "counter",
+                  lambda: budget_stats.truncated)
+registry.callback("dodo_plan_tokens_saved_upper_bound_total",
+                  "Upper bound of output tokens saved by cancellation (budget minus tokens generated)", "counter",
+                  lambda: budget_stats.tokens_saved_upper_bound)
+
+
+class StreamBudget:
+    """Per-request wall-clock and output-token limits"""
+
+    def __init__(self, max_seconds: float, max_output_tokens: int):
+        self.max_seconds = max_seconds
+        self.max_output_tokens = max_output_tokens
+        self.started = time.monotonic()
+        self.output_tokens = 0
+        self.first_token_at: Optional[float] = None
+        self.chat_done_at: Optional[float] = None
+        self.status = "ok"
+
+    @property
+    def chat_done(self) -> bool:
+        return self.chat_done_at is not None
+
+    def mark_chat_done(self):
+        self.chat_done_at = time.monotonic()
+
+    @property
+    def ttft(self) -> Optional[float]:
+        return None if self.first_token_at is None else self.first_token_at - self.started
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def consume(self, tokens: int = 1) -> bool:
+        """Account for output tokens; returns False once the budget is used up"""
+        if self.first_token_at is None:
+            self.first_token_at = time.monotonic()
+        self.output_tokens += tokens
+        return self.output_tokens < self.max_output_tokens
+
+    def record_truncated(self):
+        self.status = "truncated"
+        budget_stats.truncated += 1
+        logger.warning(f"output token budget exhausted after {self.output_tokens} tokens, truncating plan")
+
+    def record_timeout(self):
+        self.status = "timeout"
+        budget_stats.timeouts += 1
+        logger.warning(f"stream exceeded its {self.max_seconds}s budget, output_tokens={self.output_tokens}")
+
+    def record_cancelled(self):
+        saved = 0 if self.chat_done else max(0, self.max_output_tokens - self.output_tokens)
+        self.status = "cancelled"
+        budget_stats.cancelled += 1
+        budget_stats.tokens_saved_upper_bound += saved
+        logger.info(f"stream cancelled after {self.elapsed:.1f}s, "
+                    f"output_tokens={self.output_tokens}, tokens_saved<={saved}")
+
+
+async def stream_until_disconnected(request: Request, stream: AsyncIterator[str]) -> AsyncIterator[str]:
+    """
+    Stop iterating `stream` as soon as the client goes away
+
+    With ASGI spec >= 2.4 Starlette only notices a disconnect when a send
+    fails, which may be minutes away while the upstream is busy (e.g. in
+    the map phase). A watcher task cancels the response task on
+    `http.disconnect`, so the upstream generator is closed right away.
+    """
+    task = asyncio.current_task()
+    disconnected = False
+
+    async def watch():
+        nonlocal disconnected
+        while True:
+            message = await request.receive()
+            if message["type"] == "http.disconnect":
+                disconnected = True
+                task.cancel()
+                return
+
+    watcher = asyncio.create_task(watch())
+    try:
+        async for chunk in stream:
+            yield chunk
+    except asyncio.CancelledError:
+        if not disconnected:
+            raise
+        task.uncancel()
+        logger.info("client disconnected, stream closed")
+    finally:
+        watcher.cancel()
+        await stream.aclose()
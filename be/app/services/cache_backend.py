@@ -0,0 +1,382 @@
+import asyncio
+import json
+import logging
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+from app.config import CacheConfig
+from app.services.metrics import CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+MISSING = object()
+
+# 固定的秒数，或按计算结果决定的秒数；为 None / 0 时不缓存该结果
+Ttl = Union[float, Callable[[Any], Optional[float]]]
+
+
+class CacheBackend:
+    """
+    Key-value cache with per-entry TTL for one namespace
+
+    Values must be JSON serializable, shared backends store them as JSON.
+    `get_or_compute` runs `compute` at most once per key at a time: within
+    a process the callers share one task, across processes the computing
+    one holds a lease stored next to the values while the others poll.
+    Backend errors are logged and treated as misses so that a broken cache
+    never fails a request.
+    """
+    shared = False
+
+    def __init__(self, namespace: str, max_entries: int):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    async def get(self, key: str) -> Any:
+        """The cached value, or `MISSING`"""
+        value = await self._guard("get", MISSING, self._get(key))
+        CACHE_LOOKUPS.inc(namespace=self.namespace, result="miss" if value is MISSING else "hit")
+        return value
+
+    async def set(self, key: str, value: Any, ttl: float):
+        await self._guard("set", None, self._set(key, value, ttl))
+
+    async def delete(self, key: str):
+        await self._guard("delete", None, self._delete(key))
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[Any]], ttl: Ttl) -> Any:
+        """
+        Return the cached value or compute, cache and return it
+
+        Raises:
+            Exception: whatever `compute` raised; failures are not cached
+        """
+        value = await self.get(key)
+        if value is not MISSING:
+            return value
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._compute(key, compute, ttl))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        # shield: 一个调用方被取消不影响共享同一计算的其他调用方
+        return await asyncio.shield(task)
+
+    async def aclose(self):
+        pass
+
+    def _forget(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    async def _compute(self, key: str, compute: Callable[[], Awaitable[Any]], ttl: Ttl) -> Any:
+        owner = await self._guard("lease", "", self._try_lease(key))
+        while owner is None:
+            # 其他进程正在计算，等它写入结果；它崩溃时租约过期后由本进程接手
+            await asyncio.sleep(CacheConfig.lease_poll_interval)
+            value = await self._guard("get", MISSING, self._get(key))
+            if value is not MISSING:
+                return value
+            owner = await self._guard("lease", "", self._try_lease(key))
+
+        try:
+            # 拿到租约之前上一个持有者可能刚写入结果
+            value = await self._guard("get", MISSING, self._get(key)) if owner else MISSING
+            if value is MISSING:
+                value = await compute()
+                seconds = ttl(value) if callable(ttl) else ttl
+                if seconds:
+                    await self.set(key, value, seconds)
+            return value
+        finally:
+            if owner:
+                await self._guard("release", None, self._release_lease(key, owner))
+
+    async def _guard(self, operation: str, default: Any, call: Awaitable[Any]) -> Any:
+        try:
+            return await call
+        except Exception as e:
+            logger.warning(f"cache {self.namespace} {operation} failed: {e!r}")
+            return default
+
+    async def _get(self, key: str) -> Any:
+        raise NotImplementedError
+
+    async def _set(self, key: str, value: Any, ttl: float):
+        raise NotImplementedError
+
+    async def _delete(self, key: str):
+        raise NotImplementedError
+
+    async def _try_lease(self, key: str) -> Optional[str]:
+        """Owner token of the compute lease of `key`, None while another process holds it"""
+        return ""
+
+    async def _release_lease(self, key: str, owner: str):
+        pass
+
+
+class MemoryCacheBackend(CacheBackend):
+    """Per-process LRU, bounded by `max_entries`"""
+
+    def __init__(self, namespace: str, max_entries: int):
+        super().__init__(namespace, max_entries)
+        self._entries: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+
+    async def _get(self, key: str) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return MISSING
+        if entry[1] <= time.time():
+            del self._entries[key]
+            return MISSING
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    async def _set(self, key: str, value: Any, ttl: float):
+        self._entries[key] = (value, time.time() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def _delete(self, key: str):
+        self._entries.pop(key, None)
+
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    last_access REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS cache_expires_at ON cache (namespace, expires_at);
+CREATE TABLE IF NOT EXISTS lease (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+"""
+
+
+class SqliteCacheBackend(CacheBackend):
+    """
+    SQLite database in WAL mode shared by every worker on the host
+
+    Readers never block the writer: hits are remembered in memory and
+    their access time is written with this process's next write. The
+    entry count is checked every `CacheConfig.sqlite_evict_every` writes,
+    dropping expired entries and then the least recently used, so it may
+    briefly exceed `max_entries`.
+    """
+    shared = True
+
+    def __init__(self, namespace: str, max_entries: int, path: str):
+        super().__init__(namespace, max_entries)
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        # to_thread 的多个线程共用一个连接，用锁串行化
+        self._lock = threading.Lock()
+        self._writes = 0
+        # 命中的 key -> 最近访问时间，随下一次写入落盘
+        self._accessed: Dict[str, float] = {}
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=CacheConfig.sqlite_busy_timeout,
+                                   check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SQLITE_SCHEMA)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(cache)")}
+            if "last_access" not in columns:
+                # 旧版本创建的库没有访问时间，按从未访问处理
+                conn.execute("ALTER TABLE cache ADD COLUMN last_access REAL NOT NULL DEFAULT 0")
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_last_access ON cache (namespace, last_access)")
+            self._conn = conn
+        return self._conn
+
+    async def _call(self, fn: Callable, *args) -> Any:
+        def run():
+            with self._lock:
+                return fn(self._connect(), *args)
+        return await asyncio.to_thread(run)
+
+    async def _get(self, key: str) -> Any:
+        row = await self._call(lambda conn: conn.execute(
+            "SELECT value, expires_at FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key),
+        ).fetchone())
+        now = time.time()
+        if row is None or row[1] <= now:
+            return MISSING
+        self._accessed[key] = now
+        return json.loads(row[0])
+
+    async def _set(self, key: str, value: Any, ttl: float):
+        data = json.dumps(value, ensure_ascii=False)
+        self._writes += 1
+        evict = (self._writes - 1) % max(1, CacheConfig.sqlite_evict_every) == 0
+
+        accessed, self._accessed = self._accessed, {}
+
+        def write(conn: sqlite3.Connection):
+            now = time.time()
+            conn.executemany("UPDATE cache SET last_access = ? WHERE namespace = ? AND key = ?",
+                             [(at, self.namespace, accessed_key) for accessed_key, at in accessed.items()])
+            conn.execute("INSERT OR REPLACE INTO cache (namespace, key, value, expires_at, last_access) "
+                         "VALUES (?, ?, ?, ?, ?)", (self.namespace, key, data, now + ttl, now))
+            if evict:
+                self._evict(conn)
+
+        await self._call(write)
+
+    def _evict(self, conn: sqlite3.Connection):
+        conn.execute("DELETE FROM cache WHERE namespace = ? AND expires_at <= ?", (self.namespace, time.time()))
+        (count,) = conn.execute("SELECT COUNT(*) FROM cache WHERE namespace = ?", (self.namespace,)).fetchone()
+        if count > self.max_entries:
+            conn.execute(
+                "DELETE FROM cache WHERE namespace = ? AND key IN "
+                "(SELECT key FROM cache WHERE namespace = ? ORDER BY last_access LIMIT ?)",
+                (self.namespace, self.namespace, count - self.max_entries),
+            )
+
+    async def _delete(self, key: str):
+        await self._call(lambda conn: conn.execute(
+            "DELETE FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key),
+        ))
+
+    async def _try_lease(self, key: str) -> Optional[str]:
+        owner = f"{os.getpid()}-{secrets.token_hex(4)}"
+
+        def acquire(conn: sqlite3.Connection) -> bool:
+            now = time.time()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("DELETE FROM lease WHERE namespace = ? AND key = ? AND expires_at <= ?",
+                             (self.namespace, key, now))
+                cursor = conn.execute("INSERT OR IGNORE INTO lease VALUES (?, ?, ?, ?)",
+                                      (self.namespace, key, owner, now + CacheConfig.lease_timeout))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            return cursor.rowcount == 1
+
+        return owner if await self._call(acquire) else None
+
+    async def _release_lease(self, key: str, owner: str):
+        await self._call(lambda conn: conn.execute(
+            "DELETE FROM lease WHERE namespace = ? AND key = ? AND owner = ?", (self.namespace, key, owner),
+        ))
+
+    async def aclose(self):
+        def close():
+            with self._lock:
+                if self._conn is not None:
+                    self._conn.close()
+                    self._conn = None
+        await asyncio.to_thread(close)
+
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Any Redis-compatible server through `redis.asyncio` (the `redis` extra)
+
+    Only GET / SET (PX, NX) / DEL are used, so Redis, Valkey, KeyDB or a
+    local stand-in all work. Entries expire by TTL; the total size is
+    bounded by the server (`maxmemory` with an eviction policy), not by
+    `max_entries`.
+    """
+    shared = True
+
+    def __init__(self, namespace: str, max_entries: int, url: str, max_connections: int):
+        super().__init__(namespace, max_entries)
+        try:
+            from redis import asyncio as redis_asyncio
+            from redis import exceptions as redis_exceptions
+        except ImportError as e:
+            raise ImportError("CACHE_BACKEND=redis requires the redis extra: uv sync --extra redis") from e
+        self.url = url
+        # 连接用满时等待空闲连接，而不是直接报错
+        pool = redis_asyncio.BlockingConnectionPool.from_url(
+            url,
+            max_connections=max_connections,
+            timeout=CacheConfig.redis_timeout,
+            socket_timeout=CacheConfig.redis_timeout,
+            socket_connect_timeout=CacheConfig.redis_timeout,
+            decode_responses=True,
+        )
+        self._client = redis_asyncio.Redis(connection_pool=pool)
+        self._unavailable_errors = (redis_exceptions.ConnectionError, redis_exceptions.TimeoutError)
+        # 连不上服务时在这个时间之前不再重连，每次查询直接按未命中处理
+        self._unavailable_until = 0.0
+
+    def _key(self, key: str) -> str:
+        return f"dodo:{self.namespace}:{key}"
+
+    async def execute(self, *args) -> Any:
+        if time.monotonic() < self._unavailable_until:
+            raise ConnectionError(f"cache server {self.url} unavailable")
+        try:
+            return await self._client.execute_command(*args)
+        except self._unavailable_errors:
+            self._unavailable_until = time.monotonic() + CacheConfig.redis_retry_interval
+            raise
+
+    async def _get(self, key: str) -> Any:
+        data = await self.execute("GET", self._key(key))
+        return MISSING if data is None else json.loads(data)
+
+    async def _set(self, key: str, value: Any, ttl: float):
+        await self.execute("SET", self._key(key), json.dumps(value, ensure_ascii=False), "PX", max(1, int(ttl * 1000)))
+
+    async def _delete(self, key: str):
+        await self.execute("DEL", self._key(key))
+
+    async def _try_lease(self, key: str) -> Optional[str]:
+        owner = f"{os.getpid()}-{secrets.token_hex(4)}"
+        reply = await self.execute("SET", self._key(key) + ":lease", owner,
+                                   "NX", "PX", int(CacheConfig.lease_timeout * 1000))
+        return owner if reply else None
+
+    async def _release_lease(self, key: str, owner: str):
+        # 不依赖 EVAL：先比较持有者再删除，极端情况下租约会在超时后自然失效
+        lease_key = self._key(key) + ":lease"
+        if await self.execute("GET", lease_key) == owner:
+            await self.execute("DEL", lease_key)
+
+    async def aclose(self):
+        await self._client.close(close_connection_pool=True)
+
+
+_backends: List[CacheBackend] = []
+
+
+def create_cache_backend(namespace: str, max_entries: int) -> CacheBackend:
+    """Cache for one namespace on the backend selected by `CacheConfig.backend`"""
+    if CacheConfig.backend == "sqlite":
+        backend = SqliteCacheBackend(namespace, max_entries, CacheConfig.sqlite_path)
+    elif CacheConfig.backend == "redis":
+        backend = RedisCacheBackend(namespace, max_entries, CacheConfig.redis_url, CacheConfig.redis_max_connections)
+    elif CacheConfig.backend == "memory":
+        backend = MemoryCacheBackend(namespace, max_entries)
+    else:
+        raise ValueError(f"unknown CACHE_BACKEND: {CacheConfig.backend}")
+    _backends.append(backend)
+    return backend
+
+
+async def aclose_cache_backends():
+    await asyncio.gather(*(backend.aclose() for backend in _backends), return_exceptions=True)
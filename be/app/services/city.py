@@ -2,38 +2,214 @@
 import json
 import json_repair
 import logging
-from app.promopt.extract_city import EXTRACT_CITY_PROMPT
-from app.services.lang import lang_chain_service
+import re
+import time
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.config import CityCodeConfig
+from app.promopt.extract_city import EXTRACT_CITIES_PROMPT, EXTRACT_CITY_PROMPT
+from app.services.admission import llm_admission
+from app.services.cache_backend import MISSING, create_cache_backend
+from app.services.model_registry import model_registry
+from app.services.metrics import CITY_CODE_SECONDS
 
 logger = logging.getLogger(__name__)
 
+_IGNORED_CHARS = re.compile(r"[\s\-_'’`.·,，。()（）]+")
+_IATA_CITY_CODE = re.compile(r"^[A-Z]{3}$")
+_NAME_SUFFIXES = ("特别行政区", "市", "city")
+
 
-async def get_city_code(city_name: str) -> str:
+def normalize_city_name(city_name: str) -> str:
     """
-    使用 LangChain 大模型将城市名称转换为 IATA 城市代码
-    
+    归一化城市名称，作为本地索引与缓存的 key
+
+    全角转半角、转小写、去掉空白与标点，再去掉 "市" / "city" 之类的后缀，
+    例如 "上海市" -> "上海", "New York City" -> "newyork", "Xi'an" -> "xian"
+    """
+    key = unicodedata.normalize("NFKC", city_name or "").strip().lower()
+    key = _IGNORED_CHARS.sub("", key)
+    for suffix in _NAME_SUFFIXES:
+        if key.endswith(suffix) and len(key) > len(suffix):
+            key = key[:-len(suffix)]
+            break
+    return key
+
+
+def _load_city_index(table_path: str) -> Dict[str, str]:
+    with open(table_path, encoding="utf-8") as f:
+        rows = json.load(f)
+
+    index: Dict[str, str] = {}
+    for row in rows:
+        code = row["code"]
+        for alias in [code, *row.get("aliases", [])]:
+            key = normalize_city_name(alias)
+            if key in index and index[key] != code:
+                logger.warning(f"城市别名冲突: {alias} -> {index[key]} / {code}, 保留前者")
+                continue
+            index[key] = code
+    return index
+
+
+_city_index: Optional[Dict[str, str]] = None
+
+
+def lookup_city_code(city_name: str) -> Optional[str]:
+    """在内置的城市/别名表中查找 IATA 城市代码 (O(1) dict lookup)"""
+    global _city_index
+    if _city_index is None:
+        _city_index = _load_city_index(CityCodeConfig.table_path)
+    return _city_index.get(normalize_city_name(city_name))
+
+
+def _city_code_ttl(code: Optional[str]) -> int:
+    # "不存在" 的结果也缓存，但时间更短，未知的名称不会每次都调用大模型
+    return CityCodeConfig.positive_ttl if code else CityCodeConfig.negative_ttl
+
+
+# 大模型解析结果放在共享缓存中，同一主机的所有 worker 共用
+city_code_cache = create_cache_backend("city", CityCodeConfig.cache_max_entries)
+
+
+async def get_city_code(city_name: str) -> Optional[str]:
+    """
+    将城市名称转换为 IATA 城市代码
+
+    先查内置的城市/别名表，再查 LLM 结果的共享缓存，都未命中时才调用大模型，
+    并把大模型的结果 (包括 "不存在" 的结果) 写回缓存；同时查询同一名称时只调用一次大模型
+
     Args:
         city_name: 城市名称，如 "上海", "东京", "香港"
-        
+
     Returns:
         str: IATA 城市代码，如 "SHA", "TYO", "HKG"，如果找不到则返回 None
     """
-    prompt = EXTRACT_CITY_PROMPT.format(input=city_name)
-    
-    try:
-        response_content = (await lang_chain_service.model.ainvoke(prompt)).content
-        
-        logger.info(f"获取城市代码响应: {response_content}")
+    started = time.perf_counter()
+    code, outcome = await _resolve_city_code(city_name)
+    CITY_CODE_SECONDS.observe(time.perf_counter() - started, outcome=outcome)
+    return code
 
-        # 解析 JSON 响应
-        try:
-            # 使用 json_repair 来修复可能的 JSON 格式问题
-            parsed_response = json_repair.loads(response_content)
-            return parsed_response.get("code")
-        except (json.JSONDecodeError, KeyError) as e:
-            logger.error(f"JSON 解析错误: {e}, 原始响应: {response_content}")
-            return None
-            
+
+async def _resolve_city_code(city_name: str) -> Tuple[Optional[str], str]:
+    """Returns the code and where it came from: local / cache / llm / error"""
+    key = normalize_city_name(city_name)
+    if not key:
+        return None, "local"
+
+    code = lookup_city_code(city_name)
+    if code:
+        return code, "local"
+
+    called_model = False
+
+    async def extract():
+        nonlocal called_model
+        called_model = True
+        return await _extract_city_code_with_llm(city_name)
+
+    try:
+        code = await city_code_cache.get_or_compute(key, extract, ttl=_city_code_ttl)
     except Exception as e:
+        # 调用或解析失败不写缓存，下次重试
         logger.error(f"获取城市代码时发生错误: {e}")
-        return None
\ No newline at end of file
+        return None, "error"
+    return code, "llm" if called_model else "cache"
+
+
+async def get_city_codes(city_names: Iterable[str]) -> Dict[str, Optional[str]]:
+    """
+    批量将城市名称转换为 IATA 城市代码
+
+    与 get_city_code 相同先查内置表和缓存，剩余的名称每 `CityCodeConfig.batch_size` 个
+    合并成一次大模型调用；调用失败的批次不写缓存，对应的结果为 None
+
+    Returns:
+        dict: 原样的城市名称 -> IATA 城市代码或 None
+    """
+    codes: Dict[str, Optional[str]] = {}
+    # 归一化后相同的名称只解析一次
+    unresolved: Dict[str, List[str]] = {}
+    for city_name in dict.fromkeys(city_names):
+        key = normalize_city_name(city_name)
+        code = lookup_city_code(city_name) if key else None
+        if not key or code:
+            codes[city_name] = code
+            continue
+        cached = await city_code_cache.get(key)
+        if cached is not MISSING:
+            codes[city_name] = cached
+            continue
+        unresolved.setdefault(key, []).append(city_name)
+
+    keys = list(unresolved)
+    batch_size = max(1, CityCodeConfig.batch_size)
+    for i in range(0, len(keys), batch_size):
+        batch = {unresolved[key][0]: key for key in keys[i:i + batch_size]}
+        started = time.perf_counter()
+        try:
+            resolved = await _extract_city_codes_with_llm(list(batch))
+        except Exception as e:
+            logger.error(f"批量获取城市代码时发生错误: {e}")
+            resolved = {}
+        CITY_CODE_SECONDS.observe(time.perf_counter() - started, outcome="llm_batch")
+
+        # 模型返回的 key 也做归一化再匹配；漏掉的名称不写缓存，下次重试
+        resolved_by_key = {normalize_city_name(name): code for name, code in resolved.items()}
+        for key in batch.values():
+            if key in resolved_by_key:
+                await city_code_cache.set(key, resolved_by_key[key], _city_code_ttl(resolved_by_key[key]))
+            for city_name in unresolved[key]:
+                codes[city_name] = resolved_by_key.get(key)
+
+    logger.info(f"resolved {len(codes)} city names, {len(keys)} via model")
+    return codes
+
+
+def _parse_city_code(code) -> Optional[str]:
+    if isinstance(code, str) and _IATA_CITY_CODE.match(code.strip().upper()):
+        return code.strip().upper()
+    return None
+
+
+async def _extract_city_codes_with_llm(city_names: List[str]) -> Dict[str, Optional[str]]:
+    """
+    一次大模型调用解析多个城市名称
+
+    Raises:
+        Exception: 模型调用失败或响应无法解析
+    """
+    prompt = EXTRACT_CITIES_PROMPT.format(input=json.dumps(city_names, ensure_ascii=False))
+
+    async with llm_admission.admit():
+        response_content = (await model_registry.get("city_code").ainvoke(prompt)).content
+
+    logger.info(f"批量获取城市代码响应: {response_content}")
+
+    parsed_response = json_repair.loads(response_content)
+    if not isinstance(parsed_response, dict):
+        raise ValueError(f"无法解析的城市代码响应: {response_content}")
+    return {name: _parse_city_code(code) for name, code in parsed_response.items()}
+
+
+async def _extract_city_code_with_llm(city_name: str) -> Optional[str]:
+    """
+    使用 LangChain 大模型将城市名称转换为 IATA 城市代码
+
+    Raises:
+        Exception: 模型调用失败或响应无法解析
+    """
+    prompt = EXTRACT_CITY_PROMPT.format(input=city_name)
+
+    async with llm_admission.admit():
+        response_content = (await model_registry.get("city_code").ainvoke(prompt)).content
+
+    logger.info(f"获取城市代码响应: {response_content}")
+
+    # 使用 json_repair 来修复可能的 JSON 格式问题
+    parsed_response = json_repair.loads(response_content)
+    if not isinstance(parsed_response, dict):
+        raise ValueError(f"无法解析的城市代码响应: {response_content}")
+
+    return _parse_city_code(parsed_response.get("code"))
@@ -0,0 +1,230 @@
+import asyncio
+import logging
+import secrets
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from app.config import StreamResumeConfig
+from app.services.metrics import registry
+from app.services.sse import error_frame
+
+logger = logging.getLogger(__name__)
+
+
+def split_frames(chunk: str) -> List[str]:
+    """Split a chunk that may hold several SSE events into one string per event"""
+    parts = chunk.split("\n\n")
+    frames = [part + "\n\n" for part in parts[:-1] if part]
+    if parts[-1]:
+        frames.append(parts[-1])
+    return frames
+
+
+def parse_event_id(event_id: Optional[str]) -> Optional[Tuple[str, int]]:
+    """`<generation>:<index>` -> (generation, index), None if malformed"""
+    generation, _, index = (event_id or "").strip().partition(":")
+    if not generation or not index.isdigit():
+        return None
+    return generation, int(index)
+
+
+class _SharedStream:
+    """One upstream generation and the SSE events it has produced so far"""
+
+    def __init__(self, key: str):
+        self.key = key
+        # 事件 id 为 "<generation>:<index>"，generation 区分同一个 key 的不同次生成
+        self.generation = secrets.token_hex(4)
+        self.frames: List[str] = []
+        self.chars = 0
+        self.done = False
+        self.finished_at = 0.0
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self.cancel_handle: Optional[asyncio.TimerHandle] = None
+        self._changed = asyncio.Event()
+
+    def append(self, chunk: str):
+        for frame in split_frames(chunk):
+            self.frames.append(frame)
+            self.chars += len(frame)
+        self._notify()
+
+    def finish(self):
+        self.done = True
+        self.finished_at = time.monotonic()
+        self._notify()
+
+    def _notify(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def wait(self):
+        await self._changed.wait()
+
+
+class StreamCoalescer:
+    """
+    Single-flight fan-out for identical streaming generations
+
+    The first subscriber for a key starts the upstream generator in a
+    background task; concurrent subscribers for the same key attach to it,
+    get the events produced so far replayed, then follow the live stream.
+
+    Every event is sent with an `id:` line. A reconnect carrying
+    `Last-Event-ID` resumes right after that event, following the live
+    upstream if it is still running. Finished generations are retained for
+    `retain_ttl` seconds (at most `retain_max_chars` in total) so late
+    reconnects can resume too. The upstream is cancelled `cancel_grace`
+    seconds after its last subscriber goes away, unless someone reconnects;
+    the first event carries a `retry:` hint of `client_retry_ms` so browsers
+    reconnect within that window.
+    """
+
+    def __init__(self, name: str, retain_ttl: float = 0, retain_max_chars: int = 0, cancel_grace: float = 0,
+                 client_retry_ms: int = 0):
+        self.name = name
+        self.retain_ttl = retain_ttl
+        self.retain_max_chars = retain_max_chars
+        self.cancel_grace = cancel_grace
+        self.client_retry_ms = client_retry_ms
+        self.resumes = 0
+        self._streams: Dict[str, _SharedStream] = {}
+        self._retained: "OrderedDict[str, _SharedStream]" = OrderedDict()
+        self._retained_chars = 0
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._streams)
+
+    def is_streaming(self, key: str) -> bool:
+        return key in self._streams
+
+    def can_resume(self, key: str, last_event_id: Optional[str]) -> bool:
+        """Whether `last_event_id` belongs to a live or retained generation of `key`"""
+        return self._find_resumable(key, parse_event_id(last_event_id)) is not None
+
+    async def subscribe(self, key: str, factory: Callable[[], AsyncIterator[str]],
+                        last_event_id: Optional[str] = None) -> AsyncIterator[str]:
+        position = parse_event_id(last_event_id)
+        stream = self._find_resumable(key, position)
+        if stream is not None:
+            index = position[1] + 1
+            self.resumes += 1
+            logger.info(f"[{self.name}] resumed {key[:12]} after event {index - 1}, "
+                        f"live={not stream.done}, replay={max(0, len(stream.frames) - index)}")
+        else:
+            index = 0
+            stream = self._streams.get(key)
+            if stream is None:
+                stream = _SharedStream(key)
+                self._streams[key] = stream
+                stream.task = asyncio.create_task(self._pump(stream, factory))
+            else:
+                logger.info(f"[{self.name}] coalesced request {key[:12]}, "
+                            f"subscribers={stream.subscribers + 1}, replay={len(stream.frames)}")
+
+        stream.subscribers += 1
+        if stream.cancel_handle is not None:
+            stream.cancel_handle.cancel()
+            stream.cancel_handle = None
+        retry = f"retry: {self.client_retry_ms}\n" if self.client_retry_ms > 0 else ""
+        try:
+            while True:
+                if index < len(stream.frames):
+                    frame = stream.frames[index]
+                    yield f"{retry}id: {stream.generation}:{index}\n{frame}"
+                    retry = ""
+                    index += 1
+                elif stream.done:
+                    break
+                else:
+                    await stream.wait()
+        finally:
+            stream.subscribers -= 1
+            if stream.subscribers == 0 and not stream.done:
+                if self.cancel_grace > 0:
+                    # 留出重连的时间，期间没有人重新订阅才取消上游
+                    stream.cancel_handle = asyncio.get_running_loop().call_later(
+                        self.cancel_grace, self._cancel_if_idle, stream,
+                    )
+                else:
+                    self._cancel_if_idle(stream)
+
+    def _find_resumable(self, key: str, position: Optional[Tuple[str, int]]) -> Optional[_SharedStream]:
+        if position is None:
+            return None
+        self._evict_retained()
+        for stream in (self._streams.get(key), self._retained.get(key)):
+            if stream is not None and stream.generation == position[0] and position[1] < len(stream.frames):
+                return stream
+        return None
+
+    def _cancel_if_idle(self, stream: _SharedStream):
+        stream.cancel_handle = None
+        if stream.subscribers == 0 and not stream.done:
+            logger.info(f"[{self.name}] no subscribers left for {stream.key[:12]}, cancelling upstream")
+            # 立即摘掉，取消真正生效之前到来的相同请求开始新的生成，而不是挂到正在取消的流上
+            if self._streams.get(stream.key) is stream:
+                del self._streams[stream.key]
+            stream.task.cancel()
+
+    def _retain(self, stream: _SharedStream):
+        if self.retain_ttl <= 0 or not stream.frames or stream.chars > self.retain_max_chars:
+            return
+        previous = self._retained.pop(stream.key, None)
+        if previous is not None:
+            self._retained_chars -= previous.chars
+        self._retained[stream.key] = stream
+        self._retained_chars += stream.chars
+        self._evict_retained()
+
+    def _evict_retained(self):
+        # 按完成时间排列，先淘汰过期的，再按总字符数上限淘汰最早完成的
+        now = time.monotonic()
+        while self._retained:
+            key, oldest = next(iter(self._retained.items()))
+            if oldest.finished_at + self.retain_ttl > now and self._retained_chars <= self.retain_max_chars:
+                break
+            del self._retained[key]
+            self._retained_chars -= oldest.chars
+
+    async def _pump(self, stream: _SharedStream, factory: Callable[[], AsyncIterator[str]]):
+        cancelled = False
+        try:
+            async for chunk in factory():
+                stream.append(chunk)
+        except asyncio.CancelledError:
+            cancelled = True
+            if stream.subscribers:
+                # 仍有订阅者 (例如进程退出时)，给它们一个结束帧，而不是没有 [DONE] 就断开
+                stream.append(error_frame("生成已中断，请重试"))
+            else:
+                # 没有人在听了，不完整的生成不保留
+                stream.frames.clear()
+                stream.chars = 0
+            raise
+        except Exception as e:
+            logger.error(f"[{self.name}] upstream failed for {stream.key[:12]}: {e}")
+            stream.append(error_frame(str(e)))
+        finally:
+            stream.finish()
+            if self._streams.get(stream.key) is stream:
+                del self._streams[stream.key]
+            if not cancelled:
+                self._retain(stream)
+
+
+travel_plan_coalescer = StreamCoalescer(
+    "travel_plan",
+    retain_ttl=StreamResumeConfig.retain_ttl,
+    retain_max_chars=StreamResumeConfig.retain_max_chars,
+    cancel_grace=StreamResumeConfig.cancel_grace,
+    client_retry_ms=StreamResumeConfig.client_retry_ms,
+)
+
+registry.callback("dodo_plan_upstream_streams", "Unique travel plan generations in flight", "gauge",
+                  lambda: travel_plan_coalescer.in_flight)
+registry.callback("dodo_plan_stream_resumes_total", "Travel plan streams resumed with Last-Event-ID", "counter",
+                  lambda: travel_plan_coalescer.resumes)
@@ -0,0 +1,128 @@
+import asyncio
+import logging
+from datetime import date, timedelta
+from typing import AsyncIterator, Dict, List
+
+import httpx
+
+from app.config import FareCalendarConfig
+from app.models.http_entity import TravelPlanRequest
+from app.services.admission import UpstreamBusy
+from app.services.city import get_city_code
+from app.services.flight import flight_search_cache
+from app.services.sse import DONE_FRAME, error_frame, fare_matrix_frame, fare_row_frame
+
+logger = logging.getLogger(__name__)
+
+# 所有价格日历请求共享的并发上限，RapidAPI 的速率由 FlightApiClient 的令牌桶控制
+_search_slots = asyncio.Semaphore(FareCalendarConfig.concurrency)
+
+
+def date_window(center: date, days: int) -> List[date]:
+    return [center + timedelta(days=offset) for offset in range(-days, days + 1)]
+
+
+async def _search_cell(from_code: str, to_code: str, depart: date, ret: date,
+                       adults: int, page_number: int) -> Dict:
+    cell = {"return_date": ret.isoformat(), "price": None, "currency": None}
+    async with _search_slots:
+        try:
+            result = await flight_search_cache.search(
+                from_code, to_code, depart.isoformat(), ret.isoformat(), adults, page_number,
+            )
+        except (httpx.HTTPError, ValueError, UpstreamBusy) as e:
+            logger.warning(f"fare calendar search {depart} -> {ret} failed: {e!r}")
+            cell["error"] = str(e)
+            return cell
+    cell["price"] = result.cheapest()
+    cell["currency"] = result.currency
+    return cell
+
+
+async def _search_row(from_code: str, to_code: str, depart: date, return_dates: List[date],
+                      adults: int, page_number: int) -> Dict:
+    cells = await asyncio.gather(*(
+        _search_cell(from_code, to_code, depart, ret, adults, page_number)
+        for ret in return_dates if ret >= depart
+    ))
+    return {"depart_date": depart.isoformat(), "cells": list(cells)}
+
+
+def build_fare_matrix(rows: List[Dict], depart_dates: List[date], return_dates: List[date]) -> Dict:
+    """depart x return price matrix; `None` where there is no price or the combination is invalid"""
+    prices_by_row = {
+        row["depart_date"]: {cell["return_date"]: cell for cell in row["cells"]}
+        for row in rows
+    }
+    prices = []
+    cheapest = None
+    for depart in depart_dates:
+        row_cells = prices_by_row.get(depart.isoformat(), {})
+        row_prices = []
+        for ret in return_dates:
+            cell = row_cells.get(ret.isoformat())
+            price = cell["price"] if cell else None
+            row_prices.append(price)
+            if price is not None and (cheapest is None or price < cheapest["price"]):
+                cheapest = {
+                    "depart_date": depart.isoformat(),
+                    "return_date": ret.isoformat(),
+                    "price": price,
+                    "currency": cell["currency"],
+                }
+        prices.append(row_prices)
+
+    return {
+        "depart_dates": [d.isoformat() for d in depart_dates],
+        "return_dates": [d.isoformat() for d in return_dates],
+        "prices": prices,
+        "cheapest": cheapest,
+    }
+
+
+async def fare_calendar_stream(params: TravelPlanRequest, days: int) -> AsyncIterator[str]:
+    """
+    Search every departure / return combination within ±`days` concurrently
+
+    Yields one `fare_row` SSE frame per departure date as soon as all of its
+    return dates are searched, then the full `fare_matrix` and `[DONE]`.
+    """
+    days = max(0, min(days, FareCalendarConfig.max_days))
+    try:
+        depart_center = date.fromisoformat(params.from_date.strip())
+        return_center = date.fromisoformat(params.to_date.strip())
+    except ValueError:
+        yield error_frame("Invalid date")
+        return
+
+    from_code, to_code = await asyncio.gather(
+        get_city_code(params.from_place),
+        get_city_code(params.to_place),
+    )
+    if not from_code or not to_code:
+        yield error_frame("Invalid city code")
+        return
+
+    today = date.today()
+    depart_dates = [d for d in date_window(depart_center, days) if d >= today]
+    return_dates = date_window(return_center, days)
+    adults = max(params.people_num, 1)
+
+    tasks = [
+        asyncio.create_task(_search_row(from_code, to_code, depart, return_dates, adults, params.page_number))
+        for depart in depart_dates
+    ]
+    rows = []
+    try:
+        for next_row in asyncio.as_completed(tasks):
+            row = await next_row
+            rows.append(row)
+            yield fare_row_frame(row)
+
+        yield fare_matrix_frame(build_fare_matrix(rows, depart_dates, return_dates))
+        yield DONE_FRAME
+    finally:
+        # 客户端断开时取消尚未完成的搜索；已发出的请求仍会写入缓存
+        for task in tasks:
+            if not task.done():
+                task.cancel()
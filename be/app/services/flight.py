@@ -1,159 +1,236 @@
-import os
-import requests
+import asyncio
+import json
+import random
+import time
+import httpx
 import logging
-from typing import List, Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
+
+from app.config import FlightApiConfig
+from app.models.flight_entity import FlightSearchResult
+from app.services.admission import flight_admission
+from app.services.cache_backend import create_cache_backend
+from app.services.flight_parser import FlightResponseParser, extract_search_result
+from app.services.metrics import FLIGHT_API_RESPONSE_BYTES, FLIGHT_API_SECONDS
+from app.services.ratelimit import TokenBucket
 
 logger = logging.getLogger(__name__)
 
+# 这些状态码通常是暂时性的，值得重试
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class FlightApiClient:
+    """
+    Shared, connection-pooled async client for the Booking.com RapidAPI
+
+    The underlying httpx.AsyncClient is created lazily and lives for the
+    app's lifetime; call `aclose()` on shutdown.
+    """
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        # RapidAPI 按 key 限速，每个 key 一个令牌桶，重试也要消耗令牌
+        self._limiters: Dict[str, TokenBucket] = {}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                headers={
+                    "x-rapidapi-host": FlightApiConfig.host,
+                    "x-rapidapi-key": FlightApiConfig.api_key or "",
+                },
+                timeout=httpx.Timeout(
+                    connect=FlightApiConfig.connect_timeout,
+                    read=FlightApiConfig.read_timeout,
+                    write=FlightApiConfig.connect_timeout,
+                    pool=FlightApiConfig.pool_timeout,
+                ),
+                limits=httpx.Limits(
+                    max_connections=FlightApiConfig.max_connections,
+                    max_keepalive_connections=FlightApiConfig.max_keepalive_connections,
+                    keepalive_expiry=FlightApiConfig.keepalive_expiry,
+                ),
+            )
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+    async def get(self, url: str, params: Dict[str, Any], stream: bool = False) -> httpx.Response:
+        """
+        GET with bounded retries on transport errors and retryable status codes
+
+        With `stream=True` the body is not read; the caller must read it and
+        `aclose()` the response.
+
+        Raises:
+            httpx.HTTPError: when the last attempt still fails
+        """
+        limiter = self._limiters.setdefault(
+            FlightApiConfig.api_key or "",
+            TokenBucket(FlightApiConfig.rate_per_second, FlightApiConfig.rate_burst),
+        )
+        attempt = 0
+        while True:
+            retry_after = None
+            await limiter.acquire()
+            try:
+                request = self.client.build_request("GET", url, params=params)
+                response = await self.client.send(request, stream=stream)
+                if response.status_code not in RETRYABLE_STATUS_CODES or attempt >= FlightApiConfig.max_retries:
+                    if stream and response.is_error:
+                        await response.aclose()
+                    response.raise_for_status()
+                    return response
+                if stream:
+                    await response.aclose()
+                retry_after = _parse_retry_after(response.headers.get("retry-after"))
+                logger.warning(f"Flight API returned {response.status_code}, retrying ({attempt + 1})")
+            except httpx.TransportError as e:
+                if attempt >= FlightApiConfig.max_retries:
+                    raise
+                logger.warning(f"Flight API transport error: {e!r}, retrying ({attempt + 1})")
+
+            await asyncio.sleep(retry_after if retry_after is not None else _backoff_delay(attempt))
+            attempt += 1
+
+
+def _is_upstream_failure(e: Exception) -> bool:
+    # 4xx (429 除外) 是请求本身的问题，不计入熔断
+    if isinstance(e, httpx.HTTPStatusError):
+        status = e.response.status_code
+        return status >= 500 or status == 429
+    return True
+
+
+def _backoff_delay(attempt: int) -> float:
+    # full jitter: 在 [0, min(max, base * 2^attempt)] 之间随机取值
+    cap = min(FlightApiConfig.backoff_max, FlightApiConfig.backoff_base * (2 ** attempt))
+    return random.uniform(0, cap)
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return min(float(value), FlightApiConfig.backoff_max)
+    except ValueError:
+        return None
+
+
+flight_api_client = FlightApiClient()
+
 
-def fetch_flight_info(
-    from_place: str, 
-    to_place: str, 
+async def search_flights_by_code(
+    from_place: str,
+    to_place: str,
     from_date: str,
     to_date: str,
-) -> List[Dict[str, Any]]:
+    adults: int = 1,
+    page_number: int = 0,
+) -> FlightSearchResult:
     """
-    Fetch flight information from Booking.com RapidAPI
-    
+    Search round-trip flights on Booking.com RapidAPI
+
     Args:
-        from_place: Departure city code (e.g., 'TYO.CITY')
-        to_place: Arrival city code (e.g., 'SHA.CITY')
+        from_place: Departure city code (e.g., 'TYO')
+        to_place: Arrival city code (e.g., 'SHA')
         from_date: Departure date in YYYY-MM-DD format
         to_date: Return date in YYYY-MM-DD format
-    
+        adults: Number of travellers
+        page_number: Result page, 0-based
+
     Returns:
-        List of first 3 flight offers with relevant information
+        The first `FlightApiConfig.max_offers` offers and the cheapest price of the search
+
+    Raises:
+        httpx.HTTPError: request failed after retries
+        ValueError: response could not be parsed
     """
-    url = "https://booking-com.p.rapidapi.com/v1/flights/search"
-    
-    headers = {
-        "x-rapidapi-host": "booking-com.p.rapidapi.com",
-        "x-rapidapi-key": os.getenv("RAPID_API_KEY")
-    }
-    
     params = {
         "from_code": f'{from_place}.CITY',
         "to_code": f'{to_place}.CITY',
         "depart_date": from_date,
         "return_date": to_date,
-        "adults": 1,
+        "adults": adults,
         "cabin_class": "ECONOMY",
         "flight_type": "ROUNDTRIP",
         "currency": "CNY",
         "locale": "zh-cn",
-        "page_number": 0,
+        "page_number": page_number,
         "order_by": "BEST"
     }
-    
+
+    started = time.perf_counter()
     try:
-        response = requests.get(url, headers=headers, params=params)
-        response.raise_for_status()
-        
-        data = response.json()
-        
-        # Extract flight offers
-        airlines = data.get("aggregation", {}).get("airlines", [])
-        flight_offers = data.get("flightOffers", [])
-        
-        # Process and return first 3 flights
-        processed_flights = []
-        for i, offer in enumerate(flight_offers[:3]):
-            flight_info = _extract_flight_info(offer, airlines)
-            processed_flights.append(flight_info)
-        
-        return processed_flights
-        
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Error fetching flight data: {e}")
-        return []
-    except (KeyError, ValueError) as e:
-        logger.error(f"Error parsing flight data: {e}")
-        return []
-
-
-def _extract_flight_info(offer: Dict[str, Any], airlines: List[Dict[str, Any]]) -> Dict[str, Any]:
+        async with flight_admission.admit(is_failure=_is_upstream_failure):
+            response = await flight_api_client.get(
+                FlightApiConfig.url, params=params, stream=FlightApiConfig.incremental_parse,
+            )
+    except httpx.HTTPStatusError as e:
+        FLIGHT_API_SECONDS.observe(time.perf_counter() - started, status=str(e.response.status_code))
+        raise
+    except httpx.HTTPError:
+        FLIGHT_API_SECONDS.observe(time.perf_counter() - started, status="error")
+        raise
+
+    try:
+        if FlightApiConfig.incremental_parse:
+            result, size = await _read_offers(response, FlightApiConfig.max_offers)
+        else:
+            size = len(response.content)
+            result = extract_search_result(response.json(), FlightApiConfig.max_offers)
+    except (KeyError, AttributeError) as e:
+        raise ValueError(f"unexpected flight search response: {e!r}") from e
+    FLIGHT_API_SECONDS.observe(time.perf_counter() - started, status=str(response.status_code))
+    FLIGHT_API_RESPONSE_BYTES.observe(size)
+    return result
+
+
+class FlightSearchCache:
     """
-    Extract relevant flight information from a flight offer
-    
-    Args:
-        offer: Single flight offer from the API response
-    
-    Returns:
-        Processed flight information dictionary
+    Per-(route, dates, travellers, page) cache of flight searches
+
+    Kept in the shared cache backend, so a search made by one worker is
+    reused by all of them. Concurrent lookups of the same key share one
+    upstream request; only successful searches are kept, for `ttl` seconds.
     """
-    airline_mapping = dict()
-    for airline in airlines:
-        airline_mapping[airline.get("iataCode")] = {
-            "name": airline.get("name"),
-            "logo": airline.get("logoUrl")
-        }
-
-    # Extract outbound segment (first segment)
-    outbound_segment = offer.get("segments", [{}])[0] if offer.get("segments") else {}
-    
-    # Extract return segment (second segment if exists)
-    return_segment = offer.get("segments", [{}])[1] if len(offer.get("segments", [])) > 1 else {}
-    
-    # Extract price information
-    price_breakdown = offer.get("priceBreakdown", {})
-    total_price = price_breakdown.get("total", {})
-    
-    # Extract airline information from the first leg
-    first_leg = outbound_segment.get("legs", [{}])[0] if outbound_segment.get("legs") else {}
-    flight_info = first_leg.get("flightInfo", {})
-    carrier_info = flight_info.get("carrierInfo", {})
-
-    flight_number = flight_info.get("flightNumber", "")
-    airline_code = carrier_info.get("operatingCarrier", "")
-
-    airline_info = airline_mapping.get(airline_code, {})
-    
-    flight_info = {
-        "outbound": {
-            "departure_airport": {
-                "code": outbound_segment.get("departureAirport", {}).get("code", ""),
-                "name": outbound_segment.get("departureAirport", {}).get("name", ""),
-                "city": outbound_segment.get("departureAirport", {}).get("cityName", "")
-            },
-            "arrival_airport": {
-                "code": outbound_segment.get("arrivalAirport", {}).get("code", ""),
-                "name": outbound_segment.get("arrivalAirport", {}).get("name", ""),
-                "city": outbound_segment.get("arrivalAirport", {}).get("cityName", "")
-            },
-            "departure_time": outbound_segment.get("departureTime", ""),
-            "arrival_time": outbound_segment.get("arrivalTime", ""),
-            "duration": outbound_segment.get("totalTime", 0)  # in minutes
-        },
-        "return": {
-            "departure_airport": {
-                "code": return_segment.get("departureAirport", {}).get("code", ""),
-                "name": return_segment.get("departureAirport", {}).get("name", ""),
-                "city": return_segment.get("departureAirport", {}).get("cityName", "")
-            },
-            "arrival_airport": {
-                "code": return_segment.get("arrivalAirport", {}).get("code", ""),
-                "name": return_segment.get("arrivalAirport", {}).get("name", ""),
-                "city": return_segment.get("arrivalAirport", {}).get("cityName", "")
-            },
-            "departure_time": return_segment.get("departureTime", ""),
-            "arrival_time": return_segment.get("arrivalTime", ""),
-            "duration": return_segment.get("totalTime", 0)  # in minutes
-        } if return_segment else None,
-        "airline": {
-            "code": airline_code,
-            "flight_no": flight_number,
-            "name": airline_info.get("name", ""),
-            "logo": airline_info.get("logo", "")
-        },
-        "price": {
-            "total": total_price.get("units", 0) + (total_price.get("nanos", 0) / 1000000000),
-            "currency": total_price.get("currencyCode", "CNY"),
-            "base_fare": price_breakdown.get("baseFare", {}).get("units", 0) + 
-                        (price_breakdown.get("baseFare", {}).get("nanos", 0) / 1000000000),
-            "tax": price_breakdown.get("tax", {}).get("units", 0) + 
-                  (price_breakdown.get("tax", {}).get("nanos", 0) / 1000000000)
-        },
-        "stops": len(outbound_segment.get("legs", [])) - 1,  # Number of stops
-    }
-    
-    return flight_info
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self._cache = create_cache_backend("flight", max_entries)
+
+    async def search(self, from_place: str, to_place: str, from_date: str, to_date: str,
+                     adults: int = 1, page_number: int = 0) -> FlightSearchResult:
+        key = json.dumps([from_place, to_place, from_date, to_date, adults, page_number], ensure_ascii=False)
+
+        async def search_as_dict():
+            result = await search_flights_by_code(from_place, to_place, from_date, to_date, adults, page_number)
+            return result.to_dict()
+
+        return FlightSearchResult.from_dict(await self._cache.get_or_compute(key, search_as_dict, ttl=self.ttl))
+
+
+flight_search_cache = FlightSearchCache(
+    ttl=FlightApiConfig.search_cache_ttl,
+    max_entries=FlightApiConfig.search_cache_max_entries,
+)
+
+
+async def _read_offers(response: httpx.Response, limit: int) -> Tuple[FlightSearchResult, int]:
+    """Parse a streamed response until `limit` offers are read; returns the result and bytes read"""
+    parser = FlightResponseParser(limit)
+    size = 0
+    try:
+        async for chunk in response.aiter_bytes():
+            size += len(chunk)
+            if parser.feed(chunk):
+                break
+        return parser.close(), size
+    finally:
+        # 提前结束时直接关闭连接，不再读取剩余内容
+        await response.aclose()
@@ -0,0 +1,207 @@
+import codecs
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.models.flight_entity import Airline, Airport, FlightOffer, FlightSearchResult, FlightSegment, Price
+
+_EMPTY: Dict[str, Any] = {}
+_WHITESPACE = re.compile(r"\s*")
+_json_decoder = json.JSONDecoder()
+
+AirlineIndex = Dict[str, Tuple[str, str]]
+
+
+def build_airline_index(airlines: List[Dict[str, Any]]) -> AirlineIndex:
+    """iataCode -> (name, logo), built once per response"""
+    return {
+        airline.get("iataCode"): (airline.get("name", ""), airline.get("logoUrl", ""))
+        for airline in airlines
+    }
+
+
+def extract_search_result(data: Dict[str, Any], limit: int) -> FlightSearchResult:
+    """Extract the first `limit` offers of a fully decoded response"""
+    result, airline_index = _summarize_aggregation(data.get("aggregation") or _EMPTY)
+    result.offers = [extract_flight_offer(offer, airline_index) for offer in (data.get("flightOffers") or [])[:limit]]
+    return result
+
+
+def _summarize_aggregation(aggregation: Dict[str, Any]) -> Tuple[FlightSearchResult, AirlineIndex]:
+    min_price = aggregation.get("minPrice")
+    result = FlightSearchResult(
+        min_price=_money(min_price) if min_price else None,
+        currency=(min_price or _EMPTY).get("currencyCode", "CNY"),
+        total_count=aggregation.get("totalCount", 0),
+    )
+    return result, build_airline_index(aggregation.get("airlines") or [])
+
+
+def extract_flight_offer(offer: Dict[str, Any], airline_index: AirlineIndex) -> FlightOffer:
+    """Single pass over one offer: outbound / return segment, carrier and price"""
+    segments = offer.get("segments") or []
+    outbound = segments[0] if segments else _EMPTY
+    legs = outbound.get("legs") or []
+
+    flight_info = (legs[0] if legs else _EMPTY).get("flightInfo") or _EMPTY
+    airline_code = (flight_info.get("carrierInfo") or _EMPTY).get("operatingCarrier", "")
+    airline_name, airline_logo = airline_index.get(airline_code, ("", ""))
+
+    price_breakdown = offer.get("priceBreakdown") or _EMPTY
+    total = price_breakdown.get("total") or _EMPTY
+
+    return FlightOffer(
+        outbound=_extract_segment(outbound),
+        return_segment=_extract_segment(segments[1]) if len(segments) > 1 and segments[1] else None,
+        airline=Airline(
+            code=airline_code,
+            flight_no=flight_info.get("flightNumber", ""),
+            name=airline_name,
+            logo=airline_logo,
+        ),
+        price=Price(
+            total=_money(total),
+            currency=total.get("currencyCode", "CNY"),
+            base_fare=_money(price_breakdown.get("baseFare") or _EMPTY),
+            tax=_money(price_breakdown.get("tax") or _EMPTY),
+        ),
+        stops=len(legs) - 1,
+    )
+
+
+def _extract_segment(segment: Dict[str, Any]) -> FlightSegment:
+    return FlightSegment(
+        departure_airport=_extract_airport(segment.get("departureAirport") or _EMPTY),
+        arrival_airport=_extract_airport(segment.get("arrivalAirport") or _EMPTY),
+        departure_time=segment.get("departureTime", ""),
+        arrival_time=segment.get("arrivalTime", ""),
+        duration=segment.get("totalTime", 0),
+    )
+
+
+def _extract_airport(airport: Dict[str, Any]) -> Airport:
+    return Airport(code=airport.get("code", ""), name=airport.get("name", ""), city=airport.get("cityName", ""))
+
+
+def _money(amount: Dict[str, Any]) -> float:
+    return amount.get("units", 0) + amount.get("nanos", 0) / 1000000000
+
+
+class FlightResponseParser:
+    """
+    Incremental decoder for a flight search response body
+
+    Walks the top-level object as bytes arrive, decoding `aggregation` and
+    one `flightOffers` item at a time; once `limit` offers are decoded the
+    rest of the body (remaining offers, `flightDeals`) is never read.
+    Relies on `aggregation` preceding `flightOffers`, as the API returns it.
+    """
+    _OBJECT_START, _KEY, _VALUE, _OFFERS = range(4)
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.airline_index: AirlineIndex = {}
+        self.result = FlightSearchResult()
+        self.done = False
+        self._text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        # 新到的数据先放进列表，需要解析时再拼接，避免每次读取都复制整个缓冲区
+        self._chunks: List[str] = []
+        self._chunks_length = 0
+        self._state = self._OBJECT_START
+        self._key: Optional[str] = None
+        # 上次解析停在一个不完整的值上时，缓冲区至少要增长到这个长度才重试，避免对同一个值反复解码；
+        # 参考上一条报价的长度估计下一条报价的长度
+        self._retry_length = 0
+        self._offer_chars = 0
+
+    def feed(self, data: bytes) -> bool:
+        """Consume a chunk of the body; True once no more input is needed"""
+        if not self.done:
+            text = self._text_decoder.decode(data)
+            self._chunks.append(text)
+            self._chunks_length += len(text)
+            if len(self._buffer) + self._chunks_length >= self._retry_length:
+                self._parse()
+        return self.done
+
+    def close(self) -> FlightSearchResult:
+        """
+        Finish parsing at the end of the body
+
+        Raises:
+            ValueError: the body ended before a complete response was read
+        """
+        if not self.done:
+            self._chunks.append(self._text_decoder.decode(b"", final=True))
+            self._parse()
+        if not self.done:
+            raise ValueError("incomplete flight search response")
+        return self.result
+
+    def _parse(self):
+        buffer = self._buffer + "".join(self._chunks)
+        self._chunks, self._chunks_length = [], 0
+        pos = 0
+        try:
+            while not self.done:
+                pos = _WHITESPACE.match(buffer, pos).end()
+                if pos >= len(buffer):
+                    break
+
+                if self._state == self._OBJECT_START:
+                    if buffer[pos] != "{":
+                        raise ValueError("flight search response is not a JSON object")
+                    pos += 1
+                    self._state = self._KEY
+
+                elif self._state == self._KEY:
+                    if buffer[pos] == "}":
+                        self.done = True
+                        break
+                    if buffer[pos] == ",":
+                        pos += 1
+                        continue
+                    key, end = _json_decoder.raw_decode(buffer, pos)
+                    end = _WHITESPACE.match(buffer, end).end()
+                    if end >= len(buffer):
+                        break
+                    if buffer[end] != ":":
+                        raise ValueError(f"unexpected character {buffer[end]!r} in flight search response")
+                    self._key, pos = key, end + 1
+                    self._state = self._VALUE
+
+                elif self._state == self._VALUE:
+                    if self._key == "flightOffers" and buffer[pos] == "[":
+                        pos += 1
+                        self._state = self._OFFERS
+                        continue
+                    value, end = _json_decoder.raw_decode(buffer, pos)
+                    if end >= len(buffer):
+                        # 值恰好在缓冲区末尾结束，可能是被截断的数字，等更多数据
+                        break
+                    if self._key == "aggregation":
+                        offers = self.result.offers
+                        self.result, self.airline_index = _summarize_aggregation(value or _EMPTY)
+                        self.result.offers = offers
+                    pos = end
+                    self._state = self._KEY
+
+                elif self._state == self._OFFERS:
+                    if buffer[pos] == "]":
+                        pos += 1
+                        self._state = self._KEY
+                        continue
+                    if buffer[pos] == ",":
+                        pos += 1
+                        continue
+                    offer, end = _json_decoder.raw_decode(buffer, pos)
+                    self._offer_chars, pos = end - pos, end
+                    self.result.offers.append(extract_flight_offer(offer, self.airline_index))
+                    if len(self.result.offers) >= self.limit:
+                        self.done = True
+        except json.JSONDecodeError:
+            # 当前的键 / 值还不完整，保留未消费的部分，等待更多数据
+            pass
+        self._buffer = buffer[pos:]
+        self._retry_length = max(2 * len(self._buffer), self._offer_chars + 1)
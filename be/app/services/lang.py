@@ -1,78 +1,195 @@
 import os
-from langchain_core.messages import AIMessage
-from langchain_openai import ChatOpenAI
+import asyncio
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from functools import cached_property
+from typing import List, Optional, Tuple
 import json
 import logging
-from ms_agent import LLMAgent
-from mcp import ClientSession
-from mcp.client.streamable_http import streamablehttp_client
-from langchain_mcp_adapters.tools import load_mcp_tools
-from langgraph.prebuilt import create_react_agent
 
-from app.config import ModelConfig
+from app.config import LogConfig, MapVisConfig, PlanCacheConfig, PromptConfig, SseConfig, StreamBudgetConfig
 from app.models.http_entity import TravelPlanRequest
 from app.promopt.map_vis import MAP_VIS_PROMPT
+from app.promopt.template import RenderedPrompt, get_template
+from app.promopt import travel_plan  # noqa: F401  注册旅行计划模板
+from app.services.admission import UpstreamBusy, llm_admission, mcp_admission
+from app.services.budget import StreamBudget, budget_stats
+from app.services.cache_backend import MISSING
+from app.services.mcp_pool import mcp_session_pool
+from app.services.model_registry import model_registry
+from app.services.plan_cache import CachedPlan, plan_cache, plan_cache_key
+from app.services.poi import ItineraryWatcher, extract_itinerary_pois, extract_itinerary_section, generate_pin_map
+from app.services.poi_index import map_spec_cache, map_spec_key, poi_index
+from app.services.tokens import load_tokenizer, record_prompt_usage
+from app.services.metrics import (
+    MAP_VIS_POIS,
+    MAP_VIS_SECONDS,
+    PLAN_DURATION_SECONDS,
+    PLAN_OUTPUT_TOKENS,
+    PLAN_TOKENS_PER_SECOND,
+    PLAN_TTFT_SECONDS,
+)
+from app.services.sse import (
+    CHAT_DONE_FRAME,
+    DONE_FRAME,
+    ChatTextEncoder,
+    busy_frame,
+    error_frame,
+    map_vis_frame,
+    timing_frame,
+)
 
 logger = logging.getLogger(__name__)
 
-class SseContentType:
-    CHAT_TEXT = "chat_text"
-    MAP_VIS = "map_vis"
-
-
-async def lang_graph_map_vis_chat(prompt: str):
-    async with streamablehttp_client(url=os.getenv("VIS_MCP_HTTP_API_KEY")) as (read, write, session_id):  
-        async with ClientSession(read, write) as session:
-            # 1 建立连接，初始化 session
-            await session.initialize()
-
-            # 2 获取该 MCP 服务中工具列表
-            tools = await load_mcp_tools(session)
-            logger.info(f"Available tools: {[tool.name for tool in tools]}") 
-
-            # 3 构造一个 LangGraph agent 并调用工具
-            agent = create_react_agent(
-                ChatOpenAI(
-                    model=ModelConfig.model_name,
-                    api_key=ModelConfig.api_key,
-                    base_url=ModelConfig.base_url,
-                    temperature=ModelConfig.temperature,
-                    max_tokens=ModelConfig.max_tokens,
-                    streaming=True,
-                ),
-                tools,
-            )
-
-            chat_input = {
-                "messages": [
-                    {
-                        "role": "user", "content": prompt
-                    }
-                ]
-            }
-            async for chunk in agent.astream(chat_input):
-                agent_chunk = chunk.get('agent', {})
-                if 'messages' in agent_chunk:
-                    for item in agent_chunk['messages']:
-                        if isinstance(item, AIMessage) and item.content:
-                            data = json.dumps({
-                                SseContentType.MAP_VIS: item.content
-                            })
-                            yield f"data: {data}\n\n"
+
+def build_travel_plan_prompt(params: TravelPlanRequest) -> RenderedPrompt:
+    """Render the configured travel plan template version for a request"""
+    template = get_template("travel_plan", PromptConfig.travel_plan_version)
+    return template.render(
+        from_place=params.from_place,
+        to_place=params.to_place,
+        from_date=params.from_date,
+        to_date=params.to_date,
+        people_num=params.people_num,
+        others=params.others
+    )
+
+
+def _build_map_vis_agent(tools):
+    from langgraph.prebuilt import create_react_agent
+
+    # 构造一个 LangGraph agent，随 MCP 会话一起复用
+    return create_react_agent(model_registry.get("map_vis"), tools)
+
+
+async def lang_graph_map_vis_chat(prompt: str, pin_map_calls: Optional[List[List[str]]] = None):
+    """
+    Run the map-vis agent and yield the content of each AI message
+
+    The POI names of the agent's successful pin map tool calls are appended
+    to `pin_map_calls` when given.
+    """
+    # 从连接池取出已初始化、已加载工具的 MCP 会话，避免每次请求重新建立连接
+    from langchain_core.messages import AIMessage, ToolMessage
+
+    async with mcp_session_pool.acquire() as pooled:
+        agent = pooled.get_agent(_build_map_vis_agent)
+
+        chat_input = {
+            "messages": [
+                {
+                    "role": "user", "content": prompt
+                }
+            ]
+        }
+        pending_calls = {}
+        async for chunk in agent.astream(chat_input):
+            agent_chunk = chunk.get('agent', {})
+            if 'messages' in agent_chunk:
+                for item in agent_chunk['messages']:
+                    if isinstance(item, AIMessage):
+                        for call in item.tool_calls:
+                            if call["name"] == MapVisConfig.pin_map_tool:
+                                pending_calls[call["id"]] = call["args"].get("data") or []
+                        if item.content:
+                            yield item.content
+            # 工具调用成功时记录 agent 识别出的 POI 名称
+            for item in chunk.get('tools', {}).get('messages', []):
+                if isinstance(item, ToolMessage) and item.status != "error" and item.tool_call_id in pending_calls:
+                    if pin_map_calls is not None:
+                        pin_map_calls.append(pending_calls.pop(item.tool_call_id))
+
+
+@dataclass
+class MapVis:
+    contents: List[str] = field(default_factory=list)
+    # 上游繁忙 / 熔断 / 出错而没有生成地图；这样的计划不写入缓存，下次请求重新生成
+    skipped: bool = False
+
+
+async def map_vis_chat(plan: str, destination: str, pois: Optional[List[str]] = None,
+                       llm_admitted: bool = False) -> MapVis:
+    """
+    Generate the pin map for a finished plan
+
+    POIs are parsed from the plan's daily-itinerary section and sent to
+    `generate_pin_map` directly; the ReAct agent is only used when parsing
+    yields too few points or the direct tool call fails.
+
+    Args:
+        llm_admitted: the caller holds an `llm_admission` slot for this
+            request until this returns; the agent runs under it instead of
+            taking a second one
+    """
+    if pois is None:
+        pois = extract_itinerary_pois(plan, destination)
+    MAP_VIS_POIS.inc(len(pois), source="parsed")
+    # 解析出的 POI 不够时，用该目的地已识别过的、行程中提到的 POI 补足，尽量不走 agent
+    if len(pois) < MapVisConfig.min_pois and poi_index is not None:
+        pois = await poi_index.supplement(destination, extract_itinerary_section(plan) or plan, pois,
+                                          MapVisConfig.max_pois)
+    if len(pois) >= MapVisConfig.min_pois:
+        with MAP_VIS_SECONDS.time(path="direct"):
+            content = await generate_pin_map(destination, pois)
+        if content:
+            return MapVis([content])
+    logger.info(f"map vis falls back to agent, parsed pois: {pois}")
+
+    # 相同目的地、相同 POI 的行程复用 agent 上次生成的地图；一个 POI 都没有时无法判断是否相同
+    spec_key = f"agent:{map_spec_key(destination, pois)}" if pois and map_spec_cache is not None else None
+    if spec_key is not None:
+        cached = await map_spec_cache.get(spec_key)
+        if cached is not MISSING:
+            return MapVis(list(cached))
+
+    contents: List[str] = []
+    pin_map_calls: List[List[str]] = []
+    # 同一个流不重复占用 LLM 的准入名额，否则名额占满时每个流都在等自己释放，直到排队超时
+    llm_slot = nullcontext() if llm_admitted else llm_admission.admit()
+    try:
+        async with mcp_admission.admit(), llm_slot:
+            with MAP_VIS_SECONDS.time(path="agent"):
+                async for content in lang_graph_map_vis_chat(
+                    MAP_VIS_PROMPT.format(input=plan, destination=destination),
+                    pin_map_calls,
+                ):
+                    contents.append(content)
+    except UpstreamBusy as e:
+        # 上游繁忙或已熔断：跳过地图，不让请求继续堆积
+        logger.warning(f"skipping map vis: {e}")
+        return MapVis(contents, skipped=True)
+    except Exception as e:
+        # 地图失败不影响已经生成的计划
+        logger.error(f"map vis agent failed: {error_message(e)}")
+        return MapVis(contents, skipped=True)
+
+    if pin_map_calls and poi_index is not None:
+        await poi_index.add(destination, [name for names in pin_map_calls for name in names])
+        if spec_key is not None and contents:
+            await map_spec_cache.set(spec_key, contents, MapVisConfig.spec_ttl)
+    return MapVis(contents)
+
+
+def error_message(e: BaseException) -> str:
+    """Message of the underlying error, unwrapping exception groups (e.g. from an MCP session's TaskGroup)"""
+    while isinstance(e, BaseExceptionGroup) and e.exceptions:
+        e = e.exceptions[0]
+    return str(e) or type(e).__name__
 
 
 class LangChainService:
-    def __init__(self):
-        self.model = ChatOpenAI(
-            model=ModelConfig.model_name,
-            api_key=ModelConfig.api_key,
-            base_url=ModelConfig.base_url,
-            temperature=ModelConfig.temperature,
-            max_tokens=ModelConfig.max_tokens,
-            streaming=True,
-        )
+    """Clients are built on first use (or by `warm_up`), not at import time"""
 
-        self.model_scope_agent = LLMAgent(
+    @property
+    def model(self):
+        # 旅行计划使用的模型，其他任务的模型见 model_registry
+        return model_registry.get("plan")
+
+    @cached_property
+    def model_scope_agent(self):
+        from ms_agent import LLMAgent
+
+        return LLMAgent(
             mcp_config = {
                 "mcpServers": {
                     "mcp-server-chart": {
@@ -83,34 +200,202 @@ class LangChainService:
             }
         )
 
-    async def streaming_chat(self, params: TravelPlanRequest, prompt: str):
-        chat_all_content = ''
+    def warm_up(self):
+        """Import the model / agent libraries and build the chat clients; blocking, run it in a thread"""
+        import langgraph.prebuilt  # noqa: F401
+
+        model_registry.warm_up()
+        load_tokenizer()
+
+    async def streaming_chat(self, params: TravelPlanRequest, prompt: RenderedPrompt):
+        from langchain_core.messages import AIMessage
+
+        # 文本增量先放进列表，需要全文时再 join，避免长文本反复拼接字符串
+        chat_parts: List[str] = []
+        encoder = ChatTextEncoder(SseConfig.coalesce_ms, SseConfig.coalesce_chars)
+        # 边生成边解析每日行程，行程部分结束后立即开始生成地图，与后续内容的生成并行
+        watcher = ItineraryWatcher(params.to_place)
+        map_task: Optional[asyncio.Task] = None
+        partial_task: Optional[asyncio.Task] = None
+        partial_poi_count = 0
+        map_vis: Optional[MapVis] = None
+
+        budget = StreamBudget(StreamBudgetConfig.max_seconds, StreamBudgetConfig.max_output_tokens)
+        deadline = asyncio.timeout(budget.max_seconds)
 
         try:
-            async for chunk in self.model.astream(prompt):
-                if isinstance(chunk, AIMessage) and chunk.content:
-                    logger.info(f"line in chat: {chunk.content}")
+            async with deadline:
+                # DashScope 的并发 / 速率受准入控制，繁忙或熔断时直接返回 [BUSY]
+                async with llm_admission.admit():
+                    async for chunk in self.model.astream(prompt.messages):
+                        if isinstance(chunk, AIMessage) and chunk.content:
+                            # 逐 token 日志只在 DEBUG 下按采样输出
+                            if logger.isEnabledFor(logging.DEBUG) and budget.output_tokens % LogConfig.token_sample_every == 0:
+                                logger.debug(f"line in chat: {chunk.content}")
+
+                            chat_parts.append(chunk.content)
+                            frame = encoder.push(chunk.content)
+                            if frame:
+                                yield frame
+
+                            if not budget.consume():
+                                budget.record_truncated()
+                                break
+
+                            for event in watcher.feed(chunk.content):
+                                if event == ItineraryWatcher.SECTION_COMPLETE:
+                                    # agent 兜底直接使用本流的 LLM 名额，名额在地图任务结束后才释放
+                                    map_task = asyncio.create_task(map_vis_chat(
+                                        "".join(chat_parts), params.to_place, watcher.pois(), llm_admitted=True
+                                    ))
+                                elif event == ItineraryWatcher.DAY_COMPLETE and MapVisConfig.partial_updates \
+                                        and (partial_task is None or partial_task.done()):
+                                    pois = watcher.pois()
+                                    if len(pois) >= MapVisConfig.min_pois and len(pois) > partial_poi_count:
+                                        partial_poi_count = len(pois)
+                                        partial_task = asyncio.create_task(generate_pin_map(params.to_place, pois))
+
+                            # 已完成的地图穿插在文本中推送，局部地图在完整地图开始生成后不再推送
+                            if partial_task is not None and partial_task.done() and map_task is None:
+                                content = partial_task.result()
+                                partial_task = None
+                                if content:
+                                    yield encoder.flush_with(map_vis_frame(content))
+                            if map_task is not None and map_task.done() and not map_task.exception() \
+                                    and map_vis is None:
+                                map_vis = map_task.result()
+                                yield encoder.flush_with("".join(map_vis_frame(content) for content in map_vis.contents))
+
+                        # 模型自身的 max_tokens 同样会截断计划
+                        if isinstance(chunk, AIMessage) and chunk.response_metadata.get("finish_reason") == "length":
+                            budget.record_truncated()
+
+                    budget.mark_chat_done()
+                    chat_all_content = "".join(chat_parts)
+                    logger.debug(f"travel_plan_all_ai_resp: {chat_all_content}")
 
-                    data = json.dumps({
-                        SseContentType.CHAT_TEXT: chunk.content
-                    })
-                    chat_all_content += chunk.content
-                    yield f"data: {data}\n\n"
+                    yield encoder.flush_with(CHAT_DONE_FRAME)
 
-            logger.info(f"travel_plan_all_ai_resp: {chat_all_content}")
+                    # 提前开始的地图任务没有自己的 LLM 名额，等它结束后才释放本流的名额
+                    if map_task is not None and map_vis is None:
+                        map_vis = await map_task
+                        for content in map_vis.contents:
+                            yield map_vis_frame(content)
 
-            yield "data: [CHAT_DONE]\n\n"
+                # 行程部分在最后或未能识别时，等文本生成结束再生成地图，agent 兜底时重新申请 LLM 名额
+                if map_task is None:
+                    map_task = asyncio.create_task(map_vis_chat(chat_all_content, params.to_place))
+                    map_vis = await map_task
+                    for content in map_vis.contents:
+                        yield map_vis_frame(content)
 
-            # wait chat message done, 用上面的结果调用 MCP
-            async for chunk in lang_graph_map_vis_chat(
-                MAP_VIS_PROMPT.format(input=chat_all_content, destination=params.to_place),
-            ):
-                yield chunk
+                # 完整的计划与地图写入缓存，相同请求再次到来时直接回放；被截断或跳过了地图的计划不缓存
+                if PlanCacheConfig.enabled and budget.status == "ok" and not map_vis.skipped:
+                    await plan_cache.put(plan_cache_key(params), chat_all_content, map_vis.contents)
 
-            # 发送结束标记
-            yield "data: [DONE]\n\n"
+                # 发送结束标记，之前附带本次请求各阶段耗时
+                yield timing_frame(_timing(budget)) + DONE_FRAME
+        except asyncio.CancelledError:
+            # 客户端全部断开：LLM 流与地图任务都会被取消
+            budget.record_cancelled()
+            raise
+        except UpstreamBusy as e:
+            budget.status = "busy"
+            logger.warning(f"streaming chat rejected: {e}")
+            yield encoder.flush_with(busy_frame(e.retry_after))
+        except TimeoutError as e:
+            if not deadline.expired():
+                # 上游请求自身的超时 (如 MCP / 模型客户端)，str(e) 通常为空
+                budget.status = "error"
+                logger.error(f"streaming chat upstream timed out: {e!r}")
+                yield error_frame("上游服务响应超时，请稍后重试")
+            else:
+                budget.record_timeout()
+                yield error_frame("生成超时，请稍后重试")
         except Exception as e:
-            yield f"data: [ERROR] {str(e)}\n\n"
+            budget.status = "error"
+            logger.error(f"streaming chat failed: {e!r}")
+            yield error_frame(error_message(e))
+        finally:
+            for task in (map_task, partial_task):
+                if task is not None and not task.done():
+                    task.cancel()
+            _record_summary(params, prompt, budget, chat_parts, encoder, map_vis)
+
+
+    async def generate_plan(self, params: TravelPlanRequest, with_map: bool = True) -> Tuple[CachedPlan, bool]:
+        """
+        Generate a complete plan without streaming, for batch jobs
+
+        Served from and written to the plan cache like `streaming_chat`, so
+        plans generated offline are replayed by `/travel/chat`. Plans without
+        a map, plans whose map was skipped (upstream busy or failing) and
+        plans cut off by the model's max_tokens are not cached.
+
+        Returns:
+            the plan and whether it came from the cache
+
+        Raises:
+            UpstreamBusy: the model is saturated or its circuit is open
+            TimeoutError: generation exceeded `StreamBudgetConfig.max_seconds`
+        """
+        key = plan_cache_key(params)
+        if PlanCacheConfig.enabled:
+            cached = await plan_cache.get(key)
+            if cached is not None:
+                return cached, True
+
+        async with asyncio.timeout(StreamBudgetConfig.max_seconds):
+            async with llm_admission.admit():
+                prompt = build_travel_plan_prompt(params)
+                message = await self.model.ainvoke(prompt.messages)
+            plan = message.content
+            record_prompt_usage(prompt, plan)
+            complete = message.response_metadata.get("finish_reason") != "length"
+            if not complete:
+                budget_stats.truncated += 1
+                logger.warning(f"plan for {params.to_place} cut off by max_tokens, not caching it")
+            map_vis = MapVis()
+            if with_map:
+                map_vis = await map_vis_chat(plan, params.to_place)
+
+        if with_map and complete and not map_vis.skipped and PlanCacheConfig.enabled:
+            await plan_cache.put(key, plan, map_vis.contents)
+        return CachedPlan(plan=plan, map_vis=map_vis.contents), False
+
+
+def _timing(budget: StreamBudget) -> dict:
+    return {
+        "ttft_ms": None if budget.ttft is None else round(budget.ttft * 1000),
+        "chat_ms": None if budget.chat_done_at is None else round((budget.chat_done_at - budget.started) * 1000),
+        "total_ms": round(budget.elapsed * 1000),
+    }
+
+
+def _record_summary(params: TravelPlanRequest, prompt: RenderedPrompt, budget: StreamBudget,
+                    chat_parts: List[str], encoder: ChatTextEncoder, map_vis: Optional[MapVis]):
+    """One structured log record and the metrics for each request"""
+    if budget.ttft is not None:
+        PLAN_TTFT_SECONDS.observe(budget.ttft)
+        if budget.chat_done_at is not None and budget.chat_done_at > budget.first_token_at:
+            PLAN_TOKENS_PER_SECOND.observe(budget.output_tokens / (budget.chat_done_at - budget.first_token_at))
+    PLAN_OUTPUT_TOKENS.inc(budget.output_tokens)
+    PLAN_DURATION_SECONDS.observe(budget.elapsed, status=budget.status)
+
+    summary = {
+        "request": params.canonical_key()[:12],
+        "to_place": params.to_place,
+        "status": budget.status,
+        "output_tokens": budget.output_tokens,
+        "plan_chars": sum(len(part) for part in chat_parts),
+        "chat_frames": encoder.frames,
+        "map_items": len(map_vis.contents) if map_vis else 0,
+        "map_skipped": bool(map_vis and map_vis.skipped),
+        **_timing(budget),
+        # 本地统计的 prompt / completion token 数 (近似值) 及可缓存前缀的占比
+        **record_prompt_usage(prompt, "".join(chat_parts)),
+    }
+    logger.info(f"travel_plan_summary {json.dumps(summary, ensure_ascii=False)}")
 
 
 lang_chain_service = LangChainService()
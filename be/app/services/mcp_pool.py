@@ -0,0 +1,261 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, List, Optional
+
+from app.config import McpPoolConfig
+from app.services.metrics import MCP_SETUP_SECONDS, registry
+
+if TYPE_CHECKING:
+    from mcp import ClientSession
+    from langchain_core.tools import BaseTool
+
+logger = logging.getLogger(__name__)
+
+
+def import_client_modules():
+    """Import the MCP client libraries; slow, so done lazily or in a warm-up thread"""
+    from mcp import ClientSession
+    from mcp.client.streamable_http import streamablehttp_client
+    from langchain_mcp_adapters.tools import load_mcp_tools
+
+    return ClientSession, streamablehttp_client, load_mcp_tools
+
+
+class PooledMcpSession:
+    """
+    A long-lived MCP client session with its tool schemas and agent graph
+
+    The transport and session context managers are owned by a dedicated
+    background task (anyio cancel scopes must be exited by the task that
+    entered them); other tasks use `session` through its memory streams.
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self.session: Optional["ClientSession"] = None
+        self.tools: List["BaseTool"] = []
+        self.agent: Any = None
+        # 建立连接 + initialize + 加载工具 + 构造 agent 的耗时，即每次复用所节省的时间
+        self.setup_seconds = 0.0
+        self.last_used = time.monotonic()
+        self.last_checked = time.monotonic()
+        self._ready = asyncio.Event()
+        self._closing = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._error: Optional[BaseException] = None
+
+    @property
+    def alive(self) -> bool:
+        return self.session is not None and self._task is not None and not self._task.done()
+
+    async def connect(self, timeout: float):
+        self._task = asyncio.create_task(self._run())
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            await self.close()
+            raise
+        if self._error is not None:
+            raise self._error
+
+    async def _run(self):
+        started = time.perf_counter()
+        try:
+            ClientSession, streamablehttp_client, load_mcp_tools = import_client_modules()
+            async with streamablehttp_client(url=self.url) as (read, write, session_id):
+                async with ClientSession(read, write) as session:
+                    MCP_SETUP_SECONDS.observe(time.perf_counter() - started, phase="connect")
+
+                    # 1 建立连接，初始化 session
+                    with MCP_SETUP_SECONDS.time(phase="initialize"):
+                        await session.initialize()
+
+                    # 2 获取该 MCP 服务中工具列表
+                    with MCP_SETUP_SECONDS.time(phase="load_tools"):
+                        self.tools = await load_mcp_tools(session)
+                    logger.info(f"Available tools: {[tool.name for tool in self.tools]}")
+
+                    self.session = session
+                    self.setup_seconds = time.perf_counter() - started
+                    self._ready.set()
+                    await self._closing.wait()
+        except Exception as e:
+            self._error = e
+            logger.warning(f"MCP session closed with error: {e!r}")
+        finally:
+            self.session = None
+            self._ready.set()
+
+    def get_agent(self, factory: Callable[[List["BaseTool"]], Any]) -> Any:
+        """Build the agent graph for this session's tools once and reuse it"""
+        if self.agent is None:
+            started = time.perf_counter()
+            self.agent = factory(self.tools)
+            elapsed = time.perf_counter() - started
+            MCP_SETUP_SECONDS.observe(elapsed, phase="build_agent")
+            self.setup_seconds += elapsed
+        return self.agent
+
+    async def ping(self, timeout: float) -> bool:
+        try:
+            await asyncio.wait_for(self.session.send_ping(), timeout)
+            self.last_checked = time.monotonic()
+            return True
+        except Exception as e:
+            logger.info(f"MCP session health check failed: {e!r}")
+            return False
+
+    async def close(self):
+        self._closing.set()
+        if self._task is not None and not self._task.done():
+            try:
+                await asyncio.wait_for(self._task, 5)
+            except (asyncio.TimeoutError, Exception):
+                self._task.cancel()
+
+
+class McpSessionPool:
+    """
+    Pool of long-lived, health-checked MCP sessions
+
+    Sessions are checked out exclusively; dead ones are replaced
+    transparently on checkout and idle ones are reaped in the background.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        max_size: int,
+        min_size: int = 0,
+        connect_timeout: float = 15,
+        idle_timeout: float = 300,
+        reap_interval: float = 30,
+        health_check_interval: float = 30,
+        ping_timeout: float = 5,
+    ):
+        self.url = url
+        self.max_size = max_size
+        self.min_size = min_size
+        self.connect_timeout = connect_timeout
+        self.idle_timeout = idle_timeout
+        self.reap_interval = reap_interval
+        self.health_check_interval = health_check_interval
+        self.ping_timeout = ping_timeout
+
+        self._idle: List[PooledMcpSession] = []
+        self._slots = asyncio.Semaphore(max_size)
+        self._reaper: Optional[asyncio.Task] = None
+
+        self.connects = 0
+        self.reuses = 0
+        self.setup_seconds_saved = 0.0
+
+    async def start(self):
+        """Start the idle reaper"""
+        if self._reaper is None:
+            self._reaper = asyncio.create_task(self._reap_loop())
+
+    async def warm_up(self):
+        """Open `min_size` sessions ahead of the first request"""
+        if not self.url:
+            return
+        await asyncio.to_thread(import_client_modules)
+        for _ in range(self.min_size - len(self._idle)):
+            try:
+                self._idle.append(await self._connect())
+            except Exception as e:
+                logger.warning(f"MCP pool warm-up failed: {e!r}")
+                break
+
+    async def aclose(self):
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+        idle, self._idle = self._idle, []
+        await asyncio.gather(*(pooled.close() for pooled in idle))
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[PooledMcpSession]:
+        async with self._slots:
+            pooled = await self._checkout()
+            try:
+                yield pooled
+            except BaseException:
+                # 调用中途失败或被取消，会话状态不可信，直接丢弃
+                await pooled.close()
+                raise
+            pooled.last_used = time.monotonic()
+            self._idle.append(pooled)
+
+    def stats(self) -> dict:
+        return {
+            "idle": len(self._idle),
+            "connects": self.connects,
+            "reuses": self.reuses,
+            "setup_seconds_saved": round(self.setup_seconds_saved, 3),
+        }
+
+    async def _checkout(self) -> PooledMcpSession:
+        while self._idle:
+            # LIFO，优先复用最近使用过的会话，让多余的会话自然空闲被回收
+            pooled = self._idle.pop()
+            if not pooled.alive:
+                await pooled.close()
+                continue
+            if time.monotonic() - pooled.last_checked > self.health_check_interval:
+                if not await pooled.ping(self.ping_timeout):
+                    await pooled.close()
+                    continue
+
+            self.reuses += 1
+            self.setup_seconds_saved += pooled.setup_seconds
+            logger.info(f"Reusing MCP session, saved {pooled.setup_seconds:.3f}s of setup")
+            return pooled
+
+        return await self._connect()
+
+    async def _connect(self) -> PooledMcpSession:
+        pooled = PooledMcpSession(self.url)
+        await pooled.connect(self.connect_timeout)
+        self.connects += 1
+        logger.info(f"Opened MCP session in {pooled.setup_seconds:.3f}s")
+        return pooled
+
+    async def _reap_loop(self):
+        while True:
+            await asyncio.sleep(self.reap_interval)
+            now = time.monotonic()
+            keep, expired = [], []
+            for pooled in self._idle:
+                if not pooled.alive or now - pooled.last_used > self.idle_timeout:
+                    expired.append(pooled)
+                else:
+                    keep.append(pooled)
+            self._idle = keep
+            for pooled in expired:
+                await pooled.close()
+            if expired:
+                logger.info(f"Reaped {len(expired)} idle MCP sessions")
+
+
+mcp_session_pool = McpSessionPool(
+    url=McpPoolConfig.url,
+    max_size=McpPoolConfig.max_size,
+    min_size=McpPoolConfig.min_size,
+    connect_timeout=McpPoolConfig.connect_timeout,
+    idle_timeout=McpPoolConfig.idle_timeout,
+    reap_interval=McpPoolConfig.reap_interval,
+    health_check_interval=McpPoolConfig.health_check_interval,
+    ping_timeout=McpPoolConfig.ping_timeout,
+)
+
+registry.callback("dodo_mcp_pool_idle_sessions", "Idle MCP sessions in the pool", "gauge",
+                  lambda: mcp_session_pool.stats()["idle"])
+registry.callback("dodo_mcp_pool_connects_total", "MCP sessions opened", "counter",
+                  lambda: mcp_session_pool.connects)
+registry.callback("dodo_mcp_pool_reuses_total", "Requests served by a pooled MCP session", "counter",
+                  lambda: mcp_session_pool.reuses)
+registry.callback("dodo_mcp_setup_seconds_saved_total", "MCP setup time saved by session reuse", "counter",
+                  lambda: mcp_session_pool.setup_seconds_saved)
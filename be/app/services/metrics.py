@@ -0,0 +1,220 @@
+"""
+Minimal Prometheus-style metrics (text exposition format 0.0.4)
+"""
+import bisect
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+
+_INF_LE = 'le="+Inf"'
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+SIZE_BUCKETS = (1_000, 10_000, 100_000, 500_000, 1_000_000, 5_000_000, 10_000_000)
+RATE_BUCKETS = (1, 5, 10, 20, 40, 60, 80, 100, 150, 200, 400)
+
+
+def _format_labels(labelnames: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in self._values.items()]
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 每个 label 组合: [各 bucket 计数..., sum, count]
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        state = self._values.get(key)
+        if state is None:
+            state = self._values[key] = [0] * (len(self.buckets) + 2)
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            state[index] += 1
+        state[-2] += value
+        state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, state in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, _INF_LE)} {state[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {state[-1]}")
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """Value read from an existing object at scrape time (e.g. pool / cache stats)"""
+
+    def __init__(self, name: str, documentation: str, metric_type: str, callback: Callable[[], float]):
+        super().__init__(name, documentation)
+        self.type = metric_type
+        self.callback = callback
+
+    def samples(self) -> List[str]:
+        return [f"{self.name} {_format_value(self.callback())}"]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(self, name: str, documentation: str, metric_type: str,
+                 callback: Callable[[], float]) -> CallbackMetric:
+        return self.register(CallbackMetric(name, documentation, metric_type, callback))
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+registry = MetricsRegistry()
+
+# travel plan streaming
+PLAN_TTFT_SECONDS = registry.histogram(
+    "dodo_plan_ttft_seconds", "Time to first LLM token of a travel plan")
+PLAN_TOKENS_PER_SECOND = registry.histogram(
+    "dodo_plan_tokens_per_second", "LLM output tokens per second while streaming a plan", buckets=RATE_BUCKETS)
+PLAN_DURATION_SECONDS = registry.histogram(
+    "dodo_plan_duration_seconds", "Total travel plan stream duration (text + map)", ["status"])
+PLAN_OUTPUT_TOKENS = registry.counter(
+    "dodo_plan_output_tokens_total", "LLM output tokens streamed for travel plans")
+
+# model calls by task (city_code / map_vis / plan)
+MODEL_CALL_SECONDS = registry.histogram(
+    "dodo_model_call_seconds", "Chat model call latency by task", ["task", "status"])
+MODEL_TOKENS = registry.counter(
+    "dodo_model_tokens_total", "Chat model token usage by task", ["task", "type"])
+
+# prompt accounting, counted locally by template (prefix = identical for every request);
+# approximate, the local tokenizer is not the model's, billed usage is dodo_model_tokens_total
+PROMPT_TOKENS = registry.counter(
+    "dodo_prompt_approx_tokens_total", "Approximate prompt tokens by template and part (prefix / variable)",
+    ["template", "part"])
+PROMPT_COMPLETION_TOKENS = registry.counter(
+    "dodo_prompt_approx_completion_tokens_total", "Approximate completion tokens by prompt template", ["template"])
+
+# map vis / MCP
+MCP_SETUP_SECONDS = registry.histogram(
+    "dodo_mcp_setup_seconds", "MCP session setup time by phase", ["phase"])
+MAP_VIS_SECONDS = registry.histogram(
+    "dodo_map_vis_seconds", "Map generation time by path", ["path"])
+MAP_VIS_POIS = registry.counter(
+    "dodo_map_vis_pois_total", "POIs sent to the pin map by source (parsed from the plan / known from the index)",
+    ["source"])
+
+# shared cache backends
+CACHE_LOOKUPS = registry.counter(
+    "dodo_cache_lookups_total", "Cache backend lookups by namespace and result", ["namespace", "result"])
+
+# city code
+CITY_CODE_SECONDS = registry.histogram(
+    "dodo_city_code_seconds", "get_city_code latency by cache outcome", ["outcome"])
+
+# flight API
+FLIGHT_API_SECONDS = registry.histogram(
+    "dodo_flight_api_seconds", "Booking.com flight search upstream latency", ["status"])
+FLIGHT_API_RESPONSE_BYTES = registry.histogram(
+    "dodo_flight_api_response_bytes", "Booking.com flight search payload size", buckets=SIZE_BUCKETS)
+
+# upstream admission control
+ADMISSION_WAIT_SECONDS = registry.histogram(
+    "dodo_upstream_admission_wait_seconds", "Time spent waiting for an upstream slot", ["upstream"])
+ADMISSION_REJECTED = registry.counter(
+    "dodo_upstream_rejected_total", "Calls rejected by upstream admission control", ["upstream", "reason"])
+
+
+class ServerTiming:
+    """Collects per-request stage durations for a `Server-Timing` header"""
+
+    def __init__(self):
+        self._entries: List[Tuple[str, float]] = []
+
+    @contextmanager
+    def measure(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._entries.append((name, time.perf_counter() - started))
+
+    def header(self) -> str:
+        return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in self._entries)
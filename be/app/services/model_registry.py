@@ -0,0 +1,102 @@
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Dict
+
+from app.config import ModelConfig
+from app.services.metrics import MODEL_CALL_SECONDS, MODEL_TOKENS
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ModelSpec:
+    task: str
+    model_name: str
+    temperature: float
+    max_tokens: int
+    timeout: float
+    deterministic: bool = False
+
+
+def _build_usage_recorder(task: str):
+    """LangChain callback recording latency and token usage of every call made for `task`"""
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class UsageRecorder(BaseCallbackHandler):
+        # 在调用方的事件循环里直接执行，不转到线程池
+        run_inline = True
+
+        def __init__(self):
+            self._started: Dict[Any, float] = {}
+
+        def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+            self._started[run_id] = time.perf_counter()
+
+        def on_llm_end(self, response, *, run_id, **kwargs):
+            self._observe(run_id, "ok")
+            for generations in response.generations:
+                for generation in generations:
+                    usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                    if usage:
+                        MODEL_TOKENS.inc(usage.get("input_tokens", 0), task=task, type="input")
+                        MODEL_TOKENS.inc(usage.get("output_tokens", 0), task=task, type="output")
+
+        def on_llm_error(self, error, *, run_id, **kwargs):
+            self._observe(run_id, "error")
+
+        def _observe(self, run_id, status: str):
+            started = self._started.pop(run_id, None)
+            if started is not None:
+                MODEL_CALL_SECONDS.observe(time.perf_counter() - started, task=task, status=status)
+
+    return UsageRecorder()
+
+
+class ModelRegistry:
+    """
+    Chat model bound to each task, built on first use
+
+    Tasks are configured in `ModelConfig.tasks`; a deterministic task runs
+    with temperature 0 and a fixed seed so identical prompts give identical
+    (cacheable) answers. Latency and token usage are recorded per task.
+    """
+
+    def __init__(self, specs: Dict[str, ModelSpec]):
+        self.specs = specs
+        self._models: Dict[str, Any] = {}
+
+    def get(self, task: str):
+        model = self._models.get(task)
+        if model is None:
+            model = self._models[task] = self._build(self.specs[task])
+        return model
+
+    def warm_up(self):
+        """Build every task's client; blocking, run it in a thread"""
+        for task in self.specs:
+            self.get(task)
+
+    def _build(self, spec: ModelSpec):
+        from langchain_openai import ChatOpenAI
+
+        logger.info(f"model for {spec.task}: {spec.model_name}, deterministic={spec.deterministic}")
+        return ChatOpenAI(
+            model=spec.model_name,
+            api_key=ModelConfig.api_key,
+            base_url=ModelConfig.base_url,
+            temperature=0 if spec.deterministic else spec.temperature,
+            seed=ModelConfig.seed if spec.deterministic else None,
+            max_tokens=spec.max_tokens,
+            timeout=spec.timeout,
+            max_retries=ModelConfig.max_retries,
+            streaming=True,
+            # 流式响应最后附带 token 用量
+            stream_usage=True,
+            callbacks=[_build_usage_recorder(spec.task)],
+        )
+
+
+model_registry = ModelRegistry({
+    task: ModelSpec(task=task, **options) for task, options in ModelConfig.tasks.items()
+})
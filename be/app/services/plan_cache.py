@@ -0,0 +1,139 @@
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import AsyncIterator, List, Optional
+
+from app.config import CacheConfig, PlanCacheConfig, PromptConfig
+from app.models.http_entity import TravelPlanRequest
+from app.services.cache_backend import MISSING, CacheBackend, create_cache_backend
+from app.services.metrics import registry
+from app.services.sse import CHAT_DONE_FRAME, DONE_FRAME, chat_text_frame, map_vis_frame
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedPlan:
+    plan: str
+    map_vis: List[str] = field(default_factory=list)
+    created_at: float = field(default_factory=time.time)
+
+    @property
+    def size(self) -> int:
+        return len(self.plan) + sum(len(item) for item in self.map_vis)
+
+
+def plan_cache_key(params: TravelPlanRequest) -> str:
+    """Normalized request + prompt template version"""
+    raw = f"{PromptConfig.travel_plan_version}:{params.canonical_key()}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class PlanCache:
+    """
+    Cache of completed travel plans (plan markdown + map-vis output)
+
+    Memory tier is an LRU bounded by total text size, with a TTL; the
+    optional shared tier (a sqlite / redis cache backend) lets every uvicorn
+    worker serve plans generated by the others.
+    """
+
+    def __init__(self, ttl: int, max_memory_chars: int, shared: Optional[CacheBackend] = None):
+        self.ttl = ttl
+        self.max_memory_chars = max_memory_chars
+        self.shared = shared
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, CachedPlan]" = OrderedDict()
+        self._memory_chars = 0
+
+    async def get(self, key: str) -> Optional[CachedPlan]:
+        cached = self._get_memory(key)
+        if cached is None and self.shared is not None:
+            data = await self.shared.get(key)
+            if data is not MISSING:
+                cached = CachedPlan(plan=data["plan"], map_vis=data["map_vis"], created_at=data["created_at"])
+                self._put_memory(key, cached)
+
+        if cached is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return cached
+
+    async def put(self, key: str, plan: str, map_vis: List[str]):
+        cached = CachedPlan(plan=plan, map_vis=list(map_vis))
+        self._put_memory(key, cached)
+        if self.shared is not None:
+            await self.shared.set(key, {
+                "plan": cached.plan,
+                "map_vis": cached.map_vis,
+                "created_at": cached.created_at,
+            }, self.ttl)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._entries),
+            "memory_chars": self._memory_chars,
+        }
+
+    def _expired(self, cached: CachedPlan) -> bool:
+        return cached.created_at + self.ttl <= time.time()
+
+    def _get_memory(self, key: str) -> Optional[CachedPlan]:
+        cached = self._entries.get(key)
+        if cached is None:
+            return None
+        if self._expired(cached):
+            self._pop_memory(key)
+            return None
+        self._entries.move_to_end(key)
+        return cached
+
+    def _put_memory(self, key: str, cached: CachedPlan):
+        if cached.size > self.max_memory_chars:
+            return
+        if key in self._entries:
+            self._pop_memory(key)
+        self._entries[key] = cached
+        self._memory_chars += cached.size
+        while self._memory_chars > self.max_memory_chars:
+            self._pop_memory(next(iter(self._entries)))
+
+    def _pop_memory(self, key: str):
+        cached = self._entries.pop(key)
+        self._memory_chars -= cached.size
+
+
+async def replay_plan(cached: CachedPlan) -> AsyncIterator[str]:
+    """Replay a cached plan with the same SSE events as `streaming_chat`"""
+    chunk_chars = max(1, PlanCacheConfig.replay_chunk_chars)
+    for i in range(0, len(cached.plan), chunk_chars):
+        yield chat_text_frame(cached.plan[i:i + chunk_chars])
+        if PlanCacheConfig.replay_interval > 0:
+            await asyncio.sleep(PlanCacheConfig.replay_interval)
+
+    yield CHAT_DONE_FRAME
+
+    for content in cached.map_vis:
+        yield map_vis_frame(content)
+
+    yield DONE_FRAME
+
+
+plan_cache = PlanCache(
+    ttl=PlanCacheConfig.ttl,
+    max_memory_chars=PlanCacheConfig.max_memory_chars,
+    shared=create_cache_backend("plan", PlanCacheConfig.shared_max_entries)
+    if PlanCacheConfig.shared and CacheConfig.backend != "memory" else None,
+)
+
+registry.callback("dodo_plan_cache_hits_total", "Travel plan cache hits", "counter", lambda: plan_cache.hits)
+registry.callback("dodo_plan_cache_misses_total", "Travel plan cache misses", "counter", lambda: plan_cache.misses)
+registry.callback("dodo_plan_cache_entries", "Travel plans in the memory cache tier", "gauge",
+                  lambda: plan_cache.stats()["entries"])
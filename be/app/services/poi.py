@@ -0,0 +1,206 @@
+import logging
+import re
+from typing import List, Optional
+
+from app.config import MapVisConfig
+from app.services.admission import mcp_admission
+from app.services.mcp_pool import mcp_session_pool
+from app.services.poi_index import map_spec_ttl, default_resolved_name, map_spec_cache, map_spec_key, poi_index
+
+logger = logging.getLogger(__name__)
+
+# TRAVEL_PLAN_PROMPT 中 "## 📅 每日行程安排" 一节，到下一个二级标题为止
+_ITINERARY_HEADING = re.compile(r"^#{1,3}[^\n]*每日行程[^\n]*$", re.M)
+_NEXT_SECTION = re.compile(r"^#{1,2}\s", re.M)
+
+_BOLD = re.compile(r"\*\*(.+?)\*\*")
+_QUOTED = re.compile(r"[「『“《]([^」』”》\n]{2,20})[」』”》]")
+# 动词之后、分隔符之前的一段文字通常是景点，如 "游览外滩、豫园和城隍庙"
+_ACTIVITY = re.compile(
+    r"(?:游览|参观|前往|漫步|打卡|探访|登上|夜游|畅游|逛逛|逛|拜访|步行至|抵达|欣赏)"
+    r"([^，,。；;！!？?：:（(\n]+)"
+)
+_LIST_SPLIT = re.compile(r"[、/→]|和|与|及")
+_LINE_PREFIX = re.compile(r"^\s*(?:[-*+]|\d+[.)、])\s*")
+_LABEL = re.compile(
+    r"^\**(?:上午|中午|下午|傍晚|晚上|夜间|早上|早晨|景点[^：:*]*|活动|用餐建议)\**\s*[：:]\s*\**"
+)
+_NOT_POI = re.compile(
+    r"^(?:day\s*\d+|第.{1,3}天|d\d+|上午|中午|下午|傍晚|晚上|夜间|早上|早晨|用餐建议|用餐|早餐|午餐|晚餐|"
+    r"景点介绍|游览时间|交通|住宿|酒店|返程|出发|自由活动|休息)",
+    re.I,
+)
+_TRAILING_NOISE = re.compile(r"(?:附近|一带|周边|景区内|等地|等)$")
+_DAY_HEADING = re.compile(r"^\s*(?:#{3,6}\s|\**\s*(?:day\s*\d+|第[一二三四五六七八九十\d]+天))", re.I)
+
+
+def extract_itinerary_section(plan: str) -> str:
+    """Return the daily-itinerary section of a plan, or '' when it is missing"""
+    heading = _ITINERARY_HEADING.search(plan)
+    if heading is None:
+        return ""
+    rest = plan[heading.end():]
+    next_section = _NEXT_SECTION.search(rest)
+    return rest[:next_section.start()] if next_section else rest
+
+
+def _clean_poi(name: str) -> Optional[str]:
+    name = name.strip().strip("*`\"'“”「」『』《》 ")
+    name = _TRAILING_NOISE.sub("", name).strip()
+    if not 2 <= len(name) <= 20 or _NOT_POI.match(name) or name.isdigit():
+        return None
+    return name
+
+
+def extract_pois(text: str, destination: str = "", limit: int = MapVisConfig.max_pois) -> List[str]:
+    """
+    Extract POI names from markdown itinerary text, in order of appearance
+
+    Picks up bold / quoted names and the objects of activity verbs
+    ("游览外滩、豫园"). Names equal to the destination itself are skipped.
+    """
+    pois: List[str] = []
+    seen = set()
+
+    def add(candidate: str):
+        poi = _clean_poi(candidate)
+        if poi and poi not in seen and poi != destination:
+            seen.add(poi)
+            pois.append(poi)
+
+    for line in text.splitlines():
+        line = _LABEL.sub("", _LINE_PREFIX.sub("", line))
+        if not line:
+            continue
+
+        for match in _BOLD.finditer(line):
+            # "**上午：**" 之类的标签不是地点
+            if not match.group(1).rstrip().endswith(("：", ":")):
+                add(match.group(1))
+        for match in _QUOTED.finditer(line):
+            add(match.group(1))
+        # 加粗的部分已经处理过，替换为分隔符，避免 "登上**东方明珠**俯瞰夜景" 被当成一个地点
+        for match in _ACTIVITY.finditer(_BOLD.sub("，", line)):
+            for part in _LIST_SPLIT.split(match.group(1)):
+                add(part)
+
+        if len(pois) >= limit:
+            break
+
+    return pois[:limit]
+
+
+def extract_itinerary_pois(plan: str, destination: str) -> List[str]:
+    """POIs mentioned in the daily-itinerary section of a generated plan"""
+    return extract_pois(extract_itinerary_section(plan), destination)
+
+
+class ItineraryWatcher:
+    """
+    Follows a plan while it streams and reports itinerary progress
+
+    `feed()` returns the events triggered by the new text: "day" when a day
+    block inside the daily-itinerary section is complete, and "done" once
+    the whole section is complete (the next top-level section started).
+    """
+    DAY_COMPLETE = "day"
+    SECTION_COMPLETE = "done"
+
+    def __init__(self, destination: str):
+        self.destination = destination
+        self.in_section = False
+        self.done = False
+        self._pending_line = ""
+        self._section_lines: List[str] = []
+        self._day_has_content = False
+
+    @property
+    def section(self) -> str:
+        return "\n".join(self._section_lines)
+
+    def pois(self) -> List[str]:
+        return extract_pois(self.section, self.destination)
+
+    def feed(self, text: str) -> List[str]:
+        if self.done:
+            return []
+
+        events = []
+        *lines, self._pending_line = (self._pending_line + text).split("\n")
+        for line in lines:
+            event = self._feed_line(line)
+            if event:
+                events.append(event)
+            if self.done:
+                break
+        return events
+
+    def _feed_line(self, line: str) -> Optional[str]:
+        if not self.in_section:
+            if _ITINERARY_HEADING.match(line):
+                self.in_section = True
+            return None
+
+        if _NEXT_SECTION.match(line):
+            self.done = True
+            return self.SECTION_COMPLETE
+
+        event = None
+        if _DAY_HEADING.match(line):
+            if self._day_has_content:
+                event = self.DAY_COMPLETE
+            self._day_has_content = False
+        elif line.strip():
+            self._day_has_content = True
+
+        self._section_lines.append(line)
+        return event
+
+
+async def generate_pin_map(destination: str, pois: List[str]) -> Optional[str]:
+    """
+    Generate a pin map for the given POIs
+
+    Names the tool resolved before are taken from the POI index, and a map
+    already generated for the same destination and POI set is reused.
+
+    Returns:
+        Markdown for the generated map, or None if the tool call failed
+    """
+    if poi_index is None:
+        return await call_pin_map(destination, [default_resolved_name(destination, poi) for poi in pois])
+
+    data = await poi_index.resolve(destination, pois)
+
+    async def generate() -> Optional[str]:
+        content = await call_pin_map(destination, data)
+        if content:
+            await poi_index.add(destination, data)
+        return content
+
+    # 相同的地图在所有 worker 之间只生成一次
+    return await map_spec_cache.get_or_compute(map_spec_key(destination, data), generate, ttl=map_spec_ttl)
+
+
+async def call_pin_map(destination: str, data: List[str]) -> Optional[str]:
+    """Call the MCP `generate_pin_map` tool directly with resolved POI names"""
+    title = f"{destination}行程地图"
+
+    try:
+        async with mcp_admission.admit(), mcp_session_pool.acquire() as pooled:
+            result = await pooled.session.call_tool(
+                MapVisConfig.pin_map_tool,
+                {"title": title, "data": data},
+            )
+    except Exception as e:
+        logger.warning(f"generate_pin_map call failed: {e!r}")
+        return None
+
+    text = "".join(getattr(item, "text", "") for item in result.content).strip()
+    if result.isError or not text:
+        logger.warning(f"generate_pin_map returned an error: {text}")
+        return None
+
+    if text.startswith(("http://", "https://")):
+        return f"![{title}]({text})"
+    return text
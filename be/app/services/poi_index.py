@@ -0,0 +1,129 @@
+import hashlib
+import logging
+import unicodedata
+from typing import Dict, Iterable, List, Optional
+
+from app.config import MapVisConfig
+from app.services.cache_backend import MISSING, CacheBackend, create_cache_backend
+from app.services.metrics import MAP_VIS_POIS
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_name(name: str) -> str:
+    """NFKC, lower case, no whitespace: "Victoria  Peak" and "victoria peak" are one POI"""
+    return "".join(unicodedata.normalize("NFKC", name or "").split()).lower()
+
+
+def poi_key(destination: str, name: str) -> str:
+    """Normalized POI name without the destination prefix ("上海外滩" -> "外滩")"""
+    key = normalize_name(name)
+    prefix = normalize_name(destination)
+    if prefix and key.startswith(prefix) and len(key) > len(prefix):
+        key = key[len(prefix):]
+    return key
+
+
+def default_resolved_name(destination: str, name: str) -> str:
+    # 加上目的地前缀，便于 generate_pin_map 在正确的城市范围内识别地点
+    return name if destination in name else f"{destination}{name}"
+
+
+def map_spec_key(destination: str, resolved: Iterable[str]) -> str:
+    """Destination + the set of POIs on the map; the order of the pins does not matter"""
+    keys = sorted({poi_key(destination, name) for name in resolved})
+    raw = "\n".join([normalize_name(destination), *keys])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class PoiIndex:
+    """
+    POIs already placed on a map, per destination
+
+    One entry per destination maps the normalized POI name to the name the
+    pin map tool resolved successfully (from direct calls and from the
+    agent's tool calls). Repeat POIs reuse that name, and plans for popular
+    destinations whose itinerary parses into too few POIs are completed
+    with known landmarks they mention instead of falling back to the agent.
+    Only names of at least `supplement_min_chars` characters are matched
+    against the text, shorter ones hit unrelated words too often.
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: int, max_per_destination: int, supplement_min_chars: int = 3):
+        self.backend = backend
+        self.ttl = ttl
+        self.max_per_destination = max_per_destination
+        self.supplement_min_chars = supplement_min_chars
+
+    async def known(self, destination: str) -> Dict[str, str]:
+        """Normalized POI name -> resolved name"""
+        entry = await self.backend.get(normalize_name(destination))
+        return {} if entry is MISSING else entry
+
+    async def resolve(self, destination: str, pois: List[str]) -> List[str]:
+        """Names to send to the pin map tool, one per distinct POI"""
+        known = await self.known(destination)
+        resolved: Dict[str, str] = {}
+        for poi in pois:
+            key = poi_key(destination, poi)
+            if key and key not in resolved:
+                resolved[key] = known.get(key) or default_resolved_name(destination, poi)
+        return list(resolved.values())
+
+    async def supplement(self, destination: str, text: str, pois: List[str], limit: int) -> List[str]:
+        """`pois` followed by known POIs of the destination mentioned in `text`, in order of appearance"""
+        known = await self.known(destination)
+        if not known:
+            return pois
+
+        normalized_text = normalize_name(text)
+        have = {poi_key(destination, poi) for poi in pois}
+        found = []
+        for key, name in known.items():
+            if key not in have and len(key) >= self.supplement_min_chars:
+                position = normalized_text.find(key)
+                if position >= 0:
+                    found.append((position, name))
+        found.sort()
+
+        added = [name for _, name in found[:max(0, limit - len(pois))]]
+        MAP_VIS_POIS.inc(len(added), source="index")
+        return pois + added
+
+    async def add(self, destination: str, resolved: Iterable[str]):
+        """Record names the pin map tool accepted"""
+        # 读-改-写不是原子的，多个 worker 同时写同一目的地时可能丢失个别 POI，下次成功生成地图时会补上
+        known = await self.known(destination)
+        changed = False
+        for name in resolved:
+            key = poi_key(destination, name)
+            if len(key) < 2:
+                continue
+            if known.get(key) != name:
+                changed = True
+            # 重新插入，最近使用的排在最后
+            known.pop(key, None)
+            known[key] = name
+        if not changed:
+            return
+        while len(known) > self.max_per_destination:
+            known.pop(next(iter(known)))
+        await self.backend.set(normalize_name(destination), known, self.ttl)
+
+
+def map_spec_ttl(content: Optional[str]) -> Optional[int]:
+    # 调用失败 (None) 不缓存，下次重试
+    return MapVisConfig.spec_ttl if content else None
+
+
+poi_index: Optional[PoiIndex] = None
+map_spec_cache: Optional[CacheBackend] = None
+if MapVisConfig.cache_enabled:
+    poi_index = PoiIndex(
+        create_cache_backend("poi", MapVisConfig.poi_max_destinations),
+        ttl=MapVisConfig.poi_ttl,
+        max_per_destination=MapVisConfig.poi_max_per_destination,
+        supplement_min_chars=MapVisConfig.poi_supplement_min_chars,
+    )
+    # 生成过的地图 (markdown)，直接调用工具的结果按 map_spec_key，agent 的结果按解析出的 POI 集合
+    map_spec_cache = create_cache_backend("map_spec", MapVisConfig.spec_max_entries)
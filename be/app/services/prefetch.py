@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import time
+import httpx
+from typing import Dict, List, Optional, Tuple
+
+from app.config import FlightPrefetchConfig
+from app.models.flight_entity import FlightOffer
+from app.models.http_entity import TravelPlanRequest
+from app.services.city import get_city_code
+from app.services.flight import flight_search_cache
+
+logger = logging.getLogger(__name__)
+
+
+def flight_search_key(params: TravelPlanRequest) -> Tuple:
+    """Only the fields that affect the flight search"""
+    return (
+        params.from_place.strip().lower(),
+        params.to_place.strip().lower(),
+        params.from_date.strip(),
+        params.to_date.strip(),
+        params.people_num,
+        params.page_number,
+    )
+
+
+async def search_flights(params: TravelPlanRequest) -> Optional[List[FlightOffer]]:
+    """
+    Resolve both city codes and search flights for a travel request
+
+    Returns:
+        Flight list, or None when a city code can't be resolved
+    """
+    # 并发请求两个城市代码
+    from_place, to_place = await asyncio.gather(
+        get_city_code(params.from_place),
+        get_city_code(params.to_place)
+    )
+
+    if not from_place or not to_place:
+        return None
+
+    try:
+        result = await flight_search_cache.search(
+            from_place,
+            to_place,
+            params.from_date.strip(),
+            params.to_date.strip(),
+            adults=max(params.people_num, 1),
+            page_number=params.page_number,
+        )
+    except httpx.HTTPError as e:
+        logger.error(f"Error fetching flight data: {e}")
+        return []
+    except ValueError as e:
+        logger.error(f"Error parsing flight data: {e}")
+        return []
+    return result.offers
+
+
+class FlightPrefetcher:
+    """
+    Short-lived cache of in-flight / finished flight searches
+
+    `/travel/chat` starts the search speculatively; the later
+    `/flight-search` for the same request awaits the same task instead of
+    starting from scratch.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._tasks: Dict[Tuple, Tuple[asyncio.Task, float]] = {}
+
+    def start(self, params: TravelPlanRequest) -> asyncio.Task:
+        self._evict_expired()
+
+        key = flight_search_key(params)
+        entry = self._tasks.get(key)
+        if entry is not None:
+            return entry[0]
+
+        task = asyncio.create_task(search_flights(params))
+        task.add_done_callback(self._on_done)
+        self._tasks[key] = (task, time.monotonic() + self.ttl)
+        return task
+
+    async def get(self, params: TravelPlanRequest) -> Optional[List[FlightOffer]]:
+        entry = self._tasks.get(flight_search_key(params))
+        if entry is not None and entry[1] > time.monotonic():
+            logger.info("flight search served from prefetch")
+            task = entry[0]
+        else:
+            task = self.start(params)
+        # shield: 客户端断开不应取消其他请求共享的任务
+        return await asyncio.shield(task)
+
+    def _on_done(self, task: asyncio.Task):
+        if task.cancelled():
+            self._discard(task)
+        elif task.exception() is not None:
+            logger.error(f"flight prefetch failed: {task.exception()}")
+            self._discard(task)
+        elif not task.result():
+            # 城市代码解析失败 (None) 或航班接口出错 (空列表) 可能是暂时的，不保留，下次请求重新查询；
+            # 成功的城市代码与航班结果各自有缓存，重查代价很小
+            self._discard(task)
+
+    def _discard(self, task: asyncio.Task):
+        for key, (cached_task, _) in list(self._tasks.items()):
+            if cached_task is task:
+                del self._tasks[key]
+
+    def _evict_expired(self):
+        now = time.monotonic()
+        for key, (task, expires_at) in list(self._tasks.items()):
+            if expires_at <= now and task.done():
+                del self._tasks[key]
+
+
+flight_prefetcher = FlightPrefetcher(ttl=FlightPrefetchConfig.ttl)
@@ -0,0 +1,86 @@
+import json
+import time
+from typing import List, Optional
+
+from app.models.http_entity import SseContentType
+
+# 预先拼好的帧模板，只有内容部分需要 JSON 编码
+# 输出与 json.dumps({"chat_text": text}) 完全一致
+_CHAT_TEXT_PREFIX = 'data: {"%s": ' % SseContentType.CHAT_TEXT
+_MAP_VIS_PREFIX = 'data: {"%s": ' % SseContentType.MAP_VIS
+_FRAME_SUFFIX = "}\n\n"
+
+CHAT_DONE_FRAME = "data: [CHAT_DONE]\n\n"
+DONE_FRAME = "data: [DONE]\n\n"
+
+
+def chat_text_frame(text: str) -> str:
+    return _CHAT_TEXT_PREFIX + json.dumps(text) + _FRAME_SUFFIX
+
+
+def map_vis_frame(content: str) -> str:
+    return _MAP_VIS_PREFIX + json.dumps(content) + _FRAME_SUFFIX
+
+
+def fare_row_frame(row: dict) -> str:
+    return f"data: {json.dumps({SseContentType.FARE_ROW: row}, ensure_ascii=False)}\n\n"
+
+
+def fare_matrix_frame(matrix: dict) -> str:
+    return f"data: {json.dumps({SseContentType.FARE_MATRIX: matrix}, ensure_ascii=False)}\n\n"
+
+
+def error_frame(message: str) -> str:
+    return f"data: [ERROR] {message}\n\n"
+
+
+def busy_frame(retry_after: float) -> str:
+    # 上游繁忙或熔断，客户端可在 retry_after 秒后重试
+    return f"data: [BUSY] {json.dumps({'retry_after': retry_after})}\n\n"
+
+
+def timing_frame(timing: dict) -> str:
+    # 命名事件，EventSource 的 onmessage 不会收到，需要时可单独监听 "timing"
+    return f"event: timing\ndata: {json.dumps(timing)}\n\n"
+
+
+class ChatTextEncoder:
+    """
+    Coalesces streamed chat_text deltas into fewer SSE frames
+
+    Deltas are buffered and flushed as one frame once `interval_ms` has
+    passed since the last flush or `max_chars` are pending. The window is
+    checked when a delta arrives, so callers must `flush()` before sending
+    any other frame and at the end of the stream.
+    """
+
+    def __init__(self, interval_ms: float, max_chars: int):
+        self.interval = interval_ms / 1000
+        self.max_chars = max_chars
+        self.frames = 0
+        self._pending: List[str] = []
+        self._pending_chars = 0
+        self._last_flush = time.monotonic()
+
+    def push(self, text: str) -> Optional[str]:
+        """Buffer a delta; returns a frame when the window is full"""
+        self._pending.append(text)
+        self._pending_chars += len(text)
+        if self._pending_chars >= self.max_chars or time.monotonic() - self._last_flush >= self.interval:
+            return self.flush()
+        return None
+
+    def flush_with(self, frame: str) -> str:
+        """Pending text frame (if any) followed by `frame`, as one write"""
+        pending = self.flush()
+        return pending + frame if pending else frame
+
+    def flush(self) -> Optional[str]:
+        self._last_flush = time.monotonic()
+        if not self._pending:
+            return None
+        text = "".join(self._pending) if len(self._pending) > 1 else self._pending[0]
+        self._pending.clear()
+        self._pending_chars = 0
+        self.frames += 1
+        return chat_text_frame(text)
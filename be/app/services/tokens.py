@@ -0,0 +1,82 @@
+import logging
+from functools import lru_cache
+from typing import Dict, Optional
+
+from app.config import PromptConfig
+from app.promopt.template import RenderedPrompt
+from app.services.metrics import PROMPT_COMPLETION_TOKENS, PROMPT_TOKENS
+
+logger = logging.getLogger(__name__)
+
+#
+# 本地统计的 token 数只是近似值：tiktoken 是 OpenAI 的分词器，与 Qwen 的分词结果并不相同，
+# 用于比较模板版本与前缀占比；实际计费的用量见 dodo_model_tokens_total
+#
+
+_encoding = None
+
+
+def load_tokenizer():
+    """
+    Load the tiktoken encoding named by `PromptConfig.tokenizer`
+
+    The first load may download the BPE file, so this is blocking: it runs
+    in `LangChainService.warm_up` (in a thread), never on the event loop.
+    Until it has loaded, or if it can't be loaded, counts are estimated.
+    """
+    global _encoding
+    if _encoding is not None or PromptConfig.tokenizer == "estimate":
+        return
+    try:
+        import tiktoken
+
+        _encoding = tiktoken.get_encoding(PromptConfig.tokenizer)
+    except Exception as e:
+        logger.warning(f"tokenizer {PromptConfig.tokenizer} unavailable, estimating token counts: {e!r}")
+        return
+    # 加载前按估算值缓存的模板固定部分重新统计
+    _count_static.cache_clear()
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough count without a tokenizer: one token per non-ASCII character (CJK, emoji), one per 4 ASCII characters"""
+    non_ascii = sum(1 for char in text if ord(char) > 127)
+    return non_ascii + (len(text) - non_ascii + 3) // 4
+
+
+def count_tokens(text: str) -> int:
+    """Approximate token count, see the note at the top of this module"""
+    if _encoding is None:
+        return estimate_tokens(text)
+    return len(_encoding.encode(text, disallowed_special=()))
+
+
+@lru_cache(maxsize=32)
+def _count_static(text: str) -> int:
+    # 模板的固定部分只统计一次
+    return count_tokens(text)
+
+
+def record_prompt_usage(prompt: RenderedPrompt, completion: Optional[str] = None) -> Dict:
+    """
+    Count prompt / completion tokens of one request and the share of the prompt that is a cache-eligible prefix
+
+    The prefix is the leading text identical for every request of the
+    template (see `PromptTemplate.static_prefix`). Counts are approximate.
+    """
+    template = prompt.template
+    prompt_tokens = _count_static(template.system) + count_tokens(prompt.user)
+    prefix_tokens = min(_count_static(template.static_prefix), prompt_tokens)
+    PROMPT_TOKENS.inc(prefix_tokens, template=template.key, part="prefix")
+    PROMPT_TOKENS.inc(prompt_tokens - prefix_tokens, template=template.key, part="variable")
+
+    usage = {
+        "template": template.key,
+        "approx_prompt_tokens": prompt_tokens,
+        "approx_prefix_tokens": prefix_tokens,
+        "prefix_ratio": round(prefix_tokens / prompt_tokens, 3) if prompt_tokens else 0,
+    }
+    if completion is not None:
+        usage["approx_completion_tokens"] = count_tokens(completion)
+        PROMPT_COMPLETION_TOKENS.inc(usage["approx_completion_tokens"], template=template.key)
+    return usage
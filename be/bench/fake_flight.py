@@ -0,0 +1,42 @@
+"""
+Booking.com flight search stand-in serving res/booking-fligh-api-exp.json
+
+    python -m bench.fake_flight --port 9103 --latency 0.6
+"""
+import argparse
+import asyncio
+import os
+
+import uvicorn
+from fastapi import FastAPI, Response
+
+from app.config import res_dir
+
+SAMPLE_PATH = os.path.join(res_dir, "booking-fligh-api-exp.json")
+
+
+def create_app(latency: float) -> FastAPI:
+    app = FastAPI(title="fake flight api")
+    with open(SAMPLE_PATH, "rb") as f:
+        payload = f.read()
+
+    @app.get("/v1/flights/search")
+    async def search():
+        await asyncio.sleep(latency)
+        return Response(payload, media_type="application/json")
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9103)
+    parser.add_argument("--latency", type=float, default=0.6, help="seconds per search")
+    args = parser.parse_args()
+
+    uvicorn.run(create_app(args.latency), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+OpenAI-compatible chat completions stand-in with configurable latency
+
+    python -m bench.fake_llm --port 9101 --ttft 0.5 --token-rate 40
+"""
+import argparse
+import asyncio
+import json
+import re
+import time
+import uuid
+from typing import List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+SAMPLE_PLAN = """## 🗺️ 旅行概览
+- 总行程天数：3天
+- 旅行类型：文化休闲
+- 预算建议：每人 3000-5000 元
+
+## 🏨 住宿推荐
+- 推荐住宿区域：**外滩/南京东路**，交通便利
+- 预订建议：提前两周预订
+
+## 📅 每日行程安排
+
+### Day 1：经典上海
+- **上午**：抵达后前往**外滩**，欣赏万国建筑群
+- **下午**：游览豫园、城隍庙，品尝南翔小笼包
+- **晚上**：登上**东方明珠广播电视塔**俯瞰夜景
+
+### Day 2：文艺上海
+- **上午**：漫步武康路、安福路
+- **下午**：参观上海博物馆和新天地
+- **晚上**：夜游黄浦江
+
+### Day 3：告别上海
+- **上午**：前往田子坊
+- **下午**：返程
+
+## 🍽️ 美食推荐
+- 本帮菜：红烧肉、油爆虾
+- 推荐餐厅：**老吉士酒家**、**小杨生煎**
+
+## ⚠️ 注意事项
+- 注意天气变化，携带雨具
+- 地铁高峰期人多，注意保管财物
+
+## 💡 实用贴士
+- 使用交通卡乘坐地铁更省钱
+- 外滩夜景最佳观赏时间为 19:00-22:00
+"""
+
+
+def create_app(ttft: float, token_rate: float, chars_per_token: int, repeat: int) -> FastAPI:
+    app = FastAPI(title="fake llm")
+    plan = SAMPLE_PLAN * repeat
+    tokens = [plan[i:i + chars_per_token] for i in range(0, len(plan), chars_per_token)]
+
+    def reply_for(messages) -> List[str]:
+        """Reply split into streamed tokens"""
+        prompt = " ".join(str(message.get("content", "")) for message in messages)
+        if "IATA" in prompt:
+            # 批量解析的提示词携带一个地名数组
+            names = re.search(r"\[[^\[\]]*\]", prompt)
+            if names:
+                return [json.dumps({name: "SHA" for name in json.loads(names.group())}, ensure_ascii=False)]
+            return ['{"code": "SHA"}']
+        return tokens
+
+    def chunk(completion_id: str, model: str, delta: dict, finish_reason=None) -> str:
+        data = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    def usage(messages, parts: List[str]) -> dict:
+        prompt_tokens = sum(len(str(message.get("content", ""))) for message in messages) // chars_per_token
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": len(parts),
+                "total_tokens": prompt_tokens + len(parts)}
+
+    async def stream(model: str, parts: List[str], usage_data: Optional[dict]):
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        await asyncio.sleep(ttft)
+        yield chunk(completion_id, model, {"role": "assistant", "content": ""})
+        interval = 1 / token_rate if token_rate > 0 else 0
+        for part in parts:
+            yield chunk(completion_id, model, {"content": part})
+            if interval:
+                await asyncio.sleep(interval)
+        yield chunk(completion_id, model, {}, finish_reason="stop")
+        if usage_data is not None:
+            # stream_options.include_usage：最后一个 chunk 不带 choices，只带用量
+            data = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                    "model": model, "choices": [], "usage": usage_data}
+            yield f"data: {json.dumps(data)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        model = body.get("model", "fake")
+        messages = body.get("messages", [])
+        parts = reply_for(messages)
+
+        if body.get("stream"):
+            include_usage = (body.get("stream_options") or {}).get("include_usage")
+            return StreamingResponse(stream(model, parts, usage(messages, parts) if include_usage else None),
+                                     media_type="text/event-stream")
+
+        await asyncio.sleep(ttft)
+        return JSONResponse({
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "".join(parts)},
+                "finish_reason": "stop",
+            }],
+            "usage": usage(messages, parts),
+        })
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9101)
+    parser.add_argument("--ttft", type=float, default=0.5, help="seconds before the first token")
+    parser.add_argument("--token-rate", type=float, default=40, help="tokens per second per stream, 0 = unthrottled")
+    parser.add_argument("--chars-per-token", type=int, default=2)
+    parser.add_argument("--repeat", type=int, default=1, help="repeat the sample plan to make it longer")
+    args = parser.parse_args()
+
+    app = create_app(args.ttft, args.token_rate, args.chars_per_token, args.repeat)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""
+Streamable-HTTP MCP stand-in for the chart server, exposing `generate_pin_map`
+
+    python -m bench.fake_mcp --port 9102 --latency 0.8
+"""
+import argparse
+import asyncio
+from typing import List
+
+from mcp.server.fastmcp import FastMCP
+
+
+def create_server(host: str, port: int, latency: float) -> FastMCP:
+    server = FastMCP("mcp-server-chart", host=host, port=port, log_level="WARNING")
+
+    @server.tool()
+    async def generate_pin_map(title: str, data: List[str], markerPopup: dict = None,
+                               width: int = 1600, height: int = 1000) -> str:
+        """Generate a point map to display the location and distribution of POIs"""
+        await asyncio.sleep(latency)
+        return f"https://example.com/pin-map/{abs(hash((title, tuple(data)))) % 10 ** 8}.png"
+
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9102)
+    parser.add_argument("--latency", type=float, default=0.8, help="seconds per generate_pin_map call")
+    args = parser.parse_args()
+
+    create_server(args.host, args.port, args.latency).run(transport="streamable-http")
+
+
+if __name__ == "__main__":
+    main()
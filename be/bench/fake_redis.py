@@ -0,0 +1,90 @@
+"""
+Minimal Redis-compatible stand-in (RESP over TCP) for the cache backend
+
+    python -m bench.fake_redis --port 9104
+
+Supports PING / AUTH / SELECT / GET / SET (EX, PX, NX) / DEL with expiry;
+enough for CACHE_BACKEND=redis without a real server.
+"""
+import argparse
+import asyncio
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+def _simple(text: str) -> bytes:
+    return b"+%s\r\n" % text.encode()
+
+
+def _bulk(data: Optional[bytes]) -> bytes:
+    return b"$-1\r\n" if data is None else b"$%d\r\n%s\r\n" % (len(data), data)
+
+
+class FakeRedis:
+    def __init__(self):
+        self._data: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+
+    def _get(self, key: bytes) -> Optional[bytes]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= time.monotonic():
+            del self._data[key]
+            return None
+        return entry[0]
+
+    def execute(self, args: List[bytes]) -> bytes:
+        command = args[0].upper()
+        if command in (b"PING", b"AUTH", b"SELECT"):
+            return _simple("PONG" if command == b"PING" else "OK")
+        if command == b"GET":
+            return _bulk(self._get(args[1]))
+        if command == b"DEL":
+            return b":%d\r\n" % sum(self._data.pop(key, None) is not None for key in args[1:])
+        if command == b"SET":
+            key, value, options = args[1], args[2], [arg.upper() for arg in args[3:]]
+            expires_at = None
+            if b"PX" in options:
+                expires_at = time.monotonic() + int(options[options.index(b"PX") + 1]) / 1000
+            elif b"EX" in options:
+                expires_at = time.monotonic() + int(options[options.index(b"EX") + 1])
+            if b"NX" in options and self._get(key) is not None:
+                return _bulk(None)
+            self._data[key] = (value, expires_at)
+            return _simple("OK")
+        return b"-ERR unknown command '%s'\r\n" % command
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                args = []
+                for _ in range(int(line[1:-2])):
+                    length = int((await reader.readline())[1:-2])
+                    args.append((await reader.readexactly(length + 2))[:-2])
+                writer.write(self.execute(args))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(host: str, port: int):
+    server = await asyncio.start_server(FakeRedis().handle, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9104)
+    args = parser.parse_args()
+    asyncio.run(serve(args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
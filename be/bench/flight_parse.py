@@ -0,0 +1,62 @@
+"""
+Flight response parsing: full `json.loads` vs incremental parsing, on res/booking-fligh-api-exp.json
+
+    python -m bench.flight_parse --offers 3 --rounds 200
+"""
+import argparse
+import json
+import time
+import tracemalloc
+from typing import Callable, Dict
+
+from app.services.flight_parser import FlightResponseParser, extract_search_result
+from bench.fake_flight import SAMPLE_PATH
+
+
+def parse_full(body: bytes, limit: int, chunk_size: int):
+    return extract_search_result(json.loads(body), limit)
+
+
+def parse_incremental(body: bytes, limit: int, chunk_size: int):
+    parser = FlightResponseParser(limit)
+    for start in range(0, len(body), chunk_size):
+        if parser.feed(body[start:start + chunk_size]):
+            break
+    return parser.close()
+
+
+def measure(parse: Callable, body: bytes, limit: int, chunk_size: int, rounds: int) -> Dict:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        parse(body, limit, chunk_size)
+    per_call_ms = (time.perf_counter() - started) / rounds * 1000
+
+    tracemalloc.start()
+    parse(body, limit, chunk_size)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"per_call_ms": round(per_call_ms, 3), "peak_kb": round(peak / 1024, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--offers", type=int, default=3)
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--chunk-size", type=int, default=16 * 1024, help="bytes per network read")
+    args = parser.parse_args()
+
+    with open(SAMPLE_PATH, "rb") as f:
+        body = f.read()
+
+    full = parse_full(body, args.offers, args.chunk_size)
+    incremental = parse_incremental(body, args.offers, args.chunk_size)
+    assert [o.to_dict() for o in full.offers] == [o.to_dict() for o in incremental.offers]
+
+    print(f"sample: {len(body) / 1024:.0f}KB, {args.offers} offers, {args.chunk_size}B chunks")
+    for name, parse in (("full", parse_full), ("incremental", parse_incremental)):
+        result = measure(parse, body, args.offers, args.chunk_size, args.rounds)
+        print(f"  {name:12s} {result['per_call_ms']:8.3f}ms/call  peak {result['peak_kb']:8.1f}KB")
+
+
+if __name__ == "__main__":
+    main()
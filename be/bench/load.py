@@ -0,0 +1,196 @@
+"""
+Load driver: N concurrent /travel/chat SSE streams and /flight-search calls
+
+    python -m bench.load --base-url http://127.0.0.1:9100 --requests 200 --concurrency 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+CHAT_PATH = "/api/v1/travel/chat"
+FLIGHT_PATH = "/api/v1/travel/flight-search"
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def read_rss_mb(pid: int) -> Dict[str, float]:
+    """Current and peak RSS of a local process, from /proc (Linux only)"""
+    memory = {}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith(("VmRSS:", "VmHWM:")):
+                    name, value = line.split(":")
+                    memory["rss_mb" if name == "VmRSS" else "peak_rss_mb"] = int(value.split()[0]) / 1024
+    except OSError:
+        pass
+    return memory
+
+
+def request_params(index: int, unique: int) -> Dict[str, str]:
+    # unique 控制不同请求的数量，相同请求会被合并 / 命中缓存
+    return {
+        "from_place": "北京",
+        "to_place": "上海",
+        "from_date": "2025-10-01",
+        "to_date": "2025-10-04",
+        "people_num": "2",
+        "others": f"bench-{index % unique}",
+    }
+
+
+async def run_chat(client: httpx.AsyncClient, params: Dict[str, str]) -> Dict:
+    started = time.perf_counter()
+    result = {"ok": False, "ttft": None, "total": None, "bytes": 0, "events": 0}
+    try:
+        async with client.stream("GET", CHAT_PATH, params=params) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                result["bytes"] += len(line) + 1
+                if not line.startswith("data: "):
+                    continue
+                result["events"] += 1
+                data = line[6:]
+                if result["ttft"] is None and data.startswith("{") and '"chat_text"' in data:
+                    result["ttft"] = time.perf_counter() - started
+                if data == "[DONE]":
+                    result["ok"] = True
+                    break
+                if data.startswith("[ERROR]"):
+                    break
+    except httpx.HTTPError as e:
+        result["error"] = repr(e)
+    result["total"] = time.perf_counter() - started
+    return result
+
+
+async def run_flight(client: httpx.AsyncClient, params: Dict[str, str]) -> Dict:
+    started = time.perf_counter()
+    result = {"ok": False, "total": None}
+    try:
+        response = await client.get(FLIGHT_PATH, params=params)
+        result["ok"] = response.status_code == 200 and response.json().get("code") == 0
+    except (httpx.HTTPError, ValueError) as e:
+        result["error"] = repr(e)
+    result["total"] = time.perf_counter() - started
+    return result
+
+
+def summarize(name: str, results: List[Dict], elapsed: float) -> Dict:
+    ok = [r for r in results if r["ok"]]
+    totals = [r["total"] for r in ok]
+    summary = {
+        "name": name,
+        "requests": len(results),
+        "ok": len(ok),
+        "errors": len(results) - len(ok),
+        "throughput_rps": round(len(ok) / elapsed, 2) if elapsed else None,
+        "total_p50": percentile(totals, 50),
+        "total_p95": percentile(totals, 95),
+        "total_p99": percentile(totals, 99),
+    }
+    ttfts = [r["ttft"] for r in ok if r.get("ttft") is not None]
+    if ttfts:
+        summary.update({
+            "ttft_p50": percentile(ttfts, 50),
+            "ttft_p95": percentile(ttfts, 95),
+            "ttft_p99": percentile(ttfts, 99),
+            "ttft_mean": statistics.fmean(ttfts),
+        })
+    return summary
+
+
+async def run_load(base_url: str, requests: int, concurrency: int, unique: int,
+                   flights: bool, server_pid: Optional[int]) -> Dict:
+    limits = httpx.Limits(max_connections=concurrency * 2, max_keepalive_connections=concurrency * 2)
+    semaphore = asyncio.Semaphore(concurrency)
+    chat_results: List[Dict] = []
+    flight_results: List[Dict] = []
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=httpx.Timeout(300, connect=10), limits=limits) as client:
+        async def one(index: int):
+            params = request_params(index, unique)
+            async with semaphore:
+                # 与前端一致：同时发起计划生成与航班搜索
+                jobs = [run_chat(client, params)]
+                if flights:
+                    jobs.append(run_flight(client, params))
+                results = await asyncio.gather(*jobs)
+            chat_results.append(results[0])
+            if flights:
+                flight_results.append(results[1])
+
+        memory_before = read_rss_mb(server_pid) if server_pid else {}
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        elapsed = time.perf_counter() - started
+        memory_after = read_rss_mb(server_pid) if server_pid else {}
+
+    report = {
+        "config": {"requests": requests, "concurrency": concurrency, "unique": unique},
+        "elapsed_s": round(elapsed, 3),
+        "chat": summarize("chat", chat_results, elapsed),
+        "memory_before": memory_before,
+        "memory_after": memory_after,
+    }
+    if flights:
+        report["flight"] = summarize("flight", flight_results, elapsed)
+    return report
+
+
+def print_report(report: Dict):
+    def fmt(value):
+        return "-" if value is None else (f"{value * 1000:.0f}ms" if isinstance(value, float) else str(value))
+
+    print(f"elapsed: {report['elapsed_s']}s  config: {report['config']}")
+    for key in ("chat", "flight"):
+        if key not in report:
+            continue
+        s = report[key]
+        print(f"[{key}] ok={s['ok']}/{s['requests']} throughput={s['throughput_rps']} req/s "
+              f"total p50/p95/p99={fmt(s['total_p50'])}/{fmt(s['total_p95'])}/{fmt(s['total_p99'])}")
+        if "ttft_p50" in s:
+            print(f"[{key}] ttft p50/p95/p99={fmt(s['ttft_p50'])}/{fmt(s['ttft_p95'])}/{fmt(s['ttft_p99'])}")
+    if report["memory_after"]:
+        print(f"[memory] before={report['memory_before']} after={report['memory_after']}")
+
+
+def write_report(report: Dict, path: str):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:9100")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--unique", type=int, default=1_000_000, help="number of distinct requests")
+    parser.add_argument("--no-flights", action="store_true", help="only drive /travel/chat")
+    parser.add_argument("--server-pid", type=int, help="pid of the app server, for RSS reporting")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_load(
+        args.base_url, args.requests, args.concurrency, args.unique, not args.no_flights, args.server_pid,
+    ))
+    print_report(report)
+    if args.json:
+        write_report(report, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""
+Prompt size per travel plan template version: total tokens and the share that is a shared prefix
+
+    python -m bench.prompt --to-place 东京 --others "带老人，节奏慢一点"
+
+Counts are local approximations (tiktoken is not Qwen's tokenizer, and an
+estimate is used when its encoding can't be loaded); compare
+them with `dodo_model_tokens_total` for what the provider actually billed.
+"""
+import argparse
+
+from app.models.http_entity import TravelPlanRequest
+from app.promopt import travel_plan  # noqa: F401
+from app.promopt.template import get_template
+from app.services.tokens import count_tokens, load_tokenizer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--from-place", default="上海")
+    parser.add_argument("--to-place", default="成都")
+    parser.add_argument("--from-date", default="2025-10-01")
+    parser.add_argument("--to-date", default="2025-10-05")
+    parser.add_argument("--people-num", type=int, default=2)
+    parser.add_argument("--others", default="喜欢美食")
+    parser.add_argument("--versions", nargs="+", default=["1", "2"])
+    args = parser.parse_args()
+
+    params = TravelPlanRequest(from_place=args.from_place, to_place=args.to_place, from_date=args.from_date,
+                               to_date=args.to_date, people_num=args.people_num, others=args.others)
+    load_tokenizer()
+    for version in args.versions:
+        template = get_template("travel_plan", version)
+        prompt = template.render(**params.model_dump())
+        total = count_tokens(prompt.text)
+        prefix = count_tokens(template.static_prefix)
+        print(f"  {template.key:16s} {f"~{total}":>7s} tokens  prefix {f"~{prefix}":>7s} ({prefix / total:.0%})  "
+              f"messages {len(prompt.messages)}")
+
+
+if __name__ == "__main__":
+    main()
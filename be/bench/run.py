@@ -0,0 +1,109 @@
+"""
+Offline benchmark: start the stand-ins and the app, drive load, print the report
+
+    python -m bench.run --requests 200 --concurrency 50 --json output/bench/report.json
+
+Everything runs on localhost; no API keys or network access are needed.
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from bench.load import print_report, run_load, write_report
+
+APP_PORT = 9100
+LLM_PORT = 9101
+MCP_PORT = 9102
+FLIGHT_PORT = 9103
+
+
+def bench_env(plan_cache: bool) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "DASHSCOPE_API_KEY": "bench",
+        "DASHSCOPE_BASE_URL": f"http://127.0.0.1:{LLM_PORT}/v1",
+        "VIS_MCP_HTTP_API_KEY": f"http://127.0.0.1:{MCP_PORT}/mcp",
+        "FLIGHT_API_URL": f"http://127.0.0.1:{FLIGHT_PORT}/v1/flights/search",
+        "RAPID_API_KEY": "bench",
+        "PLAN_CACHE_ENABLED": "true" if plan_cache else "false",
+        "LOG_LEVEL": "WARNING",
+        # 预热完成后才开始压测，避免把冷启动算进延迟
+        "STARTUP_WARM_UP": "blocking",
+        # 每次压测使用新的共享缓存，不受上一次运行留下的结果影响
+        "CACHE_SQLITE_PATH": os.path.join(tempfile.mkdtemp(prefix="dodo-bench-"), "cache.db"),
+    })
+    return env
+
+
+def wait_until_up(url: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--unique", type=int, default=1_000_000, help="number of distinct requests")
+    parser.add_argument("--no-flights", action="store_true")
+    parser.add_argument("--plan-cache", action="store_true", help="keep the plan cache enabled")
+    parser.add_argument("--ttft", type=float, default=0.5, help="fake LLM time to first token")
+    parser.add_argument("--token-rate", type=float, default=40, help="fake LLM tokens/s per stream")
+    parser.add_argument("--mcp-latency", type=float, default=0.8)
+    parser.add_argument("--flight-latency", type=float, default=0.6)
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    env = bench_env(args.plan_cache)
+    python = sys.executable
+    commands = [
+        [python, "-m", "bench.fake_llm", "--port", str(LLM_PORT),
+         "--ttft", str(args.ttft), "--token-rate", str(args.token_rate)],
+        [python, "-m", "bench.fake_mcp", "--port", str(MCP_PORT), "--latency", str(args.mcp_latency)],
+        [python, "-m", "bench.fake_flight", "--port", str(FLIGHT_PORT), "--latency", str(args.flight_latency)],
+    ]
+    processes = [subprocess.Popen(command, env=env) for command in commands]
+    try:
+        wait_until_up(f"http://127.0.0.1:{LLM_PORT}/docs")
+        wait_until_up(f"http://127.0.0.1:{FLIGHT_PORT}/docs")
+        wait_until_up(f"http://127.0.0.1:{MCP_PORT}/mcp")
+
+        # 应用最后启动，使 lifespan 中的 MCP 预热能连上假服务
+        app = subprocess.Popen(
+            [python, "-m", "uvicorn", "app.main:app", "--port", str(APP_PORT), "--log-level", "warning"],
+            env=env,
+        )
+        processes.append(app)
+        wait_until_up(f"http://127.0.0.1:{APP_PORT}/health")
+
+        report = asyncio.run(run_load(
+            f"http://127.0.0.1:{APP_PORT}", args.requests, args.concurrency, args.unique,
+            not args.no_flights, app.pid,
+        ))
+        print_report(report)
+        if args.json:
+            write_report(report, args.json)
+    finally:
+        # 先停应用，再停替身服务，让应用能正常关闭 MCP 会话
+        for process in reversed(processes):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Cold-start profile: `-X importtime` breakdown of `import app.main` and time until /health answers
+
+    python -m bench.startup --runs 5 --json output/bench/startup.json
+
+Track the JSON report across releases to catch import-time regressions.
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+from bench.load import write_report
+from bench.run import wait_until_up
+
+_IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+
+def profile_imports(module: str, env: dict) -> Dict:
+    """One fresh interpreter: total import time of `module` and self time per top-level package (µs)"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env, capture_output=True, text=True, check=True,
+    )
+    total = 0
+    packages: Dict[str, int] = defaultdict(int)
+    for line in result.stderr.splitlines():
+        match = _IMPORT_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, _, name = match.groups()
+        packages[name.split(".")[0]] += int(self_us)
+        if name == module:
+            total = int(cumulative_us)
+    return {"total_us": total, "packages": dict(packages)}
+
+
+def time_to_ready(port: int, env: dict) -> float:
+    """Seconds from spawning uvicorn until /health answers"""
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    try:
+        wait_until_up(f"http://127.0.0.1:{port}/health", timeout=120)
+        return time.perf_counter() - started
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def build_report(runs: List[Dict], ready: List[float], top: int) -> Dict:
+    packages: Dict[str, List[int]] = defaultdict(list)
+    for run in runs:
+        for name, self_us in run["packages"].items():
+            packages[name].append(self_us)
+    package_ms = {name: statistics.median(values) / 1000 for name, values in packages.items()}
+    top_packages = sorted(package_ms.items(), key=lambda item: item[1], reverse=True)[:top]
+
+    return {
+        "python": sys.version.split()[0],
+        "runs": len(runs),
+        "import_ms": statistics.median(run["total_us"] for run in runs) / 1000,
+        "ready_s": statistics.median(ready) if ready else None,
+        "top_packages_ms": dict(top_packages),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15, help="number of packages to list")
+    parser.add_argument("--no-serve", action="store_true", help="skip the time-to-ready measurement")
+    parser.add_argument("--port", type=int, default=9110)
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault("DASHSCOPE_API_KEY", "bench")
+    env.setdefault("PYTHONPATH", os.getcwd())
+
+    runs = [profile_imports(args.module, env) for _ in range(args.runs)]
+    ready = [] if args.no_serve else [time_to_ready(args.port, env) for _ in range(args.runs)]
+    report = build_report(runs, ready, args.top)
+
+    print(f"import {args.module}: {report['import_ms']:.0f}ms (median of {report['runs']}, python {report['python']})")
+    if report["ready_s"] is not None:
+        print(f"time to ready (/health): {report['ready_s']:.2f}s")
+    for name, ms in report["top_packages_ms"].items():
+        print(f"  {ms:8.1f}ms  {name}")
+    if args.json:
+        write_report(report, args.json)
+
+
+if __name__ == "__main__":
+    main()
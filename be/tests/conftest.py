@@ -0,0 +1,5 @@
+import os
+
+# app.config 在导入时读取环境变量：测试使用进程内缓存，不读写 output/cache 下的 sqlite 文件
+os.environ.setdefault("DASHSCOPE_API_KEY", "test")
+os.environ["CACHE_BACKEND"] = "memory"
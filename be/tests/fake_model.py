@@ -0,0 +1,45 @@
+"""A stand-in chat model for tests driving LangChainService"""
+import asyncio
+from typing import List, Optional
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+from app.models.http_entity import TravelPlanRequest
+
+
+def travel_request(**overrides) -> TravelPlanRequest:
+    fields = dict(from_place="上海", to_place="东京", from_date="2026-11-01", to_date="2026-11-05",
+                  people_num=2, others="")
+    fields.update(overrides)
+    return TravelPlanRequest(**fields)
+
+
+class FakeChatModel:
+    """
+    Streams `chunks` one message each, `delay` seconds apart
+
+    `finish_reason` is attached to the last chunk; `error` is raised after
+    the last chunk. `calls` counts astream / ainvoke calls.
+    """
+
+    def __init__(self, chunks: List[str], delay: float = 0, finish_reason: str = "stop",
+                 error: Optional[BaseException] = None):
+        self.chunks = chunks
+        self.delay = delay
+        self.finish_reason = finish_reason
+        self.error = error
+        self.calls = 0
+
+    async def astream(self, messages):
+        self.calls += 1
+        for i, text in enumerate(self.chunks):
+            await asyncio.sleep(self.delay)
+            last = i == len(self.chunks) - 1
+            yield AIMessageChunk(content=text, response_metadata={"finish_reason": self.finish_reason} if last else {})
+        if self.error is not None:
+            raise self.error
+
+    async def ainvoke(self, messages):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return AIMessage(content="".join(self.chunks), response_metadata={"finish_reason": self.finish_reason})
@@ -0,0 +1,54 @@
+"""Helpers for tests driving a StreamCoalescer"""
+import asyncio
+from typing import List
+
+
+def frame(text) -> str:
+    return f"data: {text}\n\n"
+
+
+def data(frames: List[str]) -> List[str]:
+    return [line[6:] for chunk in frames for line in chunk.splitlines() if line.startswith("data: ")]
+
+
+def event_id(chunk: str) -> str:
+    return next(line[4:] for line in chunk.splitlines() if line.startswith("id: "))
+
+
+class FakeUpstream:
+    """Yields `count` frames, then waits for `release` before the final [DONE]"""
+
+    def __init__(self, count: int = 3, hold: bool = False):
+        self.count = count
+        self.calls = 0
+        self.cancelled = False
+        self.release = asyncio.Event()
+        if not hold:
+            self.release.set()
+
+    async def stream(self):
+        self.calls += 1
+        try:
+            for i in range(self.count):
+                yield frame(i)
+                await asyncio.sleep(0)
+            await self.release.wait()
+            yield frame("[DONE]")
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+
+async def collect(stream) -> List[str]:
+    return [chunk async for chunk in stream]
+
+
+async def take(stream, n: int) -> List[str]:
+    frames = [await stream.__anext__() for _ in range(n)]
+    await stream.aclose()
+    return frames
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
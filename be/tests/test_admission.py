@@ -0,0 +1,252 @@
+import asyncio
+import time
+
+import pytest
+
+from app.services import admission, lang
+from app.services.admission import AdmissionController, CircuitBreaker, UpstreamBusy
+from app.services.lang import LangChainService, build_travel_plan_prompt
+from app.services.ratelimit import TokenBucket
+from tests.fake_model import FakeChatModel, travel_request
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(admission.time, "monotonic", lambda: now[0])
+    return now
+
+
+def controller(**overrides) -> AdmissionController:
+    limits = dict(max_concurrency=2, max_queue=2, queue_timeout=1, rate_per_second=0, burst=1,
+                  failure_threshold=2, reset_timeout=30)
+    limits.update(overrides)
+    return AdmissionController("test", **limits)
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert breaker.retry_after == 30
+
+
+def test_breaker_half_open_lets_one_trial_through(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+
+    clock[0] += 30
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+
+def test_breaker_failed_trial_reopens(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock[0] += 30
+    assert breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.retry_after == 30
+    assert not breaker.allow()
+
+
+def test_breaker_released_trial_can_be_retried(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock[0] += 30
+    assert breaker.allow()
+
+    breaker.release_trial()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+
+
+def test_breaker_disabled_without_threshold():
+    breaker = CircuitBreaker(failure_threshold=0, reset_timeout=30)
+    for _ in range(5):
+        breaker.record_failure()
+    assert breaker.allow()
+
+
+async def test_failures_open_the_circuit_and_reject_calls(clock):
+    upstream = controller(failure_threshold=2)
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            async with upstream.admit():
+                raise RuntimeError("upstream down")
+
+    assert upstream.breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(UpstreamBusy) as busy:
+        async with upstream.admit():
+            pass
+    assert busy.value.reason == "circuit_open"
+    assert busy.value.retry_after == 30
+    with pytest.raises(UpstreamBusy):
+        upstream.check()
+
+
+async def test_circuit_closes_after_a_successful_trial(clock):
+    upstream = controller(failure_threshold=1)
+    with pytest.raises(RuntimeError):
+        async with upstream.admit():
+            raise RuntimeError("upstream down")
+
+    clock[0] += 30
+    async with upstream.admit():
+        assert upstream.breaker.state == CircuitBreaker.HALF_OPEN
+    assert upstream.breaker.state == CircuitBreaker.CLOSED
+
+
+async def test_errors_that_are_not_upstream_failures_keep_the_circuit_closed():
+    upstream = controller(failure_threshold=1)
+    with pytest.raises(ValueError):
+        async with upstream.admit(is_failure=lambda e: not isinstance(e, ValueError)):
+            raise ValueError("bad request")
+    assert upstream.breaker.state == CircuitBreaker.CLOSED
+
+
+async def test_cancellation_is_not_a_failure():
+    upstream = controller(failure_threshold=1)
+
+    async def call():
+        async with upstream.admit():
+            await asyncio.sleep(10)
+
+    task = asyncio.create_task(call())
+    await asyncio.sleep(0)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert upstream.breaker.state == CircuitBreaker.CLOSED
+    assert upstream.in_flight == 0
+
+
+async def test_full_queue_is_rejected_without_waiting():
+    upstream = controller(max_concurrency=1, max_queue=0)
+    async with upstream.admit():
+        with pytest.raises(UpstreamBusy) as busy:
+            async with upstream.admit():
+                pass
+    assert busy.value.reason == "queue_full"
+
+
+async def test_waiting_longer_than_queue_timeout_is_rejected():
+    upstream = controller(max_concurrency=1, max_queue=1, queue_timeout=0.05)
+    async with upstream.admit():
+        started = time.monotonic()
+        with pytest.raises(UpstreamBusy) as busy:
+            async with upstream.admit():
+                pass
+        assert time.monotonic() - started >= 0.04
+    assert busy.value.reason == "queue_timeout"
+    assert upstream.waiting == 0
+
+
+async def test_waiters_get_a_slot_when_one_is_released():
+    upstream = controller(max_concurrency=1, max_queue=1)
+    order = []
+
+    async def call(name: str, hold: float):
+        async with upstream.admit():
+            order.append(name)
+            await asyncio.sleep(hold)
+
+    await asyncio.gather(call("first", 0.02), call("second", 0))
+    assert order == ["first", "second"]
+    assert upstream.in_flight == 0
+
+
+async def test_token_bucket_allows_a_burst_then_paces():
+    bucket = TokenBucket(rate=50, burst=2)
+    started = time.monotonic()
+    await bucket.acquire()
+    await bucket.acquire()
+    assert time.monotonic() - started < 0.01
+
+    await bucket.acquire()
+    await bucket.acquire()
+    assert time.monotonic() - started >= 0.035
+
+
+async def test_token_bucket_without_rate_never_waits():
+    bucket = TokenBucket(rate=0, burst=1)
+    started = time.monotonic()
+    for _ in range(100):
+        await bucket.acquire()
+    assert time.monotonic() - started < 0.05
+
+
+
+class TimelineChatModel(FakeChatModel):
+    """Records when the stream for each destination starts and ends"""
+
+    def __init__(self, chunks, timeline: list, **kwargs):
+        super().__init__(chunks, **kwargs)
+        self.timeline = timeline
+
+    async def astream(self, messages):
+        destination = "大阪" if "大阪" in str(messages) else "东京"
+        self.timeline.append(("plan_start", destination))
+        async for chunk in super().astream(messages):
+            yield chunk
+        self.timeline.append(("plan_end", destination))
+
+
+# 行程里只有一个 POI，地图走 agent 兜底
+ITINERARY_PLAN = ["## 📅 每日行程安排\n", "### Day 1\n", "- 游览外滩\n", "## 💰 预算\n", "约 3000 元\n"]
+
+
+async def test_map_agent_keeps_the_stream_llm_slot(monkeypatch):
+    timeline = []
+    agent_started = asyncio.Event()
+
+    async def map_agent(prompt, pin_map_calls=None):
+        destination = "大阪" if "大阪" in prompt else "东京"
+        timeline.append(("agent_start", destination))
+        agent_started.set()
+        await asyncio.sleep(0.1)
+        timeline.append(("agent_end", destination))
+        yield "<agent map>"
+
+    upstream = controller(max_concurrency=1, max_queue=4, queue_timeout=5)
+    monkeypatch.setattr(lang, "llm_admission", upstream)
+    monkeypatch.setattr(lang, "lang_graph_map_vis_chat", map_agent)
+    monkeypatch.setattr(lang, "poi_index", None)
+    monkeypatch.setattr(lang, "map_spec_cache", None)
+    monkeypatch.setattr(lang, "_record_summary", lambda *args: None)
+    monkeypatch.setattr(lang.PlanCacheConfig, "enabled", False)
+    model = TimelineChatModel(ITINERARY_PLAN, timeline)
+    monkeypatch.setattr(LangChainService, "model", property(lambda self: model))
+    service = LangChainService()
+
+    async def chat(params):
+        return [frame async for frame in service.streaming_chat(params, build_travel_plan_prompt(params))]
+
+    first = asyncio.create_task(chat(travel_request()))
+    await asyncio.wait_for(agent_started.wait(), 1)
+    second = asyncio.create_task(chat(travel_request(to_place="大阪")))
+    first_frames, second_frames = await asyncio.gather(first, second)
+
+    # 名额上限为 1：第一个请求的地图 agent 结束前，第二个请求拿不到名额
+    assert timeline.index(("plan_end", "东京")) < timeline.index(("agent_end", "东京")) \
+        < timeline.index(("plan_start", "大阪"))
+    for frames in (first_frames, second_frames):
+        assert any("<agent map>" in frame for frame in frames)
+        assert frames[-1].endswith("data: [DONE]\n\n")
+    assert upstream.in_flight == 0
@@ -0,0 +1,150 @@
+import asyncio
+import os
+import sys
+import types
+from contextlib import asynccontextmanager
+
+import pytest
+
+from app.config import AiqConfig
+from app.services import aiq
+from app.services.aiq import WorkflowRegistry, run_workflow, run_workflow_stream
+
+
+class FakeRunner:
+    def __init__(self, workflow, input_str):
+        self.workflow = workflow
+        self.input_str = input_str
+
+    async def result(self, to_type=str):
+        await self.workflow.hold.wait()
+        return f"{self.workflow.label}:{self.input_str}"
+
+    async def result_stream(self, to_type=str):
+        if not self.workflow.streaming:
+            raise ValueError("Workflow does not support streaming output")
+        for part in ("a", "b"):
+            yield part
+
+
+class FakeWorkflow:
+    def __init__(self, label: str, streaming: bool):
+        self.label = label
+        self.streaming = streaming
+        self.closed = False
+        self.hold = asyncio.Event()
+        self.hold.set()
+
+    @asynccontextmanager
+    async def run(self, input_str):
+        yield FakeRunner(self, input_str)
+
+
+@pytest.fixture
+def loader(monkeypatch):
+    """Fake nat.runtime.loader; the workflow label is the config file content"""
+    loaded = []
+
+    @asynccontextmanager
+    async def load_workflow(config_file):
+        with open(config_file) as f:
+            workflow = FakeWorkflow(f.read(), streaming=loader_state["streaming"])
+        loaded.append(workflow)
+        try:
+            yield workflow
+        finally:
+            workflow.closed = True
+
+    loader_state = {"streaming": True}
+    module = types.ModuleType("nat.runtime.loader")
+    module.load_workflow = load_workflow
+    monkeypatch.setitem(sys.modules, "nat", types.ModuleType("nat"))
+    monkeypatch.setitem(sys.modules, "nat.runtime", types.ModuleType("nat.runtime"))
+    monkeypatch.setitem(sys.modules, "nat.runtime.loader", module)
+    return loaded, loader_state
+
+
+@pytest.fixture
+def config_file(tmp_path):
+    path = tmp_path / "workflow.yml"
+    path.write_text("v1")
+    return path
+
+
+@pytest.fixture
+async def registry(monkeypatch):
+    registry = WorkflowRegistry(max_concurrency=2)
+    monkeypatch.setattr(aiq, "workflow_registry", registry)
+    yield registry
+    await registry.aclose()
+
+
+def bump(path, content: str):
+    path.write_text(content)
+    stat = path.stat()
+    # 保证 mtime 变化，不依赖文件系统的时间精度
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+async def test_workflow_is_loaded_once(loader, config_file, registry):
+    loaded, _ = loader
+    assert await run_workflow(config_file, "q1") == "v1:q1"
+    assert await run_workflow(str(config_file), "q2") == "v1:q2"
+    assert len(loaded) == 1
+
+
+async def test_changed_config_is_reloaded(loader, config_file, registry):
+    loaded, _ = loader
+    await run_workflow(config_file, "q")
+    bump(config_file, "v2")
+
+    assert await run_workflow(config_file, "q") == "v2:q"
+    assert len(loaded) == 2
+    assert loaded[0].closed and not loaded[1].closed
+
+
+async def test_old_workflow_closes_after_its_runs_finish(loader, config_file, registry):
+    loaded, _ = loader
+    await registry.get(config_file)
+    loaded[0].hold.clear()
+    running = asyncio.create_task(run_workflow(config_file, "slow"))
+    await asyncio.sleep(0.01)
+
+    bump(config_file, "v2")
+    assert await run_workflow(config_file, "q") == "v2:q"
+    assert not loaded[0].closed
+
+    loaded[0].hold.set()
+    assert await running == "v1:slow"
+    await asyncio.sleep(0.01)
+    assert loaded[0].closed
+
+
+async def test_concurrent_runs_are_bounded(loader, config_file, monkeypatch):
+    loaded, _ = loader
+    registry = WorkflowRegistry(max_concurrency=1)
+    monkeypatch.setattr(aiq, "workflow_registry", registry)
+    await registry.get(config_file)
+    loaded[0].hold.clear()
+
+    first = asyncio.create_task(run_workflow(config_file, "1"))
+    second = asyncio.create_task(run_workflow(config_file, "2"))
+    await asyncio.sleep(0.01)
+    assert registry._entries[os.path.abspath(config_file)].active == 1
+
+    loaded[0].hold.set()
+    assert await asyncio.gather(first, second) == ["v1:1", "v1:2"]
+    await registry.aclose()
+
+
+async def test_stream_falls_back_to_chunked_result(loader, config_file, registry, monkeypatch):
+    _, state = loader
+    state["streaming"] = False
+    monkeypatch.setattr(AiqConfig, "fallback_chunk_chars", 2)
+
+    chunks = [chunk async for chunk in run_workflow_stream(config_file, "xyz")]
+    assert chunks == ["v1", ":x", "yz"]
+
+
+async def test_stream_yields_workflow_chunks(loader, config_file, registry):
+    assert [chunk async for chunk in run_workflow_stream(config_file, "q")] == ["a", "b"]
@@ -0,0 +1,138 @@
+import json
+
+import pytest
+
+from app import batch as batch_cli
+from app.config import BatchConfig
+from app.services import batch
+from app.services.admission import UpstreamBusy
+from app.services.batch import BatchStatus, dedupe_requests, run_batch
+from app.services.plan_cache import CachedPlan, plan_cache_key
+from tests.fake_model import travel_request
+
+
+@pytest.fixture
+def generate(monkeypatch):
+    """Fake generate_plan; `failures[to_place]` lists exceptions to raise before succeeding"""
+    calls = []
+    failures = {}
+
+    async def generate_plan(params, with_map=True):
+        calls.append(params.to_place)
+        pending = failures.get(params.to_place)
+        if pending:
+            raise pending.pop(0)
+        return CachedPlan(plan=f"plan for {params.to_place}", map_vis=["<map>"] if with_map else []), False
+
+    monkeypatch.setattr(batch.lang_chain_service, "generate_plan", generate_plan)
+    monkeypatch.setattr(BatchConfig, "backoff_base", 0)
+    return calls, failures
+
+
+async def collect(*args, **kwargs):
+    return [record async for record in run_batch(*args, **kwargs)]
+
+
+def test_dedupe_merges_equivalent_requests():
+    requests = [travel_request(), travel_request(to_place="大阪"), travel_request(from_place=" 上海 ", others="")]
+    items = dedupe_requests(requests)
+
+    assert [item.indexes for item in items] == [[0, 2], [1]]
+    assert items[0].key == plan_cache_key(requests[0])
+
+
+async def test_each_unique_request_is_generated_once(generate):
+    calls, _ = generate
+    records = await collect([travel_request(), travel_request(), travel_request(to_place="大阪")], concurrency=2)
+
+    assert sorted(calls) == ["东京", "大阪"]
+    assert {record["status"] for record in records} == {BatchStatus.OK}
+    assert sorted(record["indexes"] for record in records) == [[0, 1], [2]]
+
+
+async def test_done_keys_are_skipped(generate):
+    calls, _ = generate
+    done = {plan_cache_key(travel_request())}
+    records = await collect([travel_request(), travel_request(to_place="大阪")], done_keys=done)
+
+    assert calls == ["大阪"]
+    assert len(records) == 1
+
+
+async def test_failed_attempts_are_retried(generate):
+    calls, failures = generate
+    failures["东京"] = [RuntimeError("model error")]
+    [record] = await collect([travel_request()], max_retries=2)
+
+    assert record["status"] == BatchStatus.OK
+    assert record["attempts"] == 2
+
+
+async def test_item_fails_after_max_retries(generate, monkeypatch):
+    calls, failures = generate
+    monkeypatch.setattr(BatchConfig, "backoff_max", 0)
+    failures["东京"] = [UpstreamBusy("llm", "circuit_open", 30)] * 3
+    [record] = await collect([travel_request()], max_retries=1)
+
+    assert record["status"] == BatchStatus.FAILED
+    assert record["attempts"] == 2
+    assert "circuit_open" in record["error"]
+
+
+async def test_unexpected_item_error_does_not_stall_the_batch(generate, monkeypatch):
+    original = batch._run_item
+
+    async def run_item(item, *args):
+        if item.params.to_place == "大阪":
+            raise KeyError("broken")
+        return await original(item, *args)
+
+    monkeypatch.setattr(batch, "_run_item", run_item)
+    records = await collect([travel_request(), travel_request(to_place="大阪")], concurrency=1)
+
+    by_place = {record["request"]["to_place"]: record for record in records}
+    assert by_place["东京"]["status"] == BatchStatus.OK
+    assert by_place["大阪"]["status"] == BatchStatus.FAILED
+
+
+async def test_city_codes_are_resolved_only_with_flights(generate, monkeypatch):
+    resolved = []
+
+    async def get_city_codes(names):
+        names = list(names)
+        resolved.append(names)
+        return {name: None for name in names}
+
+    monkeypatch.setattr(batch, "get_city_codes", get_city_codes)
+    [record] = await collect([travel_request()])
+    assert resolved == []
+    assert "from_code" not in record
+
+    [record] = await collect([travel_request()], with_flights=True)
+    assert resolved == [["上海", "东京"]]
+    assert record["flights"] is None
+
+
+def test_read_requests_accepts_json_and_json_lines(tmp_path):
+    rows = [travel_request().model_dump(), travel_request(to_place="大阪").model_dump()]
+    array = tmp_path / "requests.json"
+    array.write_text(json.dumps(rows, ensure_ascii=False), encoding="utf-8")
+    lines = tmp_path / "requests.jsonl"
+    lines.write_text("\n".join(json.dumps(row, ensure_ascii=False) for row in rows) + "\n\n", encoding="utf-8")
+
+    assert batch_cli.read_requests(str(array)) == batch_cli.read_requests(str(lines))
+    assert [params.to_place for params in batch_cli.read_requests(str(lines))] == ["东京", "大阪"]
+
+
+def test_resume_reads_successful_keys_and_ignores_a_partial_line(tmp_path):
+    output = tmp_path / "plans.jsonl"
+    output.write_text(
+        json.dumps({"key": "a", "status": BatchStatus.OK}) + "\n"
+        + json.dumps({"key": "b", "status": BatchStatus.FAILED}) + "\n"
+        + '{"key": "c", "stat',
+        encoding="utf-8",
+    )
+
+    assert batch_cli.read_done_keys(str(output)) == {"a"}
+    assert batch_cli.read_done_keys(str(tmp_path / "missing.jsonl")) == set()
+    assert not batch_cli._ends_with_newline(str(output))
@@ -0,0 +1,192 @@
+import asyncio
+
+import pytest
+
+from app.config import StreamBudgetConfig
+from app.services import budget as budget_module
+from app.services import lang
+from app.services.budget import BudgetStats, StreamBudget, stream_until_disconnected
+from app.services.lang import LangChainService, MapVis, build_travel_plan_prompt
+from app.services.plan_cache import PlanCache, plan_cache_key
+from tests.fake_model import FakeChatModel, travel_request
+
+PLAN = ["## 📅 每日行程安排\n", "### Day 1\n", "- 游览外滩\n", "## 💰 预算\n"]
+
+
+@pytest.fixture(autouse=True)
+def stats(monkeypatch):
+    stats = BudgetStats()
+    monkeypatch.setattr(budget_module, "budget_stats", stats)
+    monkeypatch.setattr(lang, "budget_stats", stats)
+    return stats
+
+
+@pytest.fixture
+def plan_cache(monkeypatch):
+    cache = PlanCache(ttl=60, max_memory_chars=1_000_000)
+    monkeypatch.setattr(lang, "plan_cache", cache)
+    return cache
+
+
+@pytest.fixture
+def summaries(monkeypatch):
+    """Budgets of finished streams, as passed to the per-request summary"""
+    budgets = []
+    monkeypatch.setattr(lang, "_record_summary", lambda params, prompt, budget, *args: budgets.append(budget))
+    return budgets
+
+
+@pytest.fixture
+def service(monkeypatch, plan_cache, summaries):
+    async def map_vis_chat(plan, destination, pois=None, llm_admitted=False):
+        return MapVis(["<map>"])
+
+    monkeypatch.setattr(lang, "map_vis_chat", map_vis_chat)
+
+    def with_model(model: FakeChatModel) -> LangChainService:
+        monkeypatch.setattr(LangChainService, "model", property(lambda self: model))
+        return LangChainService()
+
+    return with_model
+
+
+async def run_chat(service: LangChainService):
+    params = travel_request()
+    return [frame async for frame in service.streaming_chat(params, build_travel_plan_prompt(params))]
+
+
+def test_consume_reports_when_the_budget_is_used_up():
+    budget = StreamBudget(max_seconds=10, max_output_tokens=3)
+    assert budget.consume() and budget.consume()
+    assert not budget.consume()
+    assert budget.output_tokens == 3
+    assert budget.ttft is not None
+
+
+def test_cancelled_stream_counts_an_upper_bound_of_saved_tokens(stats):
+    budget = StreamBudget(max_seconds=10, max_output_tokens=100)
+    budget.consume(40)
+    budget.record_cancelled()
+    assert budget.status == "cancelled"
+    assert stats.cancelled == 1
+    assert stats.tokens_saved_upper_bound == 60
+
+    # 文本已经生成完，地图阶段被取消不再节省输出 token
+    done = StreamBudget(max_seconds=10, max_output_tokens=100)
+    done.mark_chat_done()
+    done.record_cancelled()
+    assert stats.tokens_saved_upper_bound == 60
+
+
+async def test_complete_plan_is_cached(service, plan_cache, summaries):
+    frames = await run_chat(service(FakeChatModel(PLAN)))
+
+    assert frames[-1].endswith("data: [DONE]\n\n")
+    assert any("<map>" in frame for frame in frames)
+    assert summaries[0].status == "ok"
+    assert await plan_cache.get(plan_cache_key(travel_request())) is not None
+
+
+async def test_output_budget_truncates_and_skips_the_cache(service, plan_cache, summaries, stats, monkeypatch):
+    monkeypatch.setattr(StreamBudgetConfig, "max_output_tokens", 2)
+    model = FakeChatModel(PLAN)
+    frames = await run_chat(service(model))
+
+    assert "外滩" not in "".join(frames)
+    assert frames[-1].endswith("data: [DONE]\n\n")
+    assert summaries[0].status == "truncated"
+    assert stats.truncated == 1
+    assert await plan_cache.get(plan_cache_key(travel_request())) is None
+
+
+async def test_plan_cut_off_by_max_tokens_is_not_cached(service, plan_cache, summaries):
+    await run_chat(service(FakeChatModel(PLAN, finish_reason="length")))
+
+    assert summaries[0].status == "truncated"
+    assert await plan_cache.get(plan_cache_key(travel_request())) is None
+
+
+async def test_wall_clock_budget_ends_the_stream(service, summaries, stats, monkeypatch):
+    monkeypatch.setattr(StreamBudgetConfig, "max_seconds", 0.05)
+    frames = await run_chat(service(FakeChatModel(PLAN, delay=0.03)))
+
+    assert frames[-1] == "data: [ERROR] 生成超时，请稍后重试\n\n"
+    assert summaries[0].status == "timeout"
+    assert stats.timeouts == 1
+
+
+async def test_upstream_timeout_is_reported_as_an_error(service, summaries, stats):
+    frames = await run_chat(service(FakeChatModel(PLAN, error=TimeoutError())))
+
+    assert frames[-1] == "data: [ERROR] 上游服务响应超时，请稍后重试\n\n"
+    assert summaries[0].status == "error"
+    assert stats.timeouts == 0
+
+
+async def test_cancelled_stream_is_recorded(service, summaries, stats):
+    params = travel_request()
+    stream = service(FakeChatModel(PLAN, delay=0.05)).streaming_chat(params, build_travel_plan_prompt(params))
+    task = asyncio.create_task(stream.__anext__())
+    await asyncio.sleep(0.01)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    await stream.aclose()
+
+    assert summaries[0].status == "cancelled"
+    assert stats.cancelled == 1
+
+
+class FakeRequest:
+    """ASGI request whose client disconnects when `disconnect` is set"""
+
+    def __init__(self):
+        self.disconnect = asyncio.Event()
+
+    async def receive(self):
+        await self.disconnect.wait()
+        return {"type": "http.disconnect"}
+
+
+async def test_disconnect_closes_the_upstream_stream():
+    closed = asyncio.Event()
+
+    async def upstream():
+        try:
+            yield "data: first\n\n"
+            await asyncio.sleep(60)
+            yield "data: never\n\n"
+        finally:
+            closed.set()
+
+    request = FakeRequest()
+    received = []
+
+    async def respond():
+        async for chunk in stream_until_disconnected(request, upstream()):
+            received.append(chunk)
+
+    response = asyncio.create_task(respond())
+    await asyncio.sleep(0.01)
+    request.disconnect.set()
+    # 响应任务正常结束，不向上抛出 CancelledError
+    await asyncio.wait_for(response, 1)
+
+    assert received == ["data: first\n\n"]
+    assert closed.is_set()
+
+
+async def test_cancellation_from_elsewhere_is_not_swallowed():
+    async def upstream():
+        yield "data: first\n\n"
+        await asyncio.sleep(60)
+
+    async def respond():
+        async for _ in stream_until_disconnected(FakeRequest(), upstream()):
+            pass
+
+    response = asyncio.create_task(respond())
+    await asyncio.sleep(0.01)
+    response.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await response
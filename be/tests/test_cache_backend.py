@@ -0,0 +1,147 @@
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+from app.config import CacheConfig
+from app.services.cache_backend import MISSING, MemoryCacheBackend, RedisCacheBackend, SqliteCacheBackend
+from bench.fake_redis import FakeRedis
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+async def backend(request, tmp_path):
+    server = None
+    if request.param == "memory":
+        backend = MemoryCacheBackend("test", 100)
+    elif request.param == "sqlite":
+        backend = SqliteCacheBackend("test", 100, str(tmp_path / "cache.db"))
+    else:
+        pytest.importorskip("redis")
+        server = await asyncio.start_server(FakeRedis().handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        backend = RedisCacheBackend("test", 100, f"redis://127.0.0.1:{port}/0", 4)
+    yield backend
+    await backend.aclose()
+    if server is not None:
+        server.close()
+        await server.wait_closed()
+
+
+async def test_set_get_delete(backend):
+    assert await backend.get("k") is MISSING
+    await backend.set("k", {"a": [1, "二"]}, 60)
+    assert await backend.get("k") == {"a": [1, "二"]}
+    await backend.delete("k")
+    assert await backend.get("k") is MISSING
+
+
+async def test_get_or_compute_runs_once_for_concurrent_callers(backend):
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "value"
+
+    results = await asyncio.gather(*(backend.get_or_compute("k", compute, ttl=60) for _ in range(5)))
+
+    assert results == ["value"] * 5
+    assert len(calls) == 1
+    assert await backend.get("k") == "value"
+
+
+async def test_get_or_compute_does_not_cache_failures_or_zero_ttl(backend):
+    async def fail():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        await backend.get_or_compute("k", fail, ttl=60)
+    assert await backend.get("k") is MISSING
+
+    async def nothing():
+        return None
+
+    assert await backend.get_or_compute("k", nothing, ttl=lambda value: 60 if value else None) is None
+    assert await backend.get("k") is MISSING
+
+
+async def test_expired_entries_are_misses(backend):
+    await backend.set("k", "v", 0.05)
+    await asyncio.sleep(0.1)
+    assert await backend.get("k") is MISSING
+
+
+async def test_memory_backend_evicts_least_recently_used():
+    backend = MemoryCacheBackend("test", 2)
+    await backend.set("a", "a", 60)
+    await backend.set("b", "b", 60)
+    assert await backend.get("a") == "a"
+    await backend.set("c", "c", 60)
+
+    assert await backend.get("b") is MISSING
+    assert await backend.get("a") == "a"
+    assert await backend.get("c") == "c"
+
+
+async def test_sqlite_backend_evicts_least_recently_used(tmp_path, monkeypatch):
+    monkeypatch.setattr(CacheConfig, "sqlite_evict_every", 1)
+    backend = SqliteCacheBackend("test", 2, str(tmp_path / "cache.db"))
+    try:
+        # 最早过期的 a 最近被读过，应淘汰的是 b
+        await backend.set("a", "a", 60)
+        await backend.set("b", "b", 600)
+        assert await backend.get("a") == "a"
+        await backend.set("c", "c", 600)
+
+        assert await backend.get("b") is MISSING
+        assert await backend.get("a") == "a"
+        assert await backend.get("c") == "c"
+    finally:
+        await backend.aclose()
+
+
+async def test_sqlite_backend_upgrades_old_schema(tmp_path):
+    path = str(tmp_path / "cache.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE cache (namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+                 "expires_at REAL NOT NULL, PRIMARY KEY (namespace, key))")
+    conn.execute("INSERT INTO cache VALUES ('test', 'old', '\"v\"', ?)", (time.time() + 60,))
+    conn.commit()
+    conn.close()
+
+    backend = SqliteCacheBackend("test", 100, path)
+    try:
+        assert await backend.get("old") == "v"
+        await backend.set("new", "n", 60)
+        assert await backend.get("new") == "n"
+    finally:
+        await backend.aclose()
+
+
+async def test_sqlite_backends_share_entries_and_leases(tmp_path):
+    path = str(tmp_path / "cache.db")
+    first, second = SqliteCacheBackend("test", 100, path), SqliteCacheBackend("test", 100, path)
+    try:
+        await first.set("k", "v", 60)
+        assert await second.get("k") == "v"
+
+        owner = await first._try_lease("lease")
+        assert owner
+        assert await second._try_lease("lease") is None
+        await first._release_lease("lease", owner)
+        assert await second._try_lease("lease")
+    finally:
+        await first.aclose()
+        await second.aclose()
+
+
+async def test_redis_backend_treats_an_unreachable_server_as_a_miss():
+    pytest.importorskip("redis")
+    backend = RedisCacheBackend("test", 100, "redis://127.0.0.1:1/0", 4)
+    try:
+        assert await backend.get("k") is MISSING
+        assert backend._unavailable_until > time.monotonic()
+        await backend.set("k", "v", 60)
+    finally:
+        await backend.aclose()
@@ -0,0 +1,130 @@
+import pytest
+
+from app.config import CityCodeConfig
+from app.services import city
+from app.services.cache_backend import MISSING, MemoryCacheBackend
+from app.services.city import get_city_code, get_city_codes, lookup_city_code, normalize_city_name
+
+
+@pytest.fixture(autouse=True)
+def cache(monkeypatch):
+    backend = MemoryCacheBackend("city-test", 100)
+    monkeypatch.setattr(city, "city_code_cache", backend)
+    return backend
+
+
+@pytest.fixture
+def model(monkeypatch):
+    """Stand-in for the LLM fallback: name -> code, records every call"""
+    calls = []
+    answers = {}
+
+    async def extract_one(city_name):
+        calls.append([city_name])
+        if isinstance(answers.get(city_name), Exception):
+            raise answers[city_name]
+        return answers.get(city_name)
+
+    async def extract_many(city_names):
+        calls.append(list(city_names))
+        return {name: answers.get(name) for name in city_names}
+
+    monkeypatch.setattr(city, "_extract_city_code_with_llm", extract_one)
+    monkeypatch.setattr(city, "_extract_city_codes_with_llm", extract_many)
+    return answers, calls
+
+
+@pytest.mark.parametrize("name, key", [
+    ("上海市", "上海"),
+    ("New York City", "newyork"),
+    ("Xi'an", "xian"),
+    ("ＴＯＫＹＯ", "tokyo"),
+    ("香港特别行政区", "香港"),
+    ("市", "市"),
+])
+def test_normalize_city_name(name, key):
+    assert normalize_city_name(name) == key
+
+
+@pytest.mark.parametrize("name, code", [
+    ("上海", "SHA"),
+    ("上海市", "SHA"),
+    ("shang hai", "SHA"),
+    ("魔都", "SHA"),
+    ("Beijing", "BJS"),
+    ("sha", "SHA"),
+    ("亚特兰蒂斯", None),
+])
+def test_lookup_city_code(name, code):
+    assert lookup_city_code(name) == code
+
+
+async def test_local_names_never_call_the_model(model):
+    answers, calls = model
+    assert await get_city_code("北京市") == "BJS"
+    assert await get_city_code("") is None
+    assert calls == []
+
+
+async def test_model_result_is_cached(model, cache):
+    answers, calls = model
+    answers["小镇A"] = "AAA"
+
+    assert await get_city_code("小镇A") == "AAA"
+    assert await get_city_code("小镇a") == "AAA"
+    assert calls == [["小镇A"]]
+
+
+async def test_unknown_names_are_negatively_cached(model, cache, monkeypatch):
+    answers, calls = model
+    ttls = []
+    original_set = cache.set
+
+    async def set_with_ttl(key, value, ttl):
+        ttls.append(ttl)
+        await original_set(key, value, ttl)
+
+    monkeypatch.setattr(cache, "set", set_with_ttl)
+
+    assert await get_city_code("亚特兰蒂斯") is None
+    assert await get_city_code("亚特兰蒂斯") is None
+    assert calls == [["亚特兰蒂斯"]]
+    assert await cache.get("亚特兰蒂斯") is None
+    assert ttls == [CityCodeConfig.negative_ttl]
+
+
+async def test_model_errors_are_not_cached(model, cache):
+    answers, calls = model
+    answers["小镇B"] = RuntimeError("model unavailable")
+
+    assert await get_city_code("小镇B") is None
+    assert await cache.get("小镇b") is MISSING
+
+    answers["小镇B"] = "BBB"
+    assert await get_city_code("小镇B") == "BBB"
+    assert len(calls) == 2
+
+
+async def test_batch_resolves_each_unknown_name_once(model, cache, monkeypatch):
+    answers, calls = model
+    answers.update({"小镇C": "CCC", "小镇D": None})
+    monkeypatch.setattr(CityCodeConfig, "batch_size", 1)
+    await cache.set("小镇e", "EEE", 60)
+
+    codes = await get_city_codes(["上海", "小镇C", "小镇c", "小镇D", "小镇E", "小镇C"])
+
+    assert codes == {"上海": "SHA", "小镇C": "CCC", "小镇c": "CCC", "小镇D": None, "小镇E": "EEE"}
+    assert calls == [["小镇C"], ["小镇D"]]
+    assert await cache.get("小镇d") is None
+
+
+async def test_batch_names_missing_from_the_answer_are_retried(model, cache, monkeypatch):
+    answers, calls = model
+
+    async def forgetful(city_names):
+        calls.append(list(city_names))
+        return {}
+
+    monkeypatch.setattr(city, "_extract_city_codes_with_llm", forgetful)
+    assert await get_city_codes(["小镇F"]) == {"小镇F": None}
+    assert await cache.get("小镇f") is MISSING
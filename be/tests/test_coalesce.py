@@ -0,0 +1,62 @@
+import asyncio
+
+from app.services.coalesce import StreamCoalescer, parse_event_id, split_frames
+from tests.streams import FakeUpstream, collect, data, event_id, frame, settle, take
+
+
+def test_split_frames():
+    assert split_frames("data: a\n\ndata: b\n\n") == ["data: a\n\n", "data: b\n\n"]
+    assert split_frames("data: a\n\ndata: b") == ["data: a\n\n", "data: b"]
+    assert split_frames("") == []
+
+
+async def test_identical_requests_share_one_upstream():
+    coalescer = StreamCoalescer("test")
+    upstream = FakeUpstream()
+
+    first, second = await asyncio.gather(
+        collect(coalescer.subscribe("k", upstream.stream)),
+        collect(coalescer.subscribe("k", upstream.stream)),
+    )
+
+    assert upstream.calls == 1
+    assert data(first) == data(second) == ["0", "1", "2", "[DONE]"]
+    assert [event_id(chunk) for chunk in first] == [event_id(chunk) for chunk in second]
+    assert not coalescer.is_streaming("k")
+
+
+async def test_upstream_is_cancelled_when_the_last_subscriber_leaves():
+    coalescer = StreamCoalescer("test", retain_ttl=60, retain_max_chars=10_000)
+    upstream = FakeUpstream(hold=True)
+
+    received = await take(coalescer.subscribe("k", upstream.stream), 1)
+    await settle()
+
+    assert upstream.cancelled
+    assert not coalescer.is_streaming("k")
+    # 被取消的生成不保留
+    assert not coalescer.can_resume("k", event_id(received[0]))
+
+
+async def test_request_right_after_cancel_gets_a_complete_new_stream():
+    coalescer = StreamCoalescer("test")
+    cancelled = FakeUpstream(hold=True)
+    received = await take(coalescer.subscribe("k", cancelled.stream), 1)
+
+    # 取消已经发出但还没有生效时到来的相同请求
+    fresh = FakeUpstream()
+    frames = await collect(coalescer.subscribe("k", fresh.stream))
+
+    assert fresh.calls == 1
+    assert data(frames) == ["0", "1", "2", "[DONE]"]
+    assert parse_event_id(event_id(frames[0]))[0] != parse_event_id(event_id(received[0]))[0]
+
+
+async def test_upstream_error_becomes_an_error_frame():
+    async def failing():
+        yield frame("0")
+        raise RuntimeError("boom")
+
+    frames = await collect(StreamCoalescer("test").subscribe("k", failing))
+
+    assert data(frames) == ["0", "[ERROR] boom"]
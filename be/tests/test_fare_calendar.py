@@ -0,0 +1,112 @@
+import asyncio
+import json
+from datetime import date
+
+import httpx
+import pytest
+
+from app.config import FareCalendarConfig
+from app.models.flight_entity import FlightSearchResult
+from app.services import fare_calendar
+from app.services.fare_calendar import build_fare_matrix, date_window, fare_calendar_stream
+from tests.fake_model import travel_request
+
+DEPART = date(2030, 5, 10)
+RETURN = date(2030, 5, 12)
+
+
+@pytest.fixture
+def searches(monkeypatch):
+    """Price = 1000 + 10 * depart day + return day; `failing` holds (depart, return) pairs that fail"""
+    calls = []
+    failing = set()
+
+    async def get_city_code(name):
+        return {"上海": "SHA", "东京": "TYO"}.get(name)
+
+    async def search(from_code, to_code, depart, ret, adults, page_number):
+        calls.append((depart, ret))
+        await asyncio.sleep(0)
+        if (depart, ret) in failing:
+            raise httpx.ConnectError("connection refused")
+        price = 1000 + 10 * date.fromisoformat(depart).day + date.fromisoformat(ret).day
+        return FlightSearchResult(min_price=price, currency="CNY")
+
+    monkeypatch.setattr(fare_calendar, "get_city_code", get_city_code)
+    monkeypatch.setattr(fare_calendar.flight_search_cache, "search", search)
+    monkeypatch.setattr(fare_calendar, "_search_slots", asyncio.Semaphore(2))
+    return calls, failing
+
+
+def events(frames):
+    parsed = []
+    for frame in frames:
+        body = frame[len("data: "):].strip()
+        parsed.append(body if body.startswith("[") else json.loads(body))
+    return parsed
+
+
+def test_date_window():
+    assert date_window(date(2030, 1, 1), 1) == [date(2029, 12, 31), date(2030, 1, 1), date(2030, 1, 2)]
+    assert date_window(date(2030, 1, 1), 0) == [date(2030, 1, 1)]
+
+
+def test_matrix_marks_missing_prices_and_finds_the_cheapest():
+    departs = [date(2030, 1, 1), date(2030, 1, 2)]
+    returns = [date(2030, 1, 1), date(2030, 1, 3)]
+    rows = [
+        {"depart_date": "2030-01-02", "cells": [{"return_date": "2030-01-03", "price": 900, "currency": "CNY"}]},
+        {"depart_date": "2030-01-01", "cells": [
+            {"return_date": "2030-01-01", "price": 1200, "currency": "CNY"},
+            {"return_date": "2030-01-03", "price": None, "currency": None, "error": "timeout"},
+        ]},
+    ]
+
+    matrix = build_fare_matrix(rows, departs, returns)
+
+    assert matrix["prices"] == [[1200, None], [None, 900]]
+    assert matrix["cheapest"] == {"depart_date": "2030-01-02", "return_date": "2030-01-03",
+                                  "price": 900, "currency": "CNY"}
+
+
+async def test_stream_sends_a_row_per_departure_then_the_matrix(searches):
+    calls, _ = searches
+    params = travel_request(from_date=DEPART.isoformat(), to_date=RETURN.isoformat())
+    parsed = events([frame async for frame in fare_calendar_stream(params, days=1)])
+
+    rows = [event["fare_row"] for event in parsed if isinstance(event, dict) and "fare_row" in event]
+    matrix = parsed[-2]["fare_matrix"]
+    assert parsed[-1] == "[DONE]"
+    assert sorted(row["depart_date"] for row in rows) == ["2030-05-09", "2030-05-10", "2030-05-11"]
+    # 返程早于出发的组合不搜索
+    assert len(calls) == 9
+    assert matrix["cheapest"] == {"depart_date": "2030-05-09", "return_date": "2030-05-11",
+                                  "price": 1101, "currency": "CNY"}
+    assert matrix["prices"][0] == [1101, 1102, 1103]
+
+
+async def test_failed_searches_leave_empty_cells(searches):
+    calls, failing = searches
+    failing.add(("2030-05-10", "2030-05-12"))
+    params = travel_request(from_date=DEPART.isoformat(), to_date=RETURN.isoformat())
+    parsed = events([frame async for frame in fare_calendar_stream(params, days=0)])
+
+    assert parsed[0]["fare_row"]["cells"][0]["error"]
+    assert parsed[1]["fare_matrix"]["prices"] == [[None]]
+    assert parsed[1]["fare_matrix"]["cheapest"] is None
+
+
+async def test_window_is_clamped_to_max_days(searches, monkeypatch):
+    calls, _ = searches
+    monkeypatch.setattr(FareCalendarConfig, "max_days", 0)
+    params = travel_request(from_date=DEPART.isoformat(), to_date=RETURN.isoformat())
+    [frame async for frame in fare_calendar_stream(params, days=3)]
+    assert calls == [("2030-05-10", "2030-05-12")]
+
+
+async def test_invalid_input_is_reported(searches):
+    bad_date = travel_request(from_date="next week")
+    assert [frame async for frame in fare_calendar_stream(bad_date, 1)] == ["data: [ERROR] Invalid date\n\n"]
+
+    bad_city = travel_request(to_place="亚特兰蒂斯", from_date=DEPART.isoformat(), to_date=RETURN.isoformat())
+    assert [frame async for frame in fare_calendar_stream(bad_city, 1)] == ["data: [ERROR] Invalid city code\n\n"]
@@ -0,0 +1,122 @@
+import httpx
+import pytest
+
+from app.config import FlightApiConfig
+from app.services import flight
+from app.services.flight import FlightApiClient, _backoff_delay, _parse_retry_after
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(FlightApiConfig, "backoff_base", 0.001)
+    monkeypatch.setattr(FlightApiConfig, "backoff_max", 0.01)
+    monkeypatch.setattr(FlightApiConfig, "max_retries", 2)
+
+
+def client_for(handler) -> FlightApiClient:
+    api = FlightApiClient()
+    api._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return api
+
+
+def test_backoff_is_full_jitter_capped_at_max(monkeypatch):
+    monkeypatch.setattr(flight.random, "uniform", lambda low, high: (low, high))
+    assert _backoff_delay(0) == (0, 0.001)
+    assert _backoff_delay(2) == (0, 0.004)
+    assert _backoff_delay(10) == (0, 0.01)
+
+
+def test_backoff_delays_are_spread():
+    delays = {_backoff_delay(3) for _ in range(50)}
+    assert all(0 <= delay <= 0.008 for delay in delays)
+    assert len(delays) > 1
+
+
+@pytest.mark.parametrize("value, expected", [
+    (None, None),
+    ("", None),
+    ("0.005", 0.005),
+    ("120", 0.01),
+    ("Wed, 21 Oct 2015 07:28:00 GMT", None),
+])
+def test_parse_retry_after(value, expected):
+    assert _parse_retry_after(value) == expected
+
+
+async def test_retries_retryable_status_until_success():
+    statuses = iter([503, 429, 200])
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(next(statuses), headers={"retry-after": "0"}, json={"ok": True})
+
+    response = await client_for(handler).get("https://flights.test/search", params={"q": 1})
+    assert response.status_code == 200
+    assert len(calls) == 3
+    assert calls[-1].url.params["q"] == "1"
+
+
+async def test_gives_up_after_max_retries():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(502)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        await client_for(handler).get("https://flights.test/search", params={})
+    assert len(calls) == FlightApiConfig.max_retries + 1
+
+
+async def test_client_errors_are_not_retried():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(404)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        await client_for(handler).get("https://flights.test/search", params={})
+    assert len(calls) == 1
+
+
+async def test_transport_errors_are_retried():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) < 3:
+            raise httpx.ConnectError("connection refused", request=request)
+        return httpx.Response(200)
+
+    response = await client_for(handler).get("https://flights.test/search", params={})
+    assert response.status_code == 200
+    assert len(calls) == 3
+
+
+async def test_transport_error_on_last_attempt_is_raised():
+    def handler(request):
+        raise httpx.ReadTimeout("timed out", request=request)
+
+    with pytest.raises(httpx.ReadTimeout):
+        await client_for(handler).get("https://flights.test/search", params={})
+
+
+async def test_streamed_error_response_is_closed():
+    api = client_for(lambda request: httpx.Response(400, content=b"bad request"))
+    with pytest.raises(httpx.HTTPStatusError) as error:
+        await api.get("https://flights.test/search", params={}, stream=True)
+    assert error.value.response.is_closed
+
+
+def test_upstream_failures_exclude_client_errors():
+    request = httpx.Request("GET", "https://flights.test")
+
+    def status_error(status):
+        return httpx.HTTPStatusError("", request=request, response=httpx.Response(status, request=request))
+
+    assert flight._is_upstream_failure(status_error(503))
+    assert flight._is_upstream_failure(status_error(429))
+    assert not flight._is_upstream_failure(status_error(400))
+    assert flight._is_upstream_failure(httpx.ConnectError("", request=request))
@@ -0,0 +1,156 @@
+import json
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pytest
+
+from app.services.flight_parser import (
+    FlightResponseParser,
+    build_airline_index,
+    extract_flight_offer,
+    extract_search_result,
+)
+
+SAMPLE = Path(__file__).resolve().parent.parent / "res" / "booking-fligh-api-exp.json"
+
+
+def _extract_flight_info(offer: Dict[str, Any], airlines: List[Dict[str, Any]]) -> Dict[str, Any]:
+    # 重写前 flight.py 中的实现，原样保留作为对照
+    airline_mapping = dict()
+    for airline in airlines:
+        airline_mapping[airline.get("iataCode")] = {
+            "name": airline.get("name"),
+            "logo": airline.get("logoUrl")
+        }
+
+    outbound_segment = offer.get("segments", [{}])[0] if offer.get("segments") else {}
+    return_segment = offer.get("segments", [{}])[1] if len(offer.get("segments", [])) > 1 else {}
+
+    price_breakdown = offer.get("priceBreakdown", {})
+    total_price = price_breakdown.get("total", {})
+
+    first_leg = outbound_segment.get("legs", [{}])[0] if outbound_segment.get("legs") else {}
+    flight_info = first_leg.get("flightInfo", {})
+    carrier_info = flight_info.get("carrierInfo", {})
+
+    flight_number = flight_info.get("flightNumber", "")
+    airline_code = carrier_info.get("operatingCarrier", "")
+
+    airline_info = airline_mapping.get(airline_code, {})
+
+    return {
+        "outbound": {
+            "departure_airport": {
+                "code": outbound_segment.get("departureAirport", {}).get("code", ""),
+                "name": outbound_segment.get("departureAirport", {}).get("name", ""),
+                "city": outbound_segment.get("departureAirport", {}).get("cityName", "")
+            },
+            "arrival_airport": {
+                "code": outbound_segment.get("arrivalAirport", {}).get("code", ""),
+                "name": outbound_segment.get("arrivalAirport", {}).get("name", ""),
+                "city": outbound_segment.get("arrivalAirport", {}).get("cityName", "")
+            },
+            "departure_time": outbound_segment.get("departureTime", ""),
+            "arrival_time": outbound_segment.get("arrivalTime", ""),
+            "duration": outbound_segment.get("totalTime", 0)
+        },
+        "return": {
+            "departure_airport": {
+                "code": return_segment.get("departureAirport", {}).get("code", ""),
+                "name": return_segment.get("departureAirport", {}).get("name", ""),
+                "city": return_segment.get("departureAirport", {}).get("cityName", "")
+            },
+            "arrival_airport": {
+                "code": return_segment.get("arrivalAirport", {}).get("code", ""),
+                "name": return_segment.get("arrivalAirport", {}).get("name", ""),
+                "city": return_segment.get("arrivalAirport", {}).get("cityName", "")
+            },
+            "departure_time": return_segment.get("departureTime", ""),
+            "arrival_time": return_segment.get("arrivalTime", ""),
+            "duration": return_segment.get("totalTime", 0)
+        } if return_segment else None,
+        "airline": {
+            "code": airline_code,
+            "flight_no": flight_number,
+            "name": airline_info.get("name", ""),
+            "logo": airline_info.get("logo", "")
+        },
+        "price": {
+            "total": total_price.get("units", 0) + (total_price.get("nanos", 0) / 1000000000),
+            "currency": total_price.get("currencyCode", "CNY"),
+            "base_fare": price_breakdown.get("baseFare", {}).get("units", 0) +
+                        (price_breakdown.get("baseFare", {}).get("nanos", 0) / 1000000000),
+            "tax": price_breakdown.get("tax", {}).get("units", 0) +
+                  (price_breakdown.get("tax", {}).get("nanos", 0) / 1000000000)
+        },
+        "stops": len(outbound_segment.get("legs", [])) - 1,
+    }
+
+
+@pytest.fixture(scope="module")
+def body() -> bytes:
+    return SAMPLE.read_bytes()
+
+
+@pytest.fixture(scope="module")
+def data(body) -> Dict[str, Any]:
+    return json.loads(body)
+
+
+def test_offers_match_the_previous_extraction(data):
+    airlines = data["aggregation"]["airlines"]
+    airline_index = build_airline_index(airlines)
+    assert data["flightOffers"]
+
+    for offer in data["flightOffers"]:
+        assert extract_flight_offer(offer, airline_index).to_dict() == _extract_flight_info(offer, airlines)
+
+
+def test_sparse_offer_matches_the_previous_extraction():
+    offer = {"segments": [{"legs": []}], "priceBreakdown": {"total": {"units": 100}}}
+    assert extract_flight_offer(offer, {}).to_dict() == _extract_flight_info(offer, [])
+
+
+def test_search_result_summary(data):
+    result = extract_search_result(data, limit=3)
+    assert len(result.offers) == 3
+    assert result.total_count == data["aggregation"]["totalCount"]
+    assert result.min_price is not None
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 512, 4096, 1 << 20])
+@pytest.mark.parametrize("limit", [1, 3, 100])
+def test_incremental_parser_matches_full_decode(body, data, chunk_size, limit):
+    parser = FlightResponseParser(limit)
+    for start in range(0, len(body), chunk_size):
+        if parser.feed(body[start:start + chunk_size]):
+            break
+    result = parser.close()
+
+    assert result.to_dict() == extract_search_result(data, limit).to_dict()
+
+
+def test_incremental_parser_stops_reading_after_limit(body):
+    parser = FlightResponseParser(limit=1)
+    consumed = 0
+    for start in range(0, len(body), 4096):
+        consumed += 4096
+        if parser.feed(body[start:start + 4096]):
+            break
+
+    assert parser.done
+    assert consumed < len(body) // 2
+    assert len(parser.close().offers) == 1
+
+
+def test_truncated_body_is_rejected(body):
+    parser = FlightResponseParser(limit=100)
+    parser.feed(body[:len(body) // 2])
+    with pytest.raises(ValueError):
+        parser.close()
+
+
+def test_non_object_body_is_rejected():
+    parser = FlightResponseParser(limit=3)
+    with pytest.raises(ValueError):
+        parser.feed(b"[]")
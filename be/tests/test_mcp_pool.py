@@ -0,0 +1,136 @@
+import asyncio
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import mcp_pool
+from app.services.mcp_pool import McpSessionPool
+
+
+class FakeSession:
+    """Stands in for mcp.ClientSession; `healthy = False` makes pings fail"""
+
+    opened = []
+
+    def __init__(self, read, write):
+        self.healthy = True
+        self.closed = False
+        FakeSession.opened.append(self)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.closed = True
+
+    async def initialize(self):
+        pass
+
+    async def send_ping(self):
+        if not self.healthy:
+            raise ConnectionError("session gone")
+
+
+@asynccontextmanager
+async def fake_transport(url):
+    yield None, None, "session-id"
+
+
+async def fake_load_tools(session):
+    return [SimpleNamespace(name="generate_pin_map")]
+
+
+@pytest.fixture(autouse=True)
+def fake_client(monkeypatch):
+    FakeSession.opened = []
+    monkeypatch.setattr(mcp_pool, "import_client_modules", lambda: (FakeSession, fake_transport, fake_load_tools))
+
+
+@pytest.fixture
+async def pool():
+    pool = McpSessionPool("http://mcp.test", max_size=2, health_check_interval=60)
+    yield pool
+    await pool.aclose()
+
+
+async def test_sessions_are_reused(pool):
+    async with pool.acquire() as first:
+        assert [tool.name for tool in first.tools] == ["generate_pin_map"]
+    async with pool.acquire() as second:
+        pass
+
+    assert second is first
+    assert pool.stats()["connects"] == 1
+    assert pool.stats()["reuses"] == 1
+    assert len(FakeSession.opened) == 1
+
+
+async def test_agent_is_built_once_per_session(pool):
+    built = []
+
+    def factory(tools):
+        built.append(tools)
+        return object()
+
+    async with pool.acquire() as pooled:
+        agent = pooled.get_agent(factory)
+    async with pool.acquire() as pooled:
+        assert pooled.get_agent(factory) is agent
+    assert len(built) == 1
+
+
+async def test_concurrent_checkouts_get_separate_sessions(pool):
+    async with pool.acquire() as first, pool.acquire() as second:
+        assert first is not second
+    assert pool.stats()["idle"] == 2
+    assert pool.connects == 2
+
+
+async def test_session_is_discarded_after_a_failed_call(pool):
+    with pytest.raises(RuntimeError):
+        async with pool.acquire() as failed:
+            raise RuntimeError("tool call failed")
+
+    assert FakeSession.opened[0].closed
+    async with pool.acquire() as pooled:
+        assert pooled is not failed
+    assert pool.connects == 2
+
+
+async def test_unhealthy_idle_session_is_replaced(pool):
+    pool.health_check_interval = 0
+    async with pool.acquire() as first:
+        pass
+    FakeSession.opened[0].healthy = False
+
+    async with pool.acquire() as second:
+        assert second is not first
+    assert FakeSession.opened[0].closed
+    assert pool.reuses == 0
+
+
+async def test_idle_sessions_are_reaped():
+    pool = McpSessionPool("http://mcp.test", max_size=2, idle_timeout=0.02, reap_interval=0.01)
+    await pool.start()
+    try:
+        async with pool.acquire():
+            pass
+        assert pool.stats()["idle"] == 1
+
+        await asyncio.sleep(0.1)
+        assert pool.stats()["idle"] == 0
+        assert FakeSession.opened[0].closed
+    finally:
+        await pool.aclose()
+
+
+async def test_warm_up_opens_min_size_sessions():
+    pool = McpSessionPool("http://mcp.test", max_size=4, min_size=2)
+    try:
+        await pool.warm_up()
+        assert pool.stats()["idle"] == 2
+        assert pool.connects == 2
+    finally:
+        await pool.aclose()
+    assert all(session.closed for session in FakeSession.opened)
@@ -0,0 +1,66 @@
+from app.services.metrics import MetricsRegistry, ServerTiming
+
+
+def test_counter_renders_one_sample_per_label_set():
+    registry = MetricsRegistry()
+    counter = registry.counter("test_requests_total", "Requests", ["route", "status"])
+    counter.inc(route="/chat", status="200")
+    counter.inc(2, route="/chat", status="200")
+    counter.inc(route="/chat", status="503")
+
+    assert registry.render() == (
+        "# HELP test_requests_total Requests\n"
+        "# TYPE test_requests_total counter\n"
+        'test_requests_total{route="/chat",status="200"} 3\n'
+        'test_requests_total{route="/chat",status="503"} 1\n'
+    )
+
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry()
+    registry.counter("test_total", "Test", ["name"]).inc(name='a "quoted"\\ \nname')
+    assert 'test_total{name="a \\"quoted\\"\\\\ \\nname"} 1' in registry.render()
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("test_seconds", "Latency", ["path"], buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 3):
+        histogram.observe(value, path="direct")
+
+    assert histogram.samples() == [
+        'test_seconds_bucket{path="direct",le="0.1"} 2',
+        'test_seconds_bucket{path="direct",le="1.0"} 3',
+        'test_seconds_bucket{path="direct",le="+Inf"} 4',
+        'test_seconds_sum{path="direct"} 3.65',
+        'test_seconds_count{path="direct"} 4',
+    ]
+
+
+def test_histogram_times_a_block():
+    histogram = MetricsRegistry().histogram("test_seconds", "Latency", buckets=(60,))
+    with histogram.time():
+        pass
+    assert histogram.samples()[0] == 'test_seconds_bucket{le="60.0"} 1'
+
+
+def test_callback_metric_is_read_at_render_time():
+    registry = MetricsRegistry()
+    state = {"idle": 1}
+    registry.callback("test_idle", "Idle sessions", "gauge", lambda: state["idle"])
+    state["idle"] = 4
+
+    assert registry.render().splitlines()[-1] == "test_idle 4"
+    assert "# TYPE test_idle gauge" in registry.render()
+
+
+def test_server_timing_header():
+    timing = ServerTiming()
+    with timing.measure("cache"):
+        pass
+    with timing.measure("llm"):
+        pass
+
+    names = [entry.split(";")[0] for entry in timing.header().split(", ")]
+    assert names == ["cache", "llm"]
+    assert all(";dur=" in entry for entry in timing.header().split(", "))
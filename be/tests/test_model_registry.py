@@ -0,0 +1,85 @@
+import uuid
+
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+
+from app.config import ModelConfig, _model_task
+from app.services import model_registry as model_registry_module
+from app.services.metrics import MetricsRegistry
+from app.services.model_registry import ModelRegistry, ModelSpec, _build_usage_recorder
+
+
+def registry() -> ModelRegistry:
+    return ModelRegistry({
+        "city_code": ModelSpec("city_code", "qwen-turbo-latest", 0.9, 256, 15, deterministic=True),
+        "plan": ModelSpec("plan", "qwen-plus-latest", 0.7, 2048, 60),
+    })
+
+
+def test_each_task_gets_its_own_model_built_once():
+    models = registry()
+
+    city_code, plan = models.get("city_code"), models.get("plan")
+
+    assert models.get("city_code") is city_code
+    assert city_code.model_name == "qwen-turbo-latest"
+    assert city_code.max_tokens == 256
+    assert plan.model_name == "qwen-plus-latest"
+    assert plan.max_tokens == 2048
+
+
+def test_deterministic_task_uses_zero_temperature_and_fixed_seed():
+    models = registry()
+
+    city_code, plan = models.get("city_code"), models.get("plan")
+
+    assert (city_code.temperature, city_code.seed) == (0, ModelConfig.seed)
+    assert (plan.temperature, plan.seed) == (0.7, None)
+
+
+def test_warm_up_builds_every_task():
+    models = registry()
+    models.warm_up()
+    assert set(models._models) == {"city_code", "plan"}
+
+
+def test_task_binding_is_overridable_by_env(monkeypatch):
+    monkeypatch.setenv("MODEL_MAP_VIS_NAME", "qwen-max-latest")
+    monkeypatch.setenv("MODEL_MAP_VIS_MAX_TOKENS", "512")
+    monkeypatch.setenv("MODEL_MAP_VIS_DETERMINISTIC", "false")
+
+    options = _model_task("MAP_VIS", "qwen-turbo-latest", 0, 1024, 60, deterministic=True)
+
+    assert options == {
+        "model_name": "qwen-max-latest",
+        "temperature": 0.0,
+        "max_tokens": 512,
+        "timeout": 60.0,
+        "deterministic": False,
+    }
+
+
+def test_usage_recorder_records_latency_and_tokens_per_task(monkeypatch):
+    metrics = MetricsRegistry()
+    tokens = metrics.counter("test_model_tokens_total", "Tokens", ["task", "type"])
+    seconds = metrics.histogram("test_model_call_seconds", "Latency", ["task", "status"], buckets=(60,))
+    monkeypatch.setattr(model_registry_module, "MODEL_TOKENS", tokens)
+    monkeypatch.setattr(model_registry_module, "MODEL_CALL_SECONDS", seconds)
+    recorder = _build_usage_recorder("plan")
+
+    ok, failed = uuid.uuid4(), uuid.uuid4()
+    recorder.on_chat_model_start({}, [], run_id=ok)
+    recorder.on_llm_end(LLMResult(generations=[[ChatGeneration(message=AIMessage(
+        content="计划", usage_metadata={"input_tokens": 120, "output_tokens": 30, "total_tokens": 150},
+    ))]]), run_id=ok)
+    recorder.on_chat_model_start({}, [], run_id=failed)
+    recorder.on_llm_error(TimeoutError(), run_id=failed)
+
+    assert tokens.samples() == [
+        'test_model_tokens_total{task="plan",type="input"} 120',
+        'test_model_tokens_total{task="plan",type="output"} 30',
+    ]
+    samples = seconds.samples()
+    assert 'test_model_call_seconds_count{task="plan",status="ok"} 1' in samples
+    assert 'test_model_call_seconds_count{task="plan",status="error"} 1' in samples
+    assert recorder._started == {}
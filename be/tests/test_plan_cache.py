@@ -0,0 +1,119 @@
+import time
+
+import pytest
+
+from app.config import PlanCacheConfig, PromptConfig
+from app.models.http_entity import TravelPlanRequest
+from app.services import plan_cache as plan_cache_module
+from app.services.cache_backend import MemoryCacheBackend
+from app.services.plan_cache import CachedPlan, PlanCache, plan_cache_key, replay_plan
+from app.services.sse import CHAT_DONE_FRAME, DONE_FRAME
+
+
+def request(**overrides) -> TravelPlanRequest:
+    fields = dict(from_place="上海", to_place="成都", from_date="2025-10-01", to_date="2025-10-05",
+                  people_num=2, others="喜欢美食")
+    fields.update(overrides)
+    return TravelPlanRequest(**fields)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # CachedPlan.created_at 取真实时间，从当前时间开始推进
+    now = [time.time()]
+    monkeypatch.setattr(plan_cache_module.time, "time", lambda: now[0])
+    return now
+
+
+async def test_put_and_get():
+    cache = PlanCache(ttl=60, max_memory_chars=1000)
+    assert await cache.get("k") is None
+
+    await cache.put("k", "plan", ["map"])
+    cached = await cache.get("k")
+
+    assert (cached.plan, cached.map_vis) == ("plan", ["map"])
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+async def test_memory_tier_evicts_least_recently_used():
+    cache = PlanCache(ttl=60, max_memory_chars=25)
+    await cache.put("a", "a" * 10, [])
+    await cache.put("b", "b" * 10, [])
+    await cache.get("a")
+    await cache.put("c", "c" * 10, [])
+
+    assert await cache.get("a") is not None
+    assert await cache.get("b") is None
+    assert await cache.get("c") is not None
+    assert cache.stats()["memory_chars"] == 20
+
+
+async def test_size_counts_plan_and_map():
+    assert CachedPlan(plan="abc", map_vis=["de", "f"]).size == 6
+
+    cache = PlanCache(ttl=60, max_memory_chars=10)
+    await cache.put("big", "x" * 8, ["y" * 8])
+    assert await cache.get("big") is None
+    assert cache.stats()["entries"] == 0
+
+
+async def test_entries_expire_after_ttl(clock):
+    cache = PlanCache(ttl=60, max_memory_chars=1000)
+    await cache.put("k", "plan", [])
+
+    clock[0] += 59
+    assert await cache.get("k") is not None
+    clock[0] += 2
+    assert await cache.get("k") is None
+    assert cache.stats()["memory_chars"] == 0
+
+
+async def test_shared_tier_serves_other_workers():
+    shared = MemoryCacheBackend("plan", 100)
+    writer = PlanCache(ttl=60, max_memory_chars=1000, shared=shared)
+    reader = PlanCache(ttl=60, max_memory_chars=1000, shared=shared)
+
+    await writer.put("k", "plan", ["map"])
+    cached = await reader.get("k")
+
+    assert (cached.plan, cached.map_vis) == ("plan", ["map"])
+    # 读到后放进本进程的内存层
+    assert reader.stats()["entries"] == 1
+
+
+async def test_shared_tier_entries_expire(monkeypatch, clock):
+    from app.services import cache_backend
+    monkeypatch.setattr(cache_backend.time, "time", lambda: clock[0])
+    shared = MemoryCacheBackend("plan", 100)
+    await PlanCache(ttl=60, max_memory_chars=1000, shared=shared).put("k", "plan", [])
+
+    clock[0] += 61
+    assert await PlanCache(ttl=60, max_memory_chars=1000, shared=shared).get("k") is None
+
+
+def test_cache_key_normalizes_requests():
+    assert plan_cache_key(request()) == plan_cache_key(request(to_place=" 成都 ", others="喜欢美食 "))
+    assert plan_cache_key(request(from_place="Shanghai")) == plan_cache_key(request(from_place="shanghai"))
+    assert plan_cache_key(request()) != plan_cache_key(request(people_num=3))
+    # 航班页码不影响旅行计划
+    assert plan_cache_key(request()) == plan_cache_key(request(page_number=2))
+
+
+def test_cache_key_includes_prompt_version(monkeypatch):
+    key = plan_cache_key(request())
+    monkeypatch.setattr(PromptConfig, "travel_plan_version", "test")
+    assert plan_cache_key(request()) != key
+
+
+async def test_replay_emits_the_streaming_events(monkeypatch):
+    monkeypatch.setattr(PlanCacheConfig, "replay_chunk_chars", 4)
+    monkeypatch.setattr(PlanCacheConfig, "replay_interval", 0)
+
+    frames = [frame async for frame in replay_plan(CachedPlan(plan="0123456789", map_vis=["![map](x)"]))]
+
+    assert frames[:3] == ['data: {"chat_text": "0123"}\n\n', 'data: {"chat_text": "4567"}\n\n',
+                          'data: {"chat_text": "89"}\n\n']
+    assert frames[3] == CHAT_DONE_FRAME
+    assert "map_vis" in frames[4]
+    assert frames[-1] == DONE_FRAME
@@ -0,0 +1,76 @@
+from app.services.poi import ItineraryWatcher, extract_itinerary_pois, extract_itinerary_section, extract_pois
+
+PLAN = """# 上海三日游
+
+## 🍜 美食推荐
+- **南翔馒头店**：小笼包
+
+## 📅 每日行程安排
+
+### Day 1
+- **上午：** 游览外滩、豫园和城隍庙
+- **下午：** 登上**东方明珠广播电视塔**俯瞰夜景
+- 用餐建议：老正兴
+
+### Day 2
+1. 漫步「武康路」，参观上海博物馆
+2. 晚上：前往新天地附近，后前往田子坊
+
+## 💰 预算
+- 住宿：每晚 500 元
+"""
+
+
+def test_itinerary_section_stops_at_next_heading():
+    section = extract_itinerary_section(PLAN)
+    assert "Day 1" in section and "Day 2" in section
+    assert "南翔馒头店" not in section and "预算" not in section
+    assert extract_itinerary_section("no itinerary here") == ""
+
+
+def test_extracts_pois_from_the_itinerary():
+    pois = extract_itinerary_pois(PLAN, "上海")
+
+    expected = ["外滩", "豫园", "城隍庙", "东方明珠广播电视塔", "武康路", "上海博物馆", "新天地", "田子坊"]
+    assert [poi for poi in pois if poi in expected] == expected
+    for not_poi in ["上午", "下午", "晚上", "用餐建议", "南翔馒头店", "上海", "Day 1"]:
+        assert not_poi not in pois
+
+
+def test_extract_pois_splits_activity_lists():
+    assert extract_pois("- 上午：参观故宫/景山公园与北海公园") == ["故宫", "景山公园", "北海公园"]
+
+
+def test_extract_pois_skips_destination_and_duplicates():
+    text = "- 游览《西湖》\n- 再次漫步西湖、杭州\n- **杭州**"
+    assert extract_pois(text, "杭州") == ["西湖"]
+
+
+def test_extract_pois_honours_the_limit():
+    text = "\n".join(f"- 参观景点{chr(0x4e00 + i)}馆" for i in range(10))
+    assert len(extract_pois(text, limit=4)) == 4
+
+
+def test_watcher_reports_days_and_section_end():
+    watcher = ItineraryWatcher("上海")
+    events = []
+    # 按模型输出的粒度切成小块
+    for start in range(0, len(PLAN), 5):
+        events.extend(watcher.feed(PLAN[start:start + 5]))
+
+    # 最后一天随整节结束一起完成
+    assert events == ["day", "done"]
+    assert watcher.pois() == extract_itinerary_pois(PLAN, "上海")
+    assert watcher.feed("### Day 3\n") == []
+
+
+def test_watcher_reports_each_completed_day():
+    watcher = ItineraryWatcher("上海")
+    events = watcher.feed("## 📅 每日行程安排\n### Day 1\n- 游览外滩\n")
+    assert events == []
+    assert watcher.in_section
+
+    assert watcher.feed("### Day 2\n") == ["day"]
+    assert watcher.pois() == ["外滩"]
+    # 没有内容的一天不算完成
+    assert watcher.feed("### Day 3\n") == []
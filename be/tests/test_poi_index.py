@@ -0,0 +1,56 @@
+import pytest
+
+from app.services.cache_backend import MemoryCacheBackend
+from app.services.poi_index import PoiIndex, map_spec_key, poi_key
+
+
+def test_poi_key_normalizes_names():
+    assert poi_key("上海", "上海外滩") == "外滩"
+    assert poi_key("上海", "外滩") == "外滩"
+    assert poi_key("上海", "上海") == "上海"
+    assert poi_key("Hong Kong", "Victoria  Peak") == poi_key("hong kong", "victoria peak")
+
+
+def test_map_spec_key_ignores_order_and_prefix():
+    assert map_spec_key("上海", ["外滩", "豫园"]) == map_spec_key("上海", ["上海豫园", "外滩"])
+    assert map_spec_key("上海", ["外滩"]) != map_spec_key("杭州", ["外滩"])
+
+
+@pytest.fixture
+def index():
+    return PoiIndex(MemoryCacheBackend("poi-test", 16), ttl=3600, max_per_destination=4)
+
+
+async def test_resolve_prefers_known_names(index):
+    assert await index.resolve("上海", ["外滩", "上海外滩", "豫园"]) == ["上海外滩", "上海豫园"]
+
+    await index.add("上海", ["豫园", "上海 Disneyland"])
+    assert await index.resolve("上海", ["上海豫园", "外滩", "disneyland"]) == ["豫园", "上海外滩", "上海 Disneyland"]
+
+
+async def test_add_keeps_the_most_recent_pois(index):
+    await index.add("上海", ["外滩", "豫园", "新天地", "田子坊"])
+    await index.add("上海", ["外滩"])
+    await index.add("上海", ["静安寺"])
+
+    assert list(await index.known("上海")) == ["新天地", "田子坊", "外滩", "静安寺"]
+
+
+async def test_supplement_adds_known_pois_mentioned_in_text(index):
+    assert await index.supplement("上海", "外滩", [], limit=5) == []
+
+    await index.add("上海", ["上海外滩", "上海豫园", "新天地", "田子坊"])
+    text = "晚上去新天地，白天在外滩散步，再去豫园和田子坊"
+    # 豫园只有两个字符，不参与匹配
+    assert await index.supplement("上海", text, ["外滩"], limit=5) == ["外滩", "新天地", "田子坊"]
+    assert await index.supplement("上海", text, ["外滩"], limit=2) == ["外滩", "新天地"]
+
+
+async def test_supplement_skips_short_names_inside_other_words(index):
+    await index.add("杭州", ["西湖", "灵隐寺"])
+
+    text = "中午在楼外楼吃西湖醋鱼"
+    assert await index.supplement("杭州", text, [], limit=5) == []
+
+    lenient = PoiIndex(index.backend, ttl=3600, max_per_destination=4, supplement_min_chars=2)
+    assert await lenient.supplement("杭州", text, [], limit=5) == ["西湖"]
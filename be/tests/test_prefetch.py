@@ -0,0 +1,123 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.models.http_entity import TravelPlanRequest
+from app.services import prefetch
+from app.services.prefetch import FlightPrefetcher, flight_search_key, search_flights
+
+
+def request(**overrides) -> TravelPlanRequest:
+    fields = dict(from_place="上海", to_place="东京", from_date="2026-11-01", to_date="2026-11-05",
+                  people_num=2, others="")
+    fields.update(overrides)
+    return TravelPlanRequest(**fields)
+
+
+@pytest.fixture
+def searches(monkeypatch):
+    """Replaces the flight search; each call returns the next queued result"""
+    calls = []
+    results = []
+    release = asyncio.Event()
+    release.set()
+
+    async def fake_search(params):
+        calls.append(params)
+        await release.wait()
+        result = results.pop(0) if results else ["offer"]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    monkeypatch.setattr(prefetch, "search_flights", fake_search)
+    return calls, results, release
+
+
+def test_key_ignores_case_whitespace_and_unrelated_fields():
+    assert flight_search_key(request()) == flight_search_key(request(from_place=" 上海 ", others="美食"))
+    assert flight_search_key(request(to_place="Tokyo")) == flight_search_key(request(to_place="tokyo"))
+    assert flight_search_key(request()) != flight_search_key(request(page_number=1))
+
+
+async def test_get_reuses_the_prefetched_search(searches):
+    calls, results, release = searches
+    prefetcher = FlightPrefetcher(ttl=60)
+
+    prefetcher.start(request())
+    assert await prefetcher.get(request(others="亲子")) == ["offer"]
+    assert len(calls) == 1
+
+
+async def test_concurrent_gets_share_one_search(searches):
+    calls, results, release = searches
+    release.clear()
+    prefetcher = FlightPrefetcher(ttl=60)
+
+    pending = [asyncio.create_task(prefetcher.get(request())) for _ in range(3)]
+    await asyncio.sleep(0)
+    release.set()
+    assert await asyncio.gather(*pending) == [["offer"]] * 3
+    assert len(calls) == 1
+
+
+@pytest.mark.parametrize("failure", [None, [], RuntimeError("search failed")])
+async def test_failed_searches_are_not_kept(searches, failure):
+    calls, results, release = searches
+    results.append(failure)
+    prefetcher = FlightPrefetcher(ttl=60)
+
+    task = prefetcher.start(request())
+    await asyncio.gather(task, return_exceptions=True)
+
+    assert await prefetcher.get(request()) == ["offer"]
+    assert len(calls) == 2
+
+
+async def test_expired_results_are_searched_again(searches, monkeypatch):
+    calls, results, release = searches
+    now = [1000.0]
+    monkeypatch.setattr(prefetch.time, "monotonic", lambda: now[0])
+    prefetcher = FlightPrefetcher(ttl=60)
+
+    await prefetcher.get(request())
+    now[0] += 61
+    await prefetcher.get(request())
+    assert len(calls) == 2
+
+
+async def test_cancelled_caller_does_not_cancel_the_shared_search(searches):
+    calls, results, release = searches
+    release.clear()
+    prefetcher = FlightPrefetcher(ttl=60)
+
+    caller = asyncio.create_task(prefetcher.get(request()))
+    await asyncio.sleep(0)
+    caller.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await caller
+
+    release.set()
+    assert await prefetcher.get(request()) == ["offer"]
+    assert len(calls) == 1
+
+
+async def test_search_needs_both_city_codes(monkeypatch):
+    async def get_city_code(name):
+        return {"上海": "SHA"}.get(name)
+
+    monkeypatch.setattr(prefetch, "get_city_code", get_city_code)
+    assert await search_flights(request()) is None
+
+
+async def test_search_errors_become_an_empty_list(monkeypatch):
+    async def get_city_code(name):
+        return {"上海": "SHA", "东京": "TYO"}[name]
+
+    async def failing_search(*args, **kwargs):
+        raise httpx.ConnectError("connection refused")
+
+    monkeypatch.setattr(prefetch, "get_city_code", get_city_code)
+    monkeypatch.setattr(prefetch.flight_search_cache, "search", failing_search)
+    assert await search_flights(request()) == []
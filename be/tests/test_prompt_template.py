@@ -0,0 +1,88 @@
+import pytest
+
+from app.promopt.template import PromptTemplate, get_template
+from app.promopt.travel_plan import TRAVEL_PLAN_PROMPT_V1, TRAVEL_PLAN_PROMPT_V2
+from app.services import tokens
+from app.services.lang import build_travel_plan_prompt
+from app.services.metrics import MetricsRegistry
+from tests.fake_model import travel_request
+
+TEMPLATE = PromptTemplate(name="test", version="1", system="你是规划师。", user="固定说明\n目的地：{to_place}\n天数：{days}")
+
+
+@pytest.fixture(autouse=True)
+def estimated_tokens(monkeypatch):
+    # 不加载 tiktoken，按估算值统计
+    monkeypatch.setattr(tokens, "_encoding", None)
+    tokens._count_static.cache_clear()
+    yield
+    tokens._count_static.cache_clear()
+
+
+def test_render_puts_fields_in_the_user_message_only():
+    prompt = TEMPLATE.render(to_place="东京", days=5)
+
+    assert prompt.messages == [("system", "你是规划师。"), ("human", "固定说明\n目的地：东京\n天数：5")]
+    assert prompt.text == "你是规划师。固定说明\n目的地：东京\n天数：5"
+    assert TEMPLATE.key == "test:v1"
+
+
+def test_template_without_system_sends_one_user_message():
+    prompt = PromptTemplate(name="test", version="0", system="", user="去{to_place}").render(to_place="大阪")
+    assert prompt.messages == [("human", "去大阪")]
+
+
+def test_static_prefix_ends_at_the_first_field():
+    assert TEMPLATE.static_prefix == "你是规划师。固定说明\n目的地："
+    assert PromptTemplate(name="test", version="0", system="s", user="{a} and {b}").static_prefix == "s"
+
+
+def test_travel_plan_v2_keeps_every_field_out_of_the_system_message():
+    assert "{" not in TRAVEL_PLAN_PROMPT_V2.system
+    assert len(TRAVEL_PLAN_PROMPT_V2.static_prefix) > len(TRAVEL_PLAN_PROMPT_V1.static_prefix)
+
+
+def test_build_travel_plan_prompt_uses_the_configured_version(monkeypatch):
+    monkeypatch.setattr("app.services.lang.PromptConfig.travel_plan_version", "1")
+    prompt = build_travel_plan_prompt(travel_request())
+
+    assert prompt.template is TRAVEL_PLAN_PROMPT_V1
+    assert len(prompt.messages) == 1
+    assert "东京" in prompt.user
+
+
+def test_unknown_version_lists_the_available_ones():
+    with pytest.raises(ValueError, match=r"available: \['1', '2'\]"):
+        get_template("travel_plan", "9")
+
+
+def test_estimate_counts_cjk_per_character_and_ascii_per_four():
+    assert tokens.estimate_tokens("") == 0
+    assert tokens.estimate_tokens("东京") == 2
+    assert tokens.estimate_tokens("abcd") == 1
+    assert tokens.estimate_tokens("abcde东京") == 4
+    assert tokens.count_tokens("abcde东京") == 4
+
+
+def test_record_prompt_usage_splits_prefix_and_variable_tokens(monkeypatch):
+    metrics = MetricsRegistry()
+    prompt_tokens = metrics.counter("test_prompt_tokens_total", "Prompt", ["template", "part"])
+    completion_tokens = metrics.counter("test_completion_tokens_total", "Completion", ["template"])
+    monkeypatch.setattr(tokens, "PROMPT_TOKENS", prompt_tokens)
+    monkeypatch.setattr(tokens, "PROMPT_COMPLETION_TOKENS", completion_tokens)
+
+    usage = tokens.record_prompt_usage(TEMPLATE.render(to_place="东京", days=5), completion="好的")
+
+    # system 6 + user 13 个非 ASCII 字符 + 3 个 ASCII 字符 (1)；前缀 14 个非 ASCII 字符 + 1 个换行 (1)
+    assert usage == {
+        "template": "test:v1",
+        "approx_prompt_tokens": 20,
+        "approx_prefix_tokens": 15,
+        "prefix_ratio": 0.75,
+        "approx_completion_tokens": 2,
+    }
+    assert prompt_tokens.samples() == [
+        'test_prompt_tokens_total{template="test:v1",part="prefix"} 15',
+        'test_prompt_tokens_total{template="test:v1",part="variable"} 5',
+    ]
+    assert completion_tokens.samples() == ['test_completion_tokens_total{template="test:v1"} 2']
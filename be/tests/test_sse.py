@@ -0,0 +1,75 @@
+import json
+
+import pytest
+
+from app.services import sse
+from app.services.sse import (
+    ChatTextEncoder,
+    busy_frame,
+    chat_text_frame,
+    error_frame,
+    map_vis_frame,
+    timing_frame,
+)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(sse.time, "monotonic", lambda: now[0])
+    return now
+
+
+def payload(frame: str):
+    assert frame.startswith("data: ") and frame.endswith("\n\n")
+    return json.loads(frame[6:-2])
+
+
+@pytest.mark.parametrize("text", ["plain", "多字节 ✈️ 文本", 'quotes " and \\ backslash', "line\nbreak", ""])
+def test_frames_match_json_dumps(text):
+    assert chat_text_frame(text) == f"data: {json.dumps({'chat_text': text})}\n\n"
+    assert map_vis_frame(text) == f"data: {json.dumps({'map_vis': text})}\n\n"
+
+
+def test_control_frames():
+    assert error_frame("boom") == "data: [ERROR] boom\n\n"
+    assert busy_frame(2.5) == 'data: [BUSY] {"retry_after": 2.5}\n\n'
+    assert timing_frame({"total_ms": 12}) == 'event: timing\ndata: {"total_ms": 12}\n\n'
+
+
+def test_deltas_are_coalesced_within_the_window(clock):
+    encoder = ChatTextEncoder(interval_ms=30, max_chars=1024)
+    assert encoder.push("上") is None
+    assert encoder.push("海") is None
+
+    clock[0] += 0.05
+    assert payload(encoder.push("游")) == {"chat_text": "上海游"}
+    assert encoder.frames == 1
+
+
+def test_frame_is_sent_once_max_chars_are_pending(clock):
+    encoder = ChatTextEncoder(interval_ms=1000, max_chars=4)
+    assert encoder.push("ab") is None
+    assert payload(encoder.push("cd")) == {"chat_text": "abcd"}
+    assert encoder.push("e") is None
+
+
+def test_zero_window_sends_every_delta(clock):
+    encoder = ChatTextEncoder(interval_ms=0, max_chars=0)
+    assert [payload(encoder.push(text)) for text in "abc"] == [{"chat_text": text} for text in "abc"]
+
+
+def test_flush_with_puts_pending_text_first(clock):
+    encoder = ChatTextEncoder(interval_ms=1000, max_chars=1024)
+    encoder.push("plan")
+    assert encoder.flush_with("data: [CHAT_DONE]\n\n") == chat_text_frame("plan") + "data: [CHAT_DONE]\n\n"
+    assert encoder.flush_with("data: [DONE]\n\n") == "data: [DONE]\n\n"
+    assert encoder.flush() is None
+
+
+def test_flush_restarts_the_window(clock):
+    encoder = ChatTextEncoder(interval_ms=30, max_chars=1024)
+    clock[0] += 0.02
+    encoder.flush()
+    clock[0] += 0.02
+    assert encoder.push("a") is None
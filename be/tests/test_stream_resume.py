@@ -0,0 +1,118 @@
+import asyncio
+
+import pytest
+
+from app.services import coalesce
+from app.services.coalesce import StreamCoalescer, parse_event_id
+from tests.streams import FakeUpstream, collect, data, event_id, take
+
+
+def test_parse_event_id():
+    assert parse_event_id("abc:12") == ("abc", 12)
+    assert parse_event_id(" abc:0 ") == ("abc", 0)
+    for malformed in (None, "", "abc", "abc:", ":3", "abc:x"):
+        assert parse_event_id(malformed) is None
+
+
+async def test_events_carry_sequential_ids_and_a_retry_hint():
+    coalescer = StreamCoalescer("test", client_retry_ms=1000)
+    frames = await collect(coalescer.subscribe("k", FakeUpstream().stream))
+
+    assert frames[0].startswith("retry: 1000\n")
+    assert not any(chunk.startswith("retry:") for chunk in frames[1:])
+    ids = [parse_event_id(event_id(chunk)) for chunk in frames]
+    assert len({generation for generation, _ in ids}) == 1
+    assert [index for _, index in ids] == list(range(len(frames)))
+
+
+async def test_resume_follows_the_live_upstream():
+    coalescer = StreamCoalescer("test", retain_ttl=60, retain_max_chars=10_000, cancel_grace=5)
+    upstream = FakeUpstream(hold=True)
+
+    received = await take(coalescer.subscribe("k", upstream.stream), 2)
+    last_event_id = event_id(received[-1])
+    assert coalescer.can_resume("k", last_event_id)
+
+    resumed = coalescer.subscribe("k", upstream.stream, last_event_id=last_event_id)
+    first = await resumed.__anext__()
+    upstream.release.set()
+    rest = await collect(resumed)
+
+    assert data(received + [first] + rest) == ["0", "1", "2", "[DONE]"]
+    assert upstream.calls == 1
+    assert not upstream.cancelled
+    assert coalescer.resumes == 1
+
+
+async def test_resume_replays_a_retained_generation():
+    coalescer = StreamCoalescer("test", retain_ttl=60, retain_max_chars=10_000)
+    upstream = FakeUpstream()
+    frames = await collect(coalescer.subscribe("k", upstream.stream))
+
+    resumed = await collect(coalescer.subscribe("k", upstream.stream, last_event_id=event_id(frames[1])))
+
+    assert data(resumed) == ["2", "[DONE]"]
+    assert upstream.calls == 1
+
+
+async def test_unknown_event_id_starts_a_new_generation():
+    coalescer = StreamCoalescer("test", retain_ttl=60, retain_max_chars=10_000)
+    upstream = FakeUpstream()
+    frames = await collect(coalescer.subscribe("k", upstream.stream))
+
+    assert not coalescer.can_resume("k", "unknown:1")
+    again = await collect(coalescer.subscribe("k", upstream.stream, last_event_id="unknown:1"))
+    assert data(again) == data(frames)
+    assert upstream.calls == 2
+
+
+async def test_retained_generations_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(coalesce.time, "monotonic", lambda: now[0])
+    coalescer = StreamCoalescer("test", retain_ttl=10, retain_max_chars=10_000)
+    frames = await collect(coalescer.subscribe("k", FakeUpstream().stream))
+
+    now[0] += 9
+    assert coalescer.can_resume("k", event_id(frames[0]))
+    now[0] += 2
+    assert not coalescer.can_resume("k", event_id(frames[0]))
+
+
+async def test_retained_generations_are_bounded_by_size():
+    frames = await collect(StreamCoalescer("probe").subscribe("a", FakeUpstream().stream))
+    size = sum(len(chunk.split("\n", 1)[1]) for chunk in frames)
+    coalescer = StreamCoalescer("test", retain_ttl=60, retain_max_chars=size + 1)
+
+    first = await collect(coalescer.subscribe("a", FakeUpstream().stream))
+    second = await collect(coalescer.subscribe("b", FakeUpstream().stream))
+
+    assert not coalescer.can_resume("a", event_id(first[0]))
+    assert coalescer.can_resume("b", event_id(second[0]))
+
+
+async def test_reconnect_within_the_grace_period_keeps_the_upstream():
+    coalescer = StreamCoalescer("test", retain_ttl=60, retain_max_chars=10_000, cancel_grace=0.2)
+    upstream = FakeUpstream(hold=True)
+
+    received = await take(coalescer.subscribe("k", upstream.stream), 1)
+    await asyncio.sleep(0.05)
+    resumed = coalescer.subscribe("k", upstream.stream, last_event_id=event_id(received[0]))
+    first = await resumed.__anext__()
+    await asyncio.sleep(0.3)
+    upstream.release.set()
+    rest = await collect(resumed)
+
+    assert not upstream.cancelled
+    assert upstream.calls == 1
+    assert data(received + [first] + rest) == ["0", "1", "2", "[DONE]"]
+
+
+@pytest.mark.parametrize("grace", [0, 0.05])
+async def test_cancel_grace_zero_or_positive_eventually_cancels(grace):
+    coalescer = StreamCoalescer("test", cancel_grace=grace)
+    upstream = FakeUpstream(hold=True)
+
+    await take(coalescer.subscribe("k", upstream.stream), 1)
+    await asyncio.sleep(grace + 0.05)
+
+    assert upstream.cancelled
@@ -0,0 +1,36 @@
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.routers import travel
+from app.services.admission import AdmissionController
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # 熔断器已打开的 LLM 准入，/travel/chat 在开始生成前就被拒绝
+    upstream = AdmissionController("llm", max_concurrency=1, max_queue=0, queue_timeout=1,
+                                   rate_per_second=0, burst=1, failure_threshold=1, reset_timeout=30)
+    upstream.breaker.record_failure()
+    monkeypatch.setattr(travel, "llm_admission", upstream)
+    monkeypatch.setattr(travel.FlightPrefetchConfig, "enabled", False)
+    monkeypatch.setattr(travel.PlanCacheConfig, "enabled", False)
+
+    app = FastAPI()
+    app.include_router(travel.router)
+    return TestClient(app)
+
+
+def test_rejected_chat_is_a_busy_event(client):
+    response = client.get("/travel/chat", params={
+        "from_place": "上海", "to_place": "东京", "from_date": "2030-05-10", "to_date": "2030-05-12",
+        "people_num": 2, "others": "",
+    })
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.headers["retry-after"] == "30"
+    assert response.text.startswith("data: [BUSY] ")
+    assert json.loads(response.text[len("data: [BUSY] "):]) == {"retry_after": 30}
@@ -107,6 +107,13 @@ export default () => {
           setError(error.message)
           setIsChatLoading(false)
           setIsMapVisLoading(false)
+        },
+        () => {
+          // 断线后无法续传，服务端从头推送
+          setTravelPlan('')
+          setMapVis('')
+          setIsChatLoading(true)
+          setIsMapVisLoading(false)
         }
       )
 
@@ -9,6 +9,11 @@ import { SSEDataType } from '../models/constant'
 export class SSEService {
   private baseUrl = 'http://localhost:8000/api/v1'
   private eventSource: EventSource | null = null
+  // 最后收到的事件 id（"<generation>:<index>"），断线重连时浏览器会以 Last-Event-ID 带给服务端
+  private lastEventId = ''
+  private reconnecting = false
+  private reconnects = 0
+  private maxReconnects = 5
 
   /**
    * 使用 EventSource 进行 SSE 连接
@@ -19,7 +24,8 @@ export class SSEService {
     onChunk: (chunk: { text: string; sseDataType: SSEDataType }) => void,
     onChatComplete: () => void,
     onComplete: () => void,
-    onError: (error: Error) => void
+    onError: (error: Error) => void,
+    onRestart: () => void = () => {}
   ): void {
     try {
       // 构建查询参数
@@ -35,11 +41,15 @@ export class SSEService {
       const url = `${this.baseUrl}/travel/chat?${params.toString()}`
 
       // 创建 EventSource 连接
+      this.lastEventId = ''
+      this.reconnecting = false
+      this.reconnects = 0
       this.eventSource = new EventSource(url)
 
       // 监听消息事件 - 类似你的示例
       this.eventSource.onmessage = (event) => {
         console.log('📨 Received SSE message:', event.data)
+        this.trackEventId(event.lastEventId, onRestart)
 
         if (event.data === '[DONE]') {
           console.log('✅ Stream completed')
@@ -52,6 +62,17 @@ export class SSEService {
           console.error('❌ Stream error:', event.data)
           this.closeConnection()
           onError(new Error(event.data.substring(7).trim()))
+        } else if (event.data.startsWith('[BUSY]')) {
+          // 服务繁忙或上游熔断，retry_after 秒后可重试
+          let retryAfter = 0
+          try {
+            retryAfter = JSON.parse(event.data.substring(6).trim()).retry_after ?? 0
+          } catch {
+            // ignore malformed hint
+          }
+          console.warn('⏳ Received busy signal, retry after', retryAfter)
+          this.closeConnection()
+          onError(new Error(`服务繁忙，请 ${retryAfter} 秒后重试`))
         } else {
           // 使用工具函数处理 SSE 数据块
           const processedData = processSseDataChunk(event.data) as { text: string; sseDataType: SSEDataType }
@@ -59,6 +80,11 @@ export class SSEService {
         }
       }
 
+      // 命名事件同样带有 id，重连时浏览器发送的是最后一个事件的 id
+      this.eventSource.addEventListener('timing', (event) => {
+        this.trackEventId((event as MessageEvent).lastEventId, onRestart)
+      })
+
       // 监听连接打开
       this.eventSource.onopen = (event) => {
         console.log('🔗 SSE connection opened')
@@ -66,6 +92,14 @@ export class SSEService {
 
       // 监听连接错误
       this.eventSource.onerror = (event) => {
+        // 连接意外中断时 EventSource 处于 CONNECTING 状态并会自动重连（带上 Last-Event-ID，服务端从断点续传）；
+        // 服务端拒绝（如 503）或重连次数用完时才结束
+        if (this.eventSource?.readyState === EventSource.CONNECTING && this.reconnects < this.maxReconnects) {
+          this.reconnects += 1
+          this.reconnecting = true
+          console.warn(`🔄 SSE connection lost, reconnecting (${this.reconnects}/${this.maxReconnects})`)
+          return
+        }
         console.error('💥 SSE connection error:', event)
         this.closeConnection()
         onError(new Error('SSE connection failed'))
@@ -76,6 +110,27 @@ export class SSEService {
     }
   }
 
+  /**
+   * 记录事件 id；重连后的第一个事件不是紧接着断开前的最后一个事件时，说明服务端无法续传、从头重新推送
+   */
+  private trackEventId(eventId: string, onRestart: () => void): void {
+    if (this.reconnecting) {
+      this.reconnecting = false
+      this.reconnects = 0
+      if (this.lastEventId && !this.isNextEvent(eventId)) {
+        console.warn('🔁 Stream could not be resumed, restarting')
+        onRestart()
+      }
+    }
+    this.lastEventId = eventId
+  }
+
+  private isNextEvent(eventId: string): boolean {
+    const [generation, index] = this.lastEventId.split(':')
+    const [nextGeneration, nextIndex] = eventId.split(':')
+    return nextGeneration === generation && Number(nextIndex) === Number(index) + 1
+  }
+
   /**
    * 关闭 EventSource 连接
    */
@@ -103,6 +103,17 @@ export class TravelApiService {
         console.error('❌ Received error signal:', errorMessage)
         onError(new Error(errorMessage))
         return 'done'
+      } else if (data.startsWith('[BUSY]')) {
+        // 服务繁忙，retry_after 秒后可重试
+        let retryAfter = 0
+        try {
+          retryAfter = JSON.parse(data.substring(6).trim()).retry_after ?? 0
+        } catch {
+          // ignore malformed hint
+        }
+        console.warn('⏳ Received busy signal, retry after', retryAfter)
+        onError(new Error(`服务繁忙，请 ${retryAfter} 秒后重试`))
+        return 'done'
       } else if (data) {
         console.log('📝 Processing SSE data chunk:', data)
         onChunk(data)